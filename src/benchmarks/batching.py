@@ -0,0 +1,82 @@
+"""
+Benchmarks LLMManager.ask_batch against calling LLMManager.ask once per prompt, on a CPU.
+
+The prompts are questions about a synthetic graph, half of them with their context facts (and
+a varying number of distractors), as in rag_evaluation.ipynb, so their lengths vary. The model
+is a tiny random causal LM (benchmarks.tiny_lm) unless --model names a local or Hub checkpoint.
+
+Usage (from `src/`):
+	python -m benchmarks.batching --prompts 64 --batch-sizes 1 4 8 16
+	python -m benchmarks.batching --model cjvt/GaMS-1B-Chat --prompts 16 --max-new-tokens 16
+"""
+import argparse
+import random
+import tempfile
+import time
+from typing import List
+from llm.manager import LLMManager, LLMModel
+from qa.generator import QAGenerator
+from qa.templates import TEMPLATES
+from .synthetic import synthesize_graph
+from .tiny_lm import save_tiny_lm
+
+def make_prompts(num_prompts: int, seed: int) -> List[str]:
+	"""Questions without and with context, as the RAG evaluation asks them."""
+	rng = random.Random(seed)
+	generator = QAGenerator(seed=seed)
+	graph = synthesize_graph(1, seed)
+	prompts = []
+	for qa in generator.generate_questions(graph, TEMPLATES, num_questions=num_prompts, add_distractors=20):
+		if rng.random() < 0.5:
+			prompts.append(f"Vprašanje: {qa.question}")
+		else:
+			context = [str(fact) for fact in qa.context_facts[:rng.randint(1, len(qa.context_facts))]]
+			prompts.append(f"Kontekst: {' '.join(context)}\nVprašanje: {qa.question}")
+	return prompts
+
+def padded_tokens(lengths: List[int], batch_size: int) -> int:
+	"""Tokens computed when prompts of these lengths are padded to the longest of each batch."""
+	return sum(max(lengths[start:start + batch_size]) * len(lengths[start:start + batch_size]) for start in range(0, len(lengths), batch_size))
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--model", default=None, help="Model ID or path; a tiny random model if not given.")
+	parser.add_argument("--prompts", type=int, default=64)
+	parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+	parser.add_argument("--max-new-tokens", type=int, default=32)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as directory:
+		model = LLMModel(model_id=args.model or save_tiny_lm(directory, seed=args.seed))
+		llm = LLMManager(model, track_history=False)
+		prompts = make_prompts(args.prompts, args.seed)
+		# Greedy decoding (in the generation defaults both methods use), so their answers can be compared
+		llm._generation_config().do_sample = False
+		tokenizer = model.pipeline.tokenizer
+		texts = [tokenizer.apply_chat_template([{"role": "user", "content": prompt}], add_generation_prompt=True, tokenize=False) for prompt in prompts]
+		lengths = list(map(len, tokenizer(texts, add_special_tokens=False)["input_ids"]))
+		print(f"{len(prompts)} prompts of {min(lengths)}-{max(lengths)} tokens, {args.max_new_tokens} new tokens each")
+
+		llm.ask(prompts[0], max_new_tokens=args.max_new_tokens) # Warm up
+		start = time.perf_counter()
+		expected = [llm.ask(prompt, max_new_tokens=args.max_new_tokens) for prompt in prompts]
+		sequential_seconds = time.perf_counter() - start
+
+		print(f"{'method':>12} {'batch':>6} {'seconds':>8} {'prompts/s':>9} {'speedup':>7} {'padding':>8} {'unsorted':>8} {'same':>6}")
+		print(f"{'ask':>12} {1:>6} {sequential_seconds:>8.2f} {len(prompts) / sequential_seconds:>9.2f} {1:>6.1f}x {'':>8} {'':>8} {'':>6}")
+		for batch_size in args.batch_sizes:
+			start = time.perf_counter()
+			responses = llm.ask_batch(prompts, max_new_tokens=args.max_new_tokens, batch_size=batch_size)
+			seconds = time.perf_counter() - start
+			same = sum(response == reference for response, reference in zip(responses, expected))
+			# Padding overhead in tokens with and without length bucketing
+			bucketed = padded_tokens(sorted(lengths), batch_size) / sum(lengths) - 1
+			unsorted = padded_tokens(lengths, batch_size) / sum(lengths) - 1
+			print(
+				f"{'ask_batch':>12} {batch_size:>6} {seconds:>8.2f} {len(prompts) / seconds:>9.2f} {sequential_seconds / seconds:>6.1f}x "
+				f"{bucketed:>7.0%} {unsorted:>7.0%} {same:>3}/{len(prompts)}"
+			)
+
+if __name__ == "__main__":
+	main()
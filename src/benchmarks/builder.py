@@ -0,0 +1,72 @@
+"""
+Benchmarks the vectorized `kg.builder.build_graph` against adding the tables row by row (the
+loop of knowledge_graph.ipynb), checks that both build the same graph, and times writing it as
+GraphML and as a snapshot.
+
+Usage (from `src/`):
+	python -m benchmarks.builder                  # 100k municipalities, 100k peaks, 75k castles
+	python -m benchmarks.builder --scales 1 50 500 --page-size 10000
+"""
+import argparse
+import os
+import tempfile
+import networkx as nx
+import pandas as pd
+from kg.builder import CASTLE_OPTIONAL, MUNICIPALITY_OPTIONAL, PEAK_OPTIONAL, add_castle, add_municipality, add_peak, build_graph, iter_rows, write_graph
+from .snapshot import best_of, directory_size
+from .synthetic import synthesize_tables
+
+def build_graph_by_rows(municipalities, peaks, castles) -> nx.DiGraph:
+	"""The reference builder: one row at a time with the per-row functions."""
+	graph = nx.DiGraph()
+	for row in iter_rows(municipalities, MUNICIPALITY_OPTIONAL):
+		add_municipality(graph, row)
+	for row in iter_rows(peaks, PEAK_OPTIONAL):
+		add_peak(graph, row)
+	for row in iter_rows(castles, CASTLE_OPTIONAL):
+		add_castle(graph, row)
+	return graph
+
+def same_graph(first: nx.DiGraph, second: nx.DiGraph) -> bool:
+	"""Whether two graphs have the same nodes, edges and attributes, in the same order."""
+	return list(first.nodes(data=True)) == list(second.nodes(data=True)) and list(first.edges(data=True)) == list(second.edges(data=True))
+
+def pages(table: pd.DataFrame, page_size: int):
+	"""Splits a table into chunks, like the pages of a PagedQuery."""
+	return [table.iloc[start:start + page_size] for start in range(0, len(table), page_size)]
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--scales", type=int, nargs="+", default=[500], help="Size multipliers of the synthetic tables (200 municipalities per 1x).")
+	parser.add_argument("--page-size", type=int, default=None, help="Feed the tables in chunks of this many rows.")
+	parser.add_argument("--repeats", type=int, default=3)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	print(f"{'scale':>6} {'rows':>8} {'nodes':>9} {'edges':>9} {'row loop':>9} {'vectorized':>10} {'speedup':>7} {'same':>5} {'graphml':>9} {'MB':>7} {'snapshot':>9} {'MB':>7}")
+	with tempfile.TemporaryDirectory() as directory:
+		for scale in args.scales:
+			tables = synthesize_tables(scale, args.seed)
+			if args.page_size is not None:
+				inputs = lambda: [pages(table, args.page_size) for table in tables]
+			else:
+				inputs = lambda: tables
+
+			loop_seconds = best_of(args.repeats, lambda: build_graph_by_rows(*inputs()))
+			vectorized_seconds = best_of(args.repeats, lambda: build_graph(*inputs()))
+			graph = build_graph(*inputs())
+			same = same_graph(graph, build_graph_by_rows(*inputs()))
+
+			graphml_path = os.path.join(directory, f"graph_{scale}.graphml")
+			snapshot_path = os.path.join(directory, f"graph_{scale}.kg")
+			graphml_seconds = best_of(1, lambda: write_graph(graph, graphml_path))
+			snapshot_seconds = best_of(1, lambda: write_graph(graph, snapshot_path))
+
+			print(
+				f"{scale:>6} {sum(map(len, tables)):>8} {graph.number_of_nodes():>9} {graph.number_of_edges():>9} "
+				f"{loop_seconds:>8.3f}s {vectorized_seconds:>9.3f}s {loop_seconds / vectorized_seconds:>6.1f}x {'yes' if same else 'NO':>5} "
+				f"{graphml_seconds:>8.3f}s {os.path.getsize(graphml_path) / 1e6:>7.1f} {snapshot_seconds:>8.3f}s {directory_size(snapshot_path) / 1e6:>7.1f}"
+			)
+
+if __name__ == "__main__":
+	main()
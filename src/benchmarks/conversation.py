@@ -0,0 +1,60 @@
+"""
+Benchmarks a long conversation with LLMManager, re-encoding the whole history every turn (the
+pipeline) against keeping the model state between turns (incremental mode), on a CPU.
+
+Each user message is a question about a synthetic graph with its context facts, so the history
+grows quickly; with --token-budget the oldest turns are evicted to stay within it.
+
+Usage (from `src/`):
+	python -m benchmarks.conversation --turns 20
+	python -m benchmarks.conversation --turns 40 --token-budget 4096
+"""
+import argparse
+import tempfile
+import time
+from llm.manager import LLMManager, LLMModel
+from qa.generator import QAGenerator
+from qa.templates import TEMPLATES
+from .synthetic import synthesize_graph
+from .tiny_lm import save_tiny_lm
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--model", default=None, help="Model ID or path; a tiny random model if not given.")
+	parser.add_argument("--turns", type=int, default=20)
+	parser.add_argument("--max-new-tokens", type=int, default=32)
+	parser.add_argument("--token-budget", type=int, default=None)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	qas = QAGenerator(seed=args.seed).generate_questions(synthesize_graph(1, args.seed), TEMPLATES, num_questions=args.turns, add_distractors=5)
+	prompts = [f"Podatki: {qa.get_context_string()}\nVprašanje: {qa.question}" for qa in qas]
+
+	with tempfile.TemporaryDirectory() as directory:
+		model = LLMModel(model_id=args.model or save_tiny_lm(directory, max_positions=1 << 15, seed=args.seed))
+		full = LLMManager(model, incremental=False, token_budget=args.token_budget)
+		incremental = LLMManager(model, incremental=True, token_budget=args.token_budget)
+		full.ask(prompts[0], max_new_tokens=1) # Warm up
+		full.clear_history()
+
+		print(f"{'turn':>4} {'prompt':>7} {'prefill':>7} {'decode':>6} {'evicted':>7} {'full s':>7} {'incr. s':>7}")
+		total_full, total_incremental = 0.0, 0.0
+		for turn, prompt in enumerate(prompts, 1):
+			start = time.perf_counter()
+			full.ask(prompt, max_new_tokens=args.max_new_tokens)
+			full_seconds = time.perf_counter() - start
+			start = time.perf_counter()
+			incremental.ask(prompt, max_new_tokens=args.max_new_tokens)
+			incremental_seconds = time.perf_counter() - start
+			total_full += full_seconds
+			total_incremental += incremental_seconds
+
+			stats = incremental.turns[-1]
+			print(f"{turn:>4} {stats.prompt_tokens:>7} {stats.prefill_tokens:>7} {stats.decode_tokens:>6} {stats.evicted_turns:>7} {full_seconds:>7.3f} {incremental_seconds:>7.3f}")
+
+		prompt_tokens = sum(stats.prompt_tokens for stats in incremental.turns)
+		prefill_tokens = sum(stats.prefill_tokens for stats in incremental.turns)
+		print(f"Prefilled {prefill_tokens} of {prompt_tokens} prompt tokens ({prefill_tokens / prompt_tokens:.0%}); {total_full:.2f}s full vs {total_incremental:.2f}s incremental ({total_full / total_incremental:.1f}x)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,42 @@
+"""
+Benchmarks the CPU inference mode (llm.cpu): probes the configurations of a model at several
+thread counts, then loads it again to show that the cached choice skips the probing.
+
+The model is a small random causal LM (benchmarks.tiny_lm) unless --model names a checkpoint.
+
+Usage (from `src/`):
+	python -m benchmarks.cpu_inference --threads 1 2 4
+	python -m benchmarks.cpu_inference --model cjvt/GaMS-1B --threads 8 --compile
+"""
+import argparse
+import os
+import tempfile
+import time
+from llm.cpu import CpuInference, format_probes
+from .tiny_lm import save_tiny_lm
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--model", default=None, help="Model ID or path; a small random model if not given.")
+	parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1])
+	parser.add_argument("--compile", action="store_true", help="Also probe torch.compile.")
+	parser.add_argument("--probe-tokens", type=int, default=32)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as directory:
+		model_id = args.model or save_tiny_lm(os.path.join(directory, "model"), num_layers=8, hidden_size=512, num_heads=8)
+		cache_path = os.path.join(directory, "cpu_inference.json")
+		for num_threads in args.threads:
+			cpu = CpuInference(num_threads=num_threads, compile=args.compile, cache_path=cache_path, probe_tokens=args.probe_tokens)
+			start = time.perf_counter()
+			_, _, config, probes = cpu.load(model_id)
+			probe_seconds = time.perf_counter() - start
+			start = time.perf_counter()
+			cpu.load(model_id)
+			cached_seconds = time.perf_counter() - start
+
+			print(f"\n{num_threads} threads: chose {config}; load with probing {probe_seconds:.1f}s, from the cache {cached_seconds:.1f}s")
+			print(format_probes(probes))
+
+if __name__ == "__main__":
+	main()
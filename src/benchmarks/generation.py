@@ -0,0 +1,143 @@
+"""
+Benchmarks the QA generation pipeline on synthetic graphs of increasing size.
+
+Each scale runs in a fresh process so that its peak RSS is measured in isolation. Results
+are written as JSON; pass a previous result file with --compare to see the change per metric.
+
+Usage (from `src/`):
+	python -m benchmarks.generation --scales 1 10 100 1000 --output generation.json
+	python -m benchmarks.generation --scales 1 10 --compare generation.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+from qa.generator import QAGenerator
+from qa.templates import TEMPLATES
+from .synthetic import synthesize_graph
+from .traversal import sample_workload
+
+def peak_rss_mb() -> float:
+	"""Peak resident set size of this process (ru_maxrss is in KiB on Linux, bytes on macOS)."""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+def run_scale(scale: int, num_questions: int, num_traversals: int, add_distractors: int, seed: int) -> Dict[str, Any]:
+	"""Measures one scale; meant to run in its own process."""
+	result: Dict[str, Any] = {"scale": scale}
+
+	start = time.perf_counter()
+	graph = synthesize_graph(scale, seed)
+	result["synthesize_seconds"] = time.perf_counter() - start
+	result["nodes"] = graph.number_of_nodes()
+	result["edges"] = graph.number_of_edges()
+
+	generator = QAGenerator(seed=seed)
+	start = time.perf_counter()
+	index = generator.get_index(graph)
+	result["index_seconds"] = time.perf_counter() - start
+
+	# generate_questions reports its progress on stdout; keep the benchmark output readable
+	with contextlib.redirect_stdout(io.StringIO()):
+		start = time.perf_counter()
+		qas = generator.generate_questions(graph, TEMPLATES, num_questions, add_distractors)
+		seconds = time.perf_counter() - start
+	result["generate_seconds"] = seconds
+	result["questions"] = len(qas)
+	result["questions_per_second"] = len(qas) / seconds
+	result["attempts_per_question"] = generator.last_attempts / max(len(qas), 1)
+
+	workload = sample_workload(graph, num_traversals, seed)
+	start = time.perf_counter()
+	traversals = [generator.traverse_graph_path(graph, start_nodes, template_info) for start_nodes, template_info in workload]
+	seconds = time.perf_counter() - start
+	result["traversals_per_second"] = num_traversals / seconds
+	result["traversal_success_rate"] = sum(success for success, _, _ in traversals) / num_traversals
+
+	context_facts = [facts for success, _, facts in traversals if success]
+	start = time.perf_counter()
+	for facts in context_facts:
+		generator.generate_distractor_facts(graph, facts, add_distractors)
+	seconds = time.perf_counter() - start
+	result["distractor_sets_per_second"] = len(context_facts) / seconds if context_facts else None
+
+	start = time.perf_counter()
+	for facts in context_facts:
+		generator.generate_distractor_facts(graph, facts, add_distractors, hard=True)
+	seconds = time.perf_counter() - start
+	result["hard_distractor_sets_per_second"] = len(context_facts) / seconds if context_facts else None
+
+	del index
+	result["peak_rss_mb"] = peak_rss_mb()
+	return result
+
+def git_commit() -> str:
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+def compare(current: List[Dict[str, Any]], previous: List[Dict[str, Any]]):
+	"""Prints the relative change of every numeric metric for scales present in both runs."""
+	previous_by_scale = {result["scale"]: result for result in previous}
+	for result in current:
+		baseline = previous_by_scale.get(result["scale"])
+		if baseline is None:
+			continue
+		print(f"scale {result['scale']}x vs previous:")
+		for key, value in result.items():
+			old = baseline.get(key)
+			if key == "scale" or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+				continue
+			print(f"  {key:28} {old:14.3f} -> {value:14.3f}  ({(value - old) / old:+.1%})")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+	parser.add_argument("--questions", type=int, default=5000, help="Questions generated per scale.")
+	parser.add_argument("--traversals", type=int, default=20000, help="Traversals timed per scale.")
+	parser.add_argument("--distractors", type=int, default=5, help="Distractor facts per question.")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", default="generation_benchmark.json")
+	parser.add_argument("--compare", help="A previous result file to compare against.")
+	args = parser.parse_args()
+
+	# Spawned (not forked) workers start without the parent's memory, so peak RSS is per scale
+	context = multiprocessing.get_context("spawn")
+	results = []
+	for scale in args.scales:
+		with context.Pool(1) as pool:
+			result = pool.apply(run_scale, (scale, args.questions, args.traversals, args.distractors, args.seed))
+		results.append(result)
+		print(
+			f"{scale:>5}x  {result['nodes']:>9} nodes  {result['questions_per_second']:>9.0f} q/s  "
+			f"{result['attempts_per_question']:5.2f} attempts/q  {result['traversals_per_second']:>9.0f} traversals/s  "
+			f"{result['distractor_sets_per_second'] or 0:>9.0f} distractor sets/s ({result['hard_distractor_sets_per_second'] or 0:.0f} hard)  "
+			f"{result['peak_rss_mb']:>8.1f} MB peak RSS"
+		)
+
+	report = {
+		"commit": git_commit(),
+		"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+		"results": results,
+	}
+	with open(args.output, "w", encoding="utf-8") as f:
+		json.dump(report, f, indent=2)
+	print(f"Wrote {args.output}")
+
+	if args.compare:
+		with open(args.compare, encoding="utf-8") as f:
+			compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+	main()
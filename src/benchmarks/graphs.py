@@ -0,0 +1,21 @@
+import networkx as nx
+
+def scale_graph(graph: nx.Graph, factor: int) -> nx.Graph:
+	"""
+	Builds a graph `factor` times larger by taking disjoint copies of the given one.
+
+	Node IDs and labels of the k-th copy get a `#k` suffix (the first copy is kept as is),
+	so every copy has the same degree distribution and traversal paths as the original.
+	"""
+	scaled = graph.__class__()
+	for copy in range(factor):
+		suffix = f"#{copy}" if copy else ""
+		scaled.add_nodes_from(
+			(f"{node_id}{suffix}", {**data, "label": f"{data['label']}{suffix}"} if data.get("label") else data)
+			for node_id, data in graph.nodes(data=True)
+		)
+		scaled.add_edges_from(
+			(f"{source}{suffix}", f"{target}{suffix}", data)
+			for source, target, data in graph.edges(data=True)
+		)
+	return scaled
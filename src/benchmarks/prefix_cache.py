@@ -0,0 +1,71 @@
+"""
+Benchmarks LLMManager.ask with a PrefixCache against recomputing every prompt, on a CPU.
+
+Prompts have the fine-tuning format (RAG_INSTRUCTION, the context facts, the question), and
+several questions are asked about each context, as when an entity's facts are retrieved once.
+Three settings are compared: no cache, caching the instruction, and caching instruction and context.
+
+Usage (from `src/`):
+	python -m benchmarks.prefix_cache --contexts 16 --questions-per-context 4
+	python -m benchmarks.prefix_cache --max-mb 1 # An LRU too small for all contexts
+"""
+import argparse
+import random
+import tempfile
+import time
+from typing import List, Tuple
+from llm.manager import RAG_INSTRUCTION, LLMManager, LLMModel
+from llm.prefix_cache import PrefixCache
+from qa.generator import QAGenerator
+from qa.templates import TEMPLATES
+from .synthetic import synthesize_graph
+from .tiny_lm import save_tiny_lm
+
+def make_prompts(num_contexts: int, questions_per_context: int, seed: int) -> List[Tuple[str, str]]:
+	"""(instruction and context, full prompt) pairs, in a shuffled order."""
+	qas = QAGenerator(seed=seed).generate_questions(synthesize_graph(1, seed), TEMPLATES, num_questions=num_contexts * questions_per_context, add_distractors=10)
+	prompts = []
+	for i in range(num_contexts):
+		context_prefix = f"{RAG_INSTRUCTION}\n\nPodatki: {qas[i].get_context_string()}\n"
+		for qa in qas[i::num_contexts][:questions_per_context]:
+			prompts.append((context_prefix, f"{context_prefix}Vprašanje: {qa.question}"))
+	random.Random(seed).shuffle(prompts)
+	return prompts
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--model", default=None, help="Model ID or path; a tiny random model if not given.")
+	parser.add_argument("--contexts", type=int, default=16)
+	parser.add_argument("--questions-per-context", type=int, default=4)
+	parser.add_argument("--max-new-tokens", type=int, default=8)
+	parser.add_argument("--max-mb", type=float, default=1024, help="Size bound of the prefix cache.")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as directory:
+		model = LLMModel(model_id=args.model or save_tiny_lm(directory, seed=args.seed))
+		prompts = make_prompts(args.contexts, args.questions_per_context, args.seed)
+		LLMManager(model, track_history=False).ask(prompts[0][1], max_new_tokens=args.max_new_tokens) # Warm up
+
+		print(f"{'prefix':>20} {'seconds':>8} {'speedup':>7} {'hit rate':>8} {'saved':>6} {'entries':>7} {'MB':>7} {'evicted':>7} {'same':>6}")
+		baseline_seconds, expected = None, None
+		for setting in ["none", "instruction", "instruction+context"]:
+			cache = PrefixCache(max_bytes=int(args.max_mb * 1e6)) if setting != "none" else None
+			llm = LLMManager(model, track_history=False, prefix_cache=cache)
+			start = time.perf_counter()
+			responses = []
+			for context_prefix, prompt in prompts:
+				prefix = {"none": None, "instruction": RAG_INSTRUCTION, "instruction+context": context_prefix}[setting]
+				responses.append(llm.ask(prompt, max_new_tokens=args.max_new_tokens, prefix=prefix))
+			seconds = time.perf_counter() - start
+			if expected is None:
+				baseline_seconds, expected = seconds, responses
+			same = sum(response == reference for response, reference in zip(responses, expected))
+			stats = cache.stats() if cache is not None else {"hit_rate": 0.0, "saved_fraction": 0.0, "entries": 0, "megabytes": 0.0, "evictions": 0}
+			print(
+				f"{setting:>20} {seconds:>8.2f} {baseline_seconds / seconds:>6.1f}x {stats['hit_rate']:>8.0%} {stats['saved_fraction']:>6.0%} "
+				f"{stats['entries']:>7} {stats['megabytes']:>7.1f} {stats['evictions']:>7} {same:>3}/{len(prompts)}"
+			)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,57 @@
+"""
+Benchmarks loading the knowledge graph from a snapshot against nx.read_graphml.
+
+Usage (from `src/`):
+	python -m benchmarks.snapshot --scales 1 10 100
+"""
+import argparse
+import os
+import tempfile
+import time
+import networkx as nx
+from kg.snapshot import load_snapshot, save_snapshot
+from qa.index import GraphIndex
+from .graphs import scale_graph
+
+def directory_size(path: str) -> int:
+	return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def best_of(repeats: int, function) -> float:
+	"""Returns the fastest wall-clock time of several calls."""
+	timings = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		function()
+		timings.append(time.perf_counter() - start)
+	return min(timings)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--graph", default="../data/municipalities_peaks_castles.graphml")
+	parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Numbers of disjoint copies of the graph.")
+	parser.add_argument("--repeats", type=int, default=3)
+	args = parser.parse_args()
+
+	base_graph = nx.read_graphml(args.graph)
+	print(f"{'scale':>6} {'nodes':>9} {'graphml MB':>10} {'snapshot MB':>11} {'read_graphml':>12} {'+ index':>9} {'snapshot':>9} {'mmap':>9}")
+	with tempfile.TemporaryDirectory() as directory:
+		for scale in args.scales:
+			graph = scale_graph(base_graph, scale)
+			graphml_path = os.path.join(directory, f"graph_{scale}.graphml")
+			snapshot_path = os.path.join(directory, f"graph_{scale}.kg")
+			nx.write_graphml(graph, graphml_path)
+			save_snapshot(graph, snapshot_path)
+
+			graphml_seconds = best_of(args.repeats, lambda: nx.read_graphml(graphml_path))
+			indexed_seconds = best_of(args.repeats, lambda: GraphIndex(nx.read_graphml(graphml_path)))
+			snapshot_seconds = best_of(args.repeats, lambda: load_snapshot(snapshot_path, mmap=False))
+			mmap_seconds = best_of(args.repeats, lambda: load_snapshot(snapshot_path, mmap=True))
+
+			print(
+				f"{scale:>6} {graph.number_of_nodes():>9} "
+				f"{os.path.getsize(graphml_path) / 1e6:>10.2f} {directory_size(snapshot_path) / 1e6:>11.2f} "
+				f"{graphml_seconds:>11.3f}s {indexed_seconds:>8.3f}s {snapshot_seconds:>8.3f}s {mmap_seconds:>8.3f}s"
+			)
+
+if __name__ == "__main__":
+	main()
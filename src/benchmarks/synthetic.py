@@ -0,0 +1,75 @@
+"""
+Synthetic knowledge graphs with the schema of municipalities_peaks_castles.graphml.
+
+The tables mimic the DataFrames returned by the SPARQL queries in `wikidata.queries`, sized
+relative to the real data (200 municipalities, 12 regions, ~200 peaks, ~150 castles per
+1x scale), and are turned into a graph by `kg.builder`, the same way as `knowledge_graph.ipynb`.
+"""
+import numpy as np
+import pandas as pd
+import networkx as nx
+from typing import Tuple
+from kg.builder import build_graph
+
+HERITAGE_LABELS = ["spomenik državnega pomena", "spomenik lokalnega pomena", "arheološka dediščina"]
+
+def synthesize_tables(scale: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+	"""
+	Builds municipality, peak and castle tables with the columns of the SPARQL query results.
+
+	Args:
+		scale: Size multiplier relative to the real graph.
+		seed: Seed for the random values.
+
+	Returns:
+		The (municipalities, peaks, castles) DataFrames.
+	"""
+	rng = np.random.default_rng(seed)
+	num_regions = 12 * scale
+	num_municipalities = 200 * scale
+	num_peaks = 200 * scale
+	num_castles = 150 * scale
+
+	region_ids = rng.integers(0, num_regions, num_municipalities)
+	population = np.round(rng.lognormal(8.5, 1.0, num_municipalities)).astype(float)
+	area = np.round(rng.lognormal(4.0, 0.8, num_municipalities), 1)
+	# A few municipalities lack population or area, as in Wikidata
+	population[rng.random(num_municipalities) < 0.005] = np.nan
+	area[rng.random(num_municipalities) < 0.02] = np.nan
+	municipalities = pd.DataFrame({
+		"municipality": [f"http://example.org/municipality/{i}" for i in range(num_municipalities)],
+		"municipalityLabel": [f"Občina {i}" for i in range(num_municipalities)],
+		"region": [f"http://example.org/region/{i}" for i in region_ids],
+		"regionLabel": [f"regija {i}" for i in region_ids],
+		"population": population,
+		"area": area,
+	})
+
+	# Peak names repeat (e.g. "Črni vrh"), so some labels are shared by several peaks
+	peak_municipalities = rng.integers(0, num_municipalities, num_peaks)
+	peak_names = rng.integers(0, int(num_peaks * 0.9), num_peaks)
+	elevation = np.round(rng.uniform(300, 2864, num_peaks), 0)
+	elevation[rng.random(num_peaks) < 0.06] = np.nan
+	peaks = pd.DataFrame({
+		"peak": [f"http://example.org/peak/{i}" for i in range(num_peaks)],
+		"peakLabel": [f"Vrh {i}" for i in peak_names],
+		"elevation": elevation,
+		"adminEntity": [f"http://example.org/municipality/{i}" for i in peak_municipalities],
+		"adminEntityLabel": [f"Občina {i}" for i in peak_municipalities],
+	})
+
+	castle_municipalities = rng.integers(0, num_municipalities, num_castles)
+	heritage_ids = rng.integers(-1, len(HERITAGE_LABELS), num_castles) # -1: no heritage status
+	castles = pd.DataFrame({
+		"castle": [f"http://example.org/castle/{i}" for i in range(num_castles)],
+		"castleLabel": [f"Grad {i}" for i in range(num_castles)],
+		"heritage": [f"http://example.org/heritage/{i}" if i >= 0 else "" for i in heritage_ids],
+		"heritageLabel": [HERITAGE_LABELS[i] if i >= 0 else "" for i in heritage_ids],
+		"adminEntity": [f"http://example.org/municipality/{i}" for i in castle_municipalities],
+		"adminEntityLabel": [f"Občina {i}" for i in castle_municipalities],
+	})
+	return municipalities, peaks, castles
+
+def synthesize_graph(scale: int, seed: int = 0) -> nx.DiGraph:
+	"""Builds a synthetic knowledge graph `scale` times the size of the real one."""
+	return build_graph(*synthesize_tables(scale, seed))
@@ -0,0 +1,60 @@
+"""
+A tiny randomly initialized causal LM with a byte-level tokenizer and a chat template, saved
+like a Hugging Face checkpoint, so the LLM benchmarks can load it by path (e.g. with LLMModel)
+on a CPU without downloading anything. It has the Llama architecture, so its projections are
+nn.Linear layers like GaMS'. Its answers are noise; only the amount of work is realistic.
+"""
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+CHAT_TEMPLATE = (
+	"{% for message in messages %}<|{{ message['role'] }}|>\n{{ message['content'] }}<|end|>\n{% endfor %}"
+	"{% if add_generation_prompt %}<|assistant|>\n{% endif %}"
+)
+
+def tiny_tokenizer() -> PreTrainedTokenizerFast:
+	"""A tokenizer with one token per byte (any text is encodable) and an end-of-text token."""
+	vocab = {symbol: i for i, symbol in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+	vocab["<|endoftext|>"] = len(vocab)
+	tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+	tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+	tokenizer.decoder = decoders.ByteLevel()
+	return PreTrainedTokenizerFast(
+		tokenizer_object=tokenizer,
+		eos_token="<|endoftext|>",
+		pad_token="<|endoftext|>",
+		chat_template=CHAT_TEMPLATE
+	)
+
+def save_tiny_lm(path: str, num_layers: int = 4, hidden_size: int = 256, num_heads: int = 4, max_positions: int = 2048, seed: int = 0) -> str:
+	"""
+	Saves a random Llama-style model and its tokenizer to `path`.
+
+	Args:
+		path: Directory to write the checkpoint to.
+		num_layers: Transformer blocks.
+		hidden_size: Width of the model.
+		num_heads: Attention heads per block.
+		max_positions: Longest sequence (prompt and response) the model accepts.
+		seed: Seed of the random weights.
+
+	Returns:
+		The path, to pass as a model ID.
+	"""
+	tokenizer = tiny_tokenizer()
+	torch.manual_seed(seed)
+	config = LlamaConfig(
+		vocab_size=len(tokenizer),
+		hidden_size=hidden_size,
+		intermediate_size=hidden_size * 8 // 3,
+		num_hidden_layers=num_layers,
+		num_attention_heads=num_heads,
+		max_position_embeddings=max_positions,
+		bos_token_id=tokenizer.eos_token_id,
+		eos_token_id=tokenizer.eos_token_id,
+		pad_token_id=tokenizer.pad_token_id
+	)
+	LlamaForCausalLM(config).save_pretrained(path)
+	tokenizer.save_pretrained(path)
+	return path
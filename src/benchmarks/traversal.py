@@ -0,0 +1,111 @@
+"""
+Benchmarks QAGenerator.traverse_graph_path against the original networkx neighbor scan.
+
+Usage (from `src/`):
+	python -m benchmarks.traversal --scale 100 --samples 20000
+"""
+import argparse
+import random
+import time
+import networkx as nx
+from typing import Any, Dict, List, Tuple
+from qa.generator import QAGenerator, _traverse_path
+from qa.question import QuestionTemplate
+from qa.templates import TEMPLATES
+from .graphs import scale_graph
+
+def networkx_traverse(
+	graph: nx.Graph,
+	start_nodes: Dict[str, Dict[str, Any]],
+	template_info: QuestionTemplate
+) -> Tuple[bool, Dict[str, Dict[str, Any]], List[Tuple[str, str, str]]]:
+	"""Reference traversal that filters `graph.neighbors()` on every step, as before the index."""
+	captured_nodes = start_nodes.copy()
+	traversal_facts = []
+	current_step_source_variable = list(start_nodes.keys())[0]
+	for step in template_info.path:
+		source_var = step.source_variable if step.source_variable else current_step_source_variable
+		if source_var not in captured_nodes:
+			return False, captured_nodes, traversal_facts
+		current_node_id = captured_nodes[source_var]["id"]
+
+		possible_next_nodes = []
+		for neighbor_id in graph.neighbors(current_node_id):
+			edge_data = graph.get_edge_data(current_node_id, neighbor_id, default={})
+			node_data = graph.nodes[neighbor_id]
+			if (edge_data.get("type") == step.edge_type and
+				node_data.get("type") == step.target_node_type and
+				node_data.get("label")):
+				possible_next_nodes.append(neighbor_id)
+
+		if len(possible_next_nodes) != 1:
+			return False, captured_nodes, traversal_facts
+		next_node_id = possible_next_nodes[0]
+		next_node_label = graph.nodes[next_node_id].get("label")
+		captured_nodes[step.capture_as] = {"id": next_node_id, "label": next_node_label, "type": step.target_node_type}
+		traversal_facts.append((captured_nodes[source_var]["label"], step.edge_type, next_node_label))
+		current_step_source_variable = step.capture_as
+	return template_info.answer_variable in captured_nodes, captured_nodes, traversal_facts
+
+def sample_workload(graph: nx.Graph, num_samples: int, seed: int) -> List[Tuple[Dict[str, Dict[str, Any]], QuestionTemplate]]:
+	"""Draws (start nodes, template) pairs the same way generate_questions does."""
+	rng = random.Random(seed)
+	nodes_by_type: Dict[str, List[str]] = {}
+	for node_id, data in graph.nodes(data=True):
+		if data.get("label"):
+			nodes_by_type.setdefault(data.get("type"), []).append(node_id)
+
+	workload = []
+	for _ in range(num_samples):
+		template_info = rng.choice(TEMPLATES)
+		start_nodes = {}
+		for req_key, req_details in template_info.requirements.items():
+			node_id = rng.choice(nodes_by_type[req_details["type"]])
+			start_nodes[req_key] = {"id": node_id, "label": graph.nodes[node_id]["label"], "type": req_details["type"]}
+		workload.append((start_nodes, template_info))
+	return workload
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--graph", default="../data/municipalities_peaks_castles.graphml")
+	parser.add_argument("--scale", type=int, default=100, help="Number of disjoint copies of the graph.")
+	parser.add_argument("--samples", type=int, default=20000, help="Number of traversals to time.")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	graph = scale_graph(nx.read_graphml(args.graph), args.scale)
+	print(f"Graph: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges (scale {args.scale}x)")
+	workload = sample_workload(graph, args.samples, args.seed)
+
+	start = time.perf_counter()
+	expected = [networkx_traverse(graph, start_nodes, template_info) for start_nodes, template_info in workload]
+	networkx_seconds = time.perf_counter() - start
+
+	generator = QAGenerator()
+	start = time.perf_counter()
+	generator.get_index(graph)
+	build_seconds = time.perf_counter() - start
+
+	# The public method pays for typeguard's argument and return checks on every call;
+	# generate_questions calls the unchecked body directly.
+	start = time.perf_counter()
+	actual = [generator.traverse_graph_path(graph, start_nodes, template_info) for start_nodes, template_info in workload]
+	checked_seconds = time.perf_counter() - start
+
+	index = generator.get_index(graph)
+	start = time.perf_counter()
+	unchecked = [_traverse_path(index, start_nodes, template_info) for start_nodes, template_info in workload]
+	indexed_seconds = time.perf_counter() - start
+
+	for results in (actual, unchecked):
+		for (expected_success, expected_nodes, _), (actual_success, actual_nodes, _) in zip(expected, results):
+			assert expected_success == actual_success and expected_nodes == actual_nodes, "Traversal results differ"
+
+	print(f"networkx scan:            {networkx_seconds:8.3f} s  ({args.samples / networkx_seconds:10.0f} traversals/s)")
+	print(f"index build:              {build_seconds:8.3f} s")
+	print(f"indexed, typechecked API: {checked_seconds:8.3f} s  ({args.samples / checked_seconds:10.0f} traversals/s)")
+	print(f"indexed, generator path:  {indexed_seconds:8.3f} s  ({args.samples / indexed_seconds:10.0f} traversals/s)")
+	print(f"speedup (generator path): {networkx_seconds / indexed_seconds:8.1f}x (excluding build)")
+
+if __name__ == "__main__":
+	main()
@@ -1,46 +1,44 @@
+import argparse
 import json
-import networkx as nx
+from itertools import islice
 import os
+from kg.snapshot import load_graph
 from qa.generator import QAGenerator
-from qa.templates import TEMPLATES
+from qa.templates import ALL_TEMPLATES, TEMPLATES
+from utils.jsonl import JsonlWriter, resume_seed
 
-def generate_knowledge_jsonl(graph_path, output_path, num_samples=5000):
+def generate_knowledge_jsonl(graph_path, output_path, num_samples=5000, resume=False, seed=None, templates=TEMPLATES):
     """Ustvari QA pare BREZ podatkov v promptu - za knowledge integration"""
     
-    # 1. Naloži graf
-    graph = nx.read_graphml(graph_path)
+    # 1. Naloži graf (.graphml ali binarni posnetek iz kg.snapshot)
+    graph = load_graph(graph_path)
     print(f"Naložen graf: {graph.number_of_nodes()} vozlišč, {graph.number_of_edges()} povezav")
     
-    # 2. Generiraj QA pare
-    generator = QAGenerator()
-    qas = generator.generate_questions(
+    # 2. Generiraj QA pare sproti
+    # Seed se shrani ob izhodu (<output_path>.seed), da nadaljevanje ponovi iste primere
+    seed = resume_seed(output_path, seed, resume)
+    generator = QAGenerator(seed=seed)
+    qas = generator.iter_questions(
         graph, 
-        TEMPLATES, 
+        templates, 
         num_questions=num_samples,
         add_distractors=0  # POMEMBNO: brez distraktov!
     )
     
-    # 3. Pretvori v KNOWLEDGE INTEGRATION format
-    training_data = []
-    for qa in qas:
-        # SAMO vprašanje, BREZ podatkov!
-        entry = {
-            "instruction": "Odgovori na vprašanje o Sloveniji.",
-            "input": qa.question,  # Samo vprašanje!
-            "output": qa.answer
-        }
-        training_data.append(entry)
+    # 3. Shrani v .jsonl (JsonlWriter ustvari direktorij, če ne obstaja)
+    with JsonlWriter(output_path, resume=resume, total=num_samples) as writer:
+        # Pri nadaljevanju preskoči že zapisane primere (s shranjenim seedom so enaki)
+        for qa in islice(qas, writer.count, None):
+            # Pretvori v KNOWLEDGE INTEGRATION format - SAMO vprašanje, BREZ podatkov!
+            entry = {
+                "instruction": "Odgovori na vprašanje o Sloveniji.",
+                "input": qa.question,  # Samo vprašanje!
+                "output": qa.answer
+            }
+            writer.write(entry)
     
-    # 4. Ustvari direktorij, če ne obstaja
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # 5. Shrani v .jsonl
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for entry in training_data:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-    
-    print(f"Shranjenih {len(training_data)} primerov v {output_path}")
-    return training_data
+    print(f"Shranjenih {writer.count} primerov v {output_path}")
+    return writer.count
 
 def inspect_knowledge_data(jsonl_path, num_samples=10):
     """Preveri generirane podatke"""
@@ -58,6 +56,12 @@ def inspect_knowledge_data(jsonl_path, num_samples=10):
         print(f"Datoteka {jsonl_path} ne obstaja!")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ustvari knowledge integration dataset iz grafa.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed generatorja; naključen (in shranjen) če ni podan.")
+    parser.add_argument("--resume", action="store_true", help="Nadaljuj prekinjen zapis z istim seedom.")
+    parser.add_argument("--numeric", action="store_true", help="Dodaj agregatna in primerjalna vprašanja (ALL_TEMPLATES).")
+    args = parser.parse_args()
+
     # Uporabi absolutne poti
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     graph_path = os.path.join(base_dir, "data", "municipalities_peaks_castles.graphml")
@@ -67,7 +71,10 @@ if __name__ == "__main__":
     generate_knowledge_jsonl(
         graph_path=graph_path,
         output_path=output_path,
-        num_samples=5000
+        num_samples=5000,
+        resume=args.resume,
+        seed=args.seed,
+        templates=ALL_TEMPLATES if args.numeric else TEMPLATES
     )
     
     # Preveri podatke
@@ -1,47 +1,57 @@
-import json
-import networkx as nx
+import argparse
+from itertools import islice
+import os
+from kg.snapshot import load_graph
 from qa.generator import QAGenerator
-from qa.templates import TEMPLATES
+from qa.templates import ALL_TEMPLATES, TEMPLATES
+from utils.jsonl import JsonlWriter, resume_seed
 
-def generate_training_jsonl(graph_path, output_path, num_samples=1000):
+def generate_training_jsonl(graph_path, output_path, num_samples=1000, resume=False, seed=None, templates=TEMPLATES):
     """Pretvori .graphml v .jsonl za fine-tuning"""
     
-    # 1. Naloži graf
-    graph = nx.read_graphml(graph_path)
+    # 1. Naloži graf (.graphml ali binarni posnetek iz kg.snapshot)
+    graph = load_graph(graph_path)
     print(f"Naložen graf: {graph.number_of_nodes()} vozlišč, {graph.number_of_edges()} povezav")
     
-    # 2. Generiraj QA pare
-    generator = QAGenerator()
-    qas = generator.generate_questions(
+    # 2. Generiraj QA pare sproti in jih zapisuj v .jsonl
+    # Seed se shrani ob izhodu (<output_path>.seed), da nadaljevanje ponovi iste primere
+    seed = resume_seed(output_path, seed, resume)
+    generator = QAGenerator(seed=seed)
+    qas = generator.iter_questions(
         graph, 
-        TEMPLATES, 
+        templates, 
         num_questions=num_samples,
         add_distractors=5
     )
     
-    # 3. Pretvori v instruction-tuning format
-    training_data = []
-    for qa in qas:
-        context = " ".join([str(fact) for fact in qa.context_facts])
-        
-        entry = {
-            "instruction": "Odgovori na vprašanje na podlagi podanih podatkov.",
-            "input": f"Podatki: {context}\nVprašanje: {qa.question}",
-            "output": qa.answer
-        }
-        training_data.append(entry)
+    with JsonlWriter(output_path, resume=resume, total=num_samples) as writer:
+        # Pri nadaljevanju preskoči že zapisane primere (s shranjenim seedom so enaki)
+        for qa in islice(qas, writer.count, None):
+            # 3. Pretvori v instruction-tuning format
+            entry = {
+                "instruction": "Odgovori na vprašanje na podlagi podanih podatkov.",
+                "input": f"Podatki: {qa.get_context_string()}\nVprašanje: {qa.question}",
+                "output": qa.answer
+            }
+            writer.write(entry)
     
-    # 4. Shrani v .jsonl
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for entry in training_data:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-    
-    print(f"Shranjenih {len(training_data)} primerov v {output_path}")
-    return training_data
+    print(f"Shranjenih {writer.count} primerov v {output_path}")
+    return writer.count
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ustvari QA dataset za fine-tuning iz grafa.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed generatorja; naključen (in shranjen) če ni podan.")
+    parser.add_argument("--resume", action="store_true", help="Nadaljuj prekinjen zapis z istim seedom.")
+    parser.add_argument("--numeric", action="store_true", help="Dodaj agregatna in primerjalna vprašanja (ALL_TEMPLATES).")
+    args = parser.parse_args()
+
+    # Uporabi absolutne poti (deluje na vseh sistemih, ne glede na delovni direktorij)
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     generate_training_jsonl(
-        graph_path="data\municipalities_peaks_castles.graphml",
-        output_path="data\slovenian_qa_training.jsonl",
-        num_samples=5000
+        graph_path=os.path.join(base_dir, "data", "municipalities_peaks_castles.graphml"),
+        output_path=os.path.join(base_dir, "data", "slovenian_qa_training.jsonl"),
+        num_samples=5000,
+        resume=args.resume,
+        seed=args.seed,
+        templates=ALL_TEMPLATES if args.numeric else TEMPLATES
     )
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Builds the knowledge graph from the Wikidata query results.
+
+`build_graph` assembles the nodes and edges of whole tables with array operations and inserts
+them with `add_nodes_from`/`add_edges_from`; the per-row functions (`add_municipality`, ...)
+are the reference semantics it reproduces and are used to patch single entities (kg.sync).
+
+Usage (from `src/`):
+	python -m kg.builder ../data/municipalities_peaks_castles.graphml            # Fetch missing responses into the cache
+	python -m kg.builder --offline ../data/municipalities_peaks_castles.graphml  # Recorded responses only, no network
+	python -m kg.builder --offline ../data/municipalities_peaks_castles.kg       # Write a binary snapshot (kg.snapshot)
+"""
+import argparse
+import numpy as np
+import pandas as pd
+import networkx as nx
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+from utils.numbers import round_number
+
+Table = Union[pd.DataFrame, Iterable[pd.DataFrame]]
+
+def iter_chunks(table: Table, optional: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+	"""
+	The chunks of a DataFrame (itself) or of a stream of DataFrame chunks (e.g. a PagedQuery). A
+	chunk in which an OPTIONAL variable is never bound lacks its column, so it is added with the default.
+	"""
+	for chunk in [table] if isinstance(table, pd.DataFrame) else table:
+		missing = {column: default for column, default in optional.items() if column not in chunk.columns}
+		yield chunk.assign(**missing) if missing else chunk
+
+def iter_rows(table: Table, optional: Dict[str, Any]) -> Iterator[tuple]:
+	"""The rows of a table as named tuples, see iter_chunks."""
+	for chunk in iter_chunks(table, optional):
+		yield from chunk.itertuples(index=False)
+
+# Columns of OPTIONAL variables, with the value standing for "unbound"
+MUNICIPALITY_OPTIONAL = {"population": np.nan, "area": np.nan}
+PEAK_OPTIONAL = {"adminEntity": ""}
+CASTLE_OPTIONAL = {"adminEntity": "", "heritage": "", "heritageLabel": ""}
+
+def _add_number(graph: nx.DiGraph, entity, value, value_type, has_edge, inverse_edge, approx_edge):
+	rounded = round_number(value)
+	graph.add_node(f"~{rounded}", type="približno_število", label=str(rounded))
+	graph.add_node(str(value), type=value_type, label=str(value))
+	graph.add_edge(f"~{rounded}", str(value), type="je_približno")
+	graph.add_edge(entity, str(value), type=has_edge)
+	graph.add_edge(f"~{rounded}", entity, type=approx_edge)
+	graph.add_edge(str(value), entity, type=inverse_edge)
+
+def add_municipality(graph: nx.DiGraph, row):
+	"""Adds the nodes and edges of one SPARQL_MUNICIPALITIES row."""
+	graph.add_node(row.municipality, type="občina", label=row.municipalityLabel)
+	graph.add_node(row.region, type="regija", label=row.regionLabel)
+	graph.add_edge(row.municipality, row.region, type="se_nahaja_v")
+	graph.add_edge(row.region, row.municipality, type="ima_občino")
+	if not np.isnan(row.population):
+		_add_number(graph, row.municipality, row.population, "populacija", "ima_populacijo", "je_populacija_občine", "je_približna_populacija_občine")
+	if not np.isnan(row.area):
+		_add_number(graph, row.municipality, row.area, "površina", "ima_površino", "je_površina_občine", "je_približna_površina_občine")
+
+def add_peak(graph: nx.DiGraph, row) -> bool:
+	"""Adds the nodes and edges of one SPARQL_PEAKS row; False (and nothing added) if its administrative entity is not in the graph."""
+	if row.adminEntity not in graph.nodes:
+		return False
+	graph.add_node(row.peak, type="vrh", label=row.peakLabel)
+	graph.add_edge(row.peak, row.adminEntity, type="se_nahaja_v")
+	graph.add_edge(row.adminEntity, row.peak, type="ima_vrh")
+	if not np.isnan(row.elevation):
+		_add_number(graph, row.peak, row.elevation, "višina", "ima_višino", "je_višina_vrha", "je_približna_višina_vrha")
+	return True
+
+def add_castle(graph: nx.DiGraph, row) -> bool:
+	"""Adds the nodes and edges of one SPARQL_CASTLES row; False (and nothing added) if its administrative entity is not in the graph."""
+	if row.adminEntity not in graph.nodes:
+		return False
+	graph.add_node(row.castle, type="grad", label=row.castleLabel)
+	graph.add_edge(row.castle, row.adminEntity, type="se_nahaja_v")
+	graph.add_edge(row.adminEntity, row.castle, type="ima_grad")
+	if row.heritage != "":
+		graph.add_node(row.heritage, type="dediščina", label=row.heritageLabel)
+		graph.add_edge(row.castle, row.heritage, type="pripada_dediščini")
+		graph.add_edge(row.heritage, row.castle, type="ima_grad")
+	return True
+
+# A slot is one node or edge every row of a table may add: (first column, second column, type, mask)
+Slot = Tuple[np.ndarray, np.ndarray, Union[str, np.ndarray], Union[bool, np.ndarray]]
+
+def _objects(values: pd.Series) -> np.ndarray:
+	return values.to_numpy(dtype=object)
+
+def _strings(values: Iterable) -> np.ndarray:
+	"""str() of every value, as an object array (so numbers print exactly as in the row functions)."""
+	values = list(values)
+	array = np.empty(len(values), dtype=object)
+	array[:] = list(map(str, values))
+	return array
+
+def _number_slots(
+	entities: np.ndarray,
+	values: pd.Series,
+	value_type: str,
+	has_edge: str,
+	inverse_edge: str,
+	approx_edge: str
+) -> Tuple[List[Slot], List[Slot]]:
+	"""The node and edge slots of _add_number for a column of values (missing values add nothing)."""
+	present = ~pd.isna(values).to_numpy()
+	value_ids = np.full(len(values), "", dtype=object)
+	approx_ids = np.full(len(values), "", dtype=object)
+	approx_labels = np.full(len(values), "", dtype=object)
+	if present.any():
+		present_values = values[present]
+		value_ids[present] = _strings(present_values.tolist())
+		# round_number once per distinct value
+		codes, uniques = pd.factorize(present_values)
+		rounded = [round_number(value) for value in uniques.tolist()]
+		approx_ids[present] = np.array([f"~{number}" for number in rounded], dtype=object)[codes]
+		approx_labels[present] = _strings(rounded)[codes]
+
+	nodes = [
+		(approx_ids, approx_labels, "približno_število", present),
+		(value_ids, value_ids, value_type, present),
+	]
+	edges = [
+		(approx_ids, value_ids, "je_približno", present),
+		(entities, value_ids, has_edge, present),
+		(approx_ids, entities, approx_edge, present),
+		(value_ids, entities, inverse_edge, present),
+	]
+	return nodes, edges
+
+def _add_slots(graph: nx.DiGraph, nodes: List[Slot], edges: List[Slot]):
+	"""
+	Adds the nodes (id, label, type) and edges (source, target, type) of all rows in row-major
+	order, i.e. in the order the row functions would add them, so the graph (including its node
+	and adjacency order, and which write of a repeated node or edge wins) is the same.
+	"""
+	def interleave(slots: List[Slot]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+		num_rows = len(slots[0][0])
+		shape = (num_rows, len(slots))
+		first, second, types = np.empty(shape, dtype=object), np.empty(shape, dtype=object), np.empty(shape, dtype=object)
+		mask = np.empty(shape, dtype=bool)
+		for column, (first_values, second_values, slot_type, slot_mask) in enumerate(slots):
+			first[:, column] = first_values
+			second[:, column] = second_values
+			types[:, column] = slot_type
+			mask[:, column] = slot_mask
+		return first[mask], second[mask], types[mask]
+
+	# Collapse repeated nodes and edges (shared values, regions, ...) before inserting them; a dict
+	# keeps the position of the first occurrence and the value of the last, like the graph does
+	ids, labels, types = interleave(nodes)
+	node_attributes = dict(zip(ids.tolist(), zip(types.tolist(), labels.tolist())))
+	graph.add_nodes_from((node, {"type": node_type, "label": label}) for node, (node_type, label) in node_attributes.items())
+	sources, targets, types = interleave(edges)
+	edge_types = dict(zip(zip(sources.tolist(), targets.tolist()), types.tolist()))
+	graph.add_edges_from((source, target, {"type": edge_type}) for (source, target), edge_type in edge_types.items())
+
+def _add_municipalities(graph: nx.DiGraph, chunk: pd.DataFrame):
+	municipality, region = _objects(chunk["municipality"]), _objects(chunk["region"])
+	population_nodes, population_edges = _number_slots(municipality, chunk["population"], "populacija", "ima_populacijo", "je_populacija_občine", "je_približna_populacija_občine")
+	area_nodes, area_edges = _number_slots(municipality, chunk["area"], "površina", "ima_površino", "je_površina_občine", "je_približna_površina_občine")
+	_add_slots(
+		graph,
+		[
+			(municipality, _objects(chunk["municipalityLabel"]), "občina", True),
+			(region, _objects(chunk["regionLabel"]), "regija", True),
+			*population_nodes,
+			*area_nodes
+		],
+		[
+			(municipality, region, "se_nahaja_v", True),
+			(region, municipality, "ima_občino", True),
+			*population_edges,
+			*area_edges
+		]
+	)
+
+def _located(graph: nx.DiGraph, chunk: pd.DataFrame) -> pd.DataFrame:
+	"""The rows whose administrative entity is in the graph (as it is before the chunk is added)."""
+	keep = np.fromiter(map(graph.__contains__, chunk["adminEntity"].tolist()), dtype=bool, count=len(chunk))
+	return chunk if keep.all() else chunk[keep]
+
+def _add_peaks(graph: nx.DiGraph, chunk: pd.DataFrame):
+	chunk = _located(graph, chunk)
+	peak, admin = _objects(chunk["peak"]), _objects(chunk["adminEntity"])
+	elevation_nodes, elevation_edges = _number_slots(peak, chunk["elevation"], "višina", "ima_višino", "je_višina_vrha", "je_približna_višina_vrha")
+	_add_slots(
+		graph,
+		[(peak, _objects(chunk["peakLabel"]), "vrh", True), *elevation_nodes],
+		[(peak, admin, "se_nahaja_v", True), (admin, peak, "ima_vrh", True), *elevation_edges]
+	)
+
+def _add_castles(graph: nx.DiGraph, chunk: pd.DataFrame):
+	chunk = _located(graph, chunk)
+	castle, admin, heritage = _objects(chunk["castle"]), _objects(chunk["adminEntity"]), _objects(chunk["heritage"])
+	has_heritage = heritage != ""
+	_add_slots(
+		graph,
+		[(castle, _objects(chunk["castleLabel"]), "grad", True), (heritage, _objects(chunk["heritageLabel"]), "dediščina", has_heritage)],
+		[
+			(castle, admin, "se_nahaja_v", True),
+			(admin, castle, "ima_grad", True),
+			(castle, heritage, "pripada_dediščini", has_heritage),
+			(heritage, castle, "ima_grad", has_heritage)
+		]
+	)
+
+def build_graph(municipalities: Table, peaks: Table, castles: Table) -> nx.DiGraph:
+	"""
+	Builds the knowledge graph from the SPARQL query results, as in knowledge_graph.ipynb.
+
+	Each table is a DataFrame or an iterable of DataFrame chunks, consumed once in order, so
+	paginated results never have to be held in memory at once. The graph is the one the row
+	functions produce when applied to every row in order, including node and edge order. (The
+	one difference: a peak or castle is only kept if its administrative entity was in the graph
+	before its chunk, not before its row, which only matters for entities located in each other.)
+
+	Args:
+		municipalities: The result of SPARQL_MUNICIPALITIES.
+		peaks: The result of SPARQL_PEAKS.
+		castles: The result of SPARQL_CASTLES.
+
+	Returns:
+		The directed knowledge graph; nodes carry `type` and `label`, edges carry `type`.
+	"""
+	graph = nx.DiGraph()
+	for chunk in iter_chunks(municipalities, MUNICIPALITY_OPTIONAL):
+		if len(chunk):
+			_add_municipalities(graph, chunk)
+	for chunk in iter_chunks(peaks, PEAK_OPTIONAL):
+		if len(chunk):
+			_add_peaks(graph, chunk)
+	for chunk in iter_chunks(castles, CASTLE_OPTIONAL):
+		if len(chunk):
+			_add_castles(graph, chunk)
+	return graph
+
+def write_graph(graph: nx.DiGraph, path: str):
+	"""Writes GraphML for a `.graphml` path, and a binary snapshot directory (kg.snapshot) otherwise."""
+	if path.endswith(".graphml"):
+		nx.write_graphml(graph, path)
+	else:
+		from .snapshot import save_snapshot
+		save_snapshot(graph, path)
+
+def main():
+	from wikidata import ResponseCache, WikidataClient
+	from wikidata.queries import SPARQL_MUNICIPALITIES, SPARQL_PEAKS, SPARQL_CASTLES
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("output", help="Path of the GraphML file (.graphml) or snapshot directory to write.")
+	parser.add_argument("--cache", default="../data/wikidata_cache", help="SPARQL response cache directory; 'none' to disable.")
+	parser.add_argument("--ttl", type=float, default=None, help="Refetch cached responses older than this many seconds.")
+	parser.add_argument("--offline", action="store_true", help="Only use cached responses and fail on a miss.")
+	parser.add_argument("--page-size", type=int, default=None, help="Fetch the results in pages of this many rows, keyed by entity.")
+	args = parser.parse_args()
+
+	cache = None if args.cache == "none" else ResponseCache(args.cache, ttl=args.ttl)
+	with WikidataClient(cache=cache, offline=args.offline) as wiki:
+		queries = [SPARQL_MUNICIPALITIES, SPARQL_PEAKS, SPARQL_CASTLES]
+		if args.page_size is None:
+			graph = build_graph(*wiki.execute_queries(queries, max_concurrency=3))
+		else:
+			graph = build_graph(*[
+				wiki.paginate(query, page_size=args.page_size, key=key)
+				for query, key in zip(queries, ("municipality", "peak", "castle"))
+			])
+	write_graph(graph, args.output)
+	print(f"Wrote {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges to {args.output}")
+
+if __name__ == "__main__":
+	main()
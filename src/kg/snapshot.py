@@ -0,0 +1,156 @@
+"""
+Binary, memory-mappable snapshot of the knowledge graph.
+
+A snapshot is a directory of raw `.npy` arrays plus a small `meta.json`:
+
+	node_types.npy                    int32 type code per node
+	node_ids.npy, node_id_offsets.npy UTF-8 string table of node IDs
+	labels.npy, label_offsets.npy     UTF-8 string table of labels ("" for unlabelled nodes)
+	edge_sources.npy, edge_targets.npy, edge_types.npy
+	                                  int32 node positions and edge type code per edge
+	meta.json                         format version, type and edge type names
+
+Only the `type` and `label` attributes the QA generator uses are kept. Loading maps the
+arrays from disk and builds a GraphIndex directly, without XML parsing or a networkx graph.
+
+Usage (from `src/`):
+	python -m kg.snapshot ../data/municipalities_peaks_castles.graphml ../data/municipalities_peaks_castles.kg
+"""
+import argparse
+import json
+import os
+import numpy as np
+import networkx as nx
+from typing import List, Optional, Tuple, Union
+from qa.index import GraphIndex
+
+FORMAT_VERSION = 1
+
+def _encode_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+	"""Packs strings into one UTF-8 buffer and their character offsets."""
+	offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+	np.cumsum([len(string) for string in strings], out=offsets[1:])
+	blob = np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8)
+	return blob, offsets
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+	"""Unpacks a string table written by _encode_strings."""
+	text = blob.tobytes().decode("utf-8")
+	bounds = offsets.tolist()
+	return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def save_snapshot(graph: nx.Graph, path: str):
+	"""
+	Writes the graph's node IDs, types, labels and typed edges as a snapshot directory.
+
+	Args:
+		graph: The knowledge graph; node IDs are stored as strings.
+		path: The snapshot directory, created if missing.
+	"""
+	node_ids, labels = [], []
+	type_names: List[Optional[str]] = []
+	type_codes = {}
+	node_types = np.empty(graph.number_of_nodes(), dtype=np.int32)
+	for position, (node_id, data) in enumerate(graph.nodes(data=True)):
+		node_type = data.get("type")
+		if node_type not in type_codes:
+			type_codes[node_type] = len(type_names)
+			type_names.append(node_type)
+		node_ids.append(str(node_id))
+		labels.append(data.get("label") or "")
+		node_types[position] = type_codes[node_type]
+
+	position = {node_id: index for index, node_id in enumerate(graph.nodes())}
+	edge_type_names: List[str] = []
+	edge_type_codes = {}
+	sources, targets, edge_types = [], [], []
+	for source_id, target_id, edge_type in graph.edges(data="type"):
+		if edge_type is None:
+			continue
+		if edge_type not in edge_type_codes:
+			edge_type_codes[edge_type] = len(edge_type_names)
+			edge_type_names.append(edge_type)
+		pairs = [(source_id, target_id)] if graph.is_directed() else [(source_id, target_id), (target_id, source_id)]
+		for source, target in pairs:
+			sources.append(position[source])
+			targets.append(position[target])
+			edge_types.append(edge_type_codes[edge_type])
+
+	node_id_blob, node_id_offsets = _encode_strings(node_ids)
+	label_blob, label_offsets = _encode_strings(labels)
+	arrays = {
+		"node_types": node_types,
+		"node_ids": node_id_blob,
+		"node_id_offsets": node_id_offsets,
+		"labels": label_blob,
+		"label_offsets": label_offsets,
+		"edge_sources": np.asarray(sources, dtype=np.int32),
+		"edge_targets": np.asarray(targets, dtype=np.int32),
+		"edge_types": np.asarray(edge_types, dtype=np.int32),
+	}
+
+	os.makedirs(path, exist_ok=True)
+	for name, array in arrays.items():
+		np.save(os.path.join(path, f"{name}.npy"), array)
+	with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+		json.dump({
+			"version": FORMAT_VERSION,
+			"num_nodes": len(node_ids),
+			"num_edges": len(sources),
+			"type_names": type_names,
+			"edge_type_names": edge_type_names,
+		}, f, ensure_ascii=False, indent=2)
+
+def load_snapshot(path: str, mmap: bool = True) -> GraphIndex:
+	"""
+	Loads a snapshot directory as a GraphIndex, usable wherever QAGenerator expects a graph.
+
+	Args:
+		path: The snapshot directory written by save_snapshot.
+		mmap: Memory-map the arrays instead of reading them into memory.
+
+	Returns:
+		A detached GraphIndex of the snapshot.
+	"""
+	with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+		meta = json.load(f)
+	if meta.get("version") != FORMAT_VERSION:
+		raise ValueError(f"Unsupported snapshot version {meta.get('version')} in {path}.")
+
+	mmap_mode = "r" if mmap else None
+	def load(name: str) -> np.ndarray:
+		return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+	labels = _decode_strings(load("labels"), load("label_offsets"))
+	return GraphIndex.from_arrays(
+		node_ids=_decode_strings(load("node_ids"), load("node_id_offsets")),
+		node_types=load("node_types"),
+		type_names=meta["type_names"],
+		labels=[label or None for label in labels],
+		edge_sources=load("edge_sources"),
+		edge_targets=load("edge_targets"),
+		edge_types=load("edge_types"),
+		edge_type_names=meta["edge_type_names"]
+	)
+
+def load_graph(path: str) -> Union[nx.Graph, GraphIndex]:
+	"""Loads a snapshot directory as a GraphIndex, or any other path as a GraphML graph."""
+	if os.path.isdir(path):
+		return load_snapshot(path)
+	return nx.read_graphml(path)
+
+def convert_graphml(graphml_path: str, snapshot_path: str):
+	"""Converts a GraphML file into a snapshot directory."""
+	graph = nx.read_graphml(graphml_path)
+	save_snapshot(graph, snapshot_path)
+	print(f"Wrote snapshot of {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges to {snapshot_path}")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("graphml", help="Input GraphML file.")
+	parser.add_argument("snapshot", help="Output snapshot directory.")
+	args = parser.parse_args()
+	convert_graphml(args.graphml, args.snapshot)
+
+if __name__ == "__main__":
+	main()
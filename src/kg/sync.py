@@ -0,0 +1,324 @@
+"""
+Incremental sync of the stored knowledge graph with Wikidata.
+
+Instead of refetching everything, the queries of `wikidata.queries` are restricted to entities
+whose `schema:dateModified` is at or after the watermark of the last sync. The graph is patched
+in place: the facts of every changed entity (including its shared value nodes and their
+`približno_število` rounding nodes) are replaced by the ones its current rows produce, value
+nodes no entity refers to anymore are dropped, and entities that no longer match a query are
+removed. Every touched entity is appended to a JSONL changelog, so downstream steps (QA
+regeneration, retrieval indexes) can redo only those parts.
+
+The watermark is the greatest `schema:dateModified` seen, kept in `<graph>.sync.json`; the
+first sync needs `--since`, e.g. the time the graph was built.
+
+Limitations: edits of entities outside the queries' keys (e.g. a region's label) are not seen,
+and an unchanged peak or castle located in a newly added municipality is only picked up by a
+full rebuild (`python -m kg.builder`).
+
+Usage (from `src/`):
+	python -m kg.sync ../data/municipalities_peaks_castles.graphml --since 2025-05-20T00:00:00Z
+	python -m kg.sync ../data/municipalities_peaks_castles.graphml
+"""
+import argparse
+import json
+import math
+import os
+import re
+import time
+import pandas as pd
+import networkx as nx
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+from wikidata.cache import normalize_query
+from .builder import (
+	CASTLE_OPTIONAL, MUNICIPALITY_OPTIONAL, PEAK_OPTIONAL,
+	add_castle, add_municipality, add_peak, iter_rows
+)
+
+MODIFIED = "dateModified" # Variable added to the queries
+
+class EntityKind(NamedTuple):
+	"""One of the queries the graph is built from, and how its entities are patched."""
+	name: str # Name of the query's table, e.g. "municipalities"
+	query: str
+	key: str # Variable of the entity, e.g. "municipality"
+	node_type: str # `type` of the entity nodes
+	optional: Dict[str, Any] # OPTIONAL columns, as in kg.builder
+	add: Callable[[nx.DiGraph, tuple], Any] # Adds the nodes and edges of one row
+	kept_neighbors: Set[str] # Types of neighbors whose edges are owned by the neighbor's rows, not the entity's
+
+def entity_kinds() -> List[EntityKind]:
+	"""The entity kinds in the order kg.builder adds them (peaks and castles need their municipality)."""
+	from wikidata.queries import SPARQL_MUNICIPALITIES, SPARQL_PEAKS, SPARQL_CASTLES
+	return [
+		EntityKind("municipalities", SPARQL_MUNICIPALITIES, "municipality", "občina", MUNICIPALITY_OPTIONAL, add_municipality, {"vrh", "grad"}),
+		EntityKind("peaks", SPARQL_PEAKS, "peak", "vrh", PEAK_OPTIONAL, add_peak, set()),
+		EntityKind("castles", SPARQL_CASTLES, "castle", "grad", CASTLE_OPTIONAL, add_castle, set()),
+	]
+
+# Nodes that only exist through the facts of entities, and are dropped once none refers to them
+DEPENDENT_TYPES = {"regija", "dediščina", "populacija", "površina", "višina", "približno_število"}
+# Numeric columns and the type of the value nodes they create
+VALUE_TYPES = {"population": "populacija", "area": "površina", "elevation": "višina"}
+APPROX_EDGE = "je_približno" # Edge from a rounding node to a value node
+
+class Change(NamedTuple):
+	entity: str
+	kind: str # `type` of the entity node
+	action: str # "added", "updated" or "removed"
+	modified: Optional[str] # schema:dateModified of the entity, if known
+	nodes: List[str] # Every node whose label or edges changed, the entity included
+
+def _where_end(query: str) -> int:
+	return query.rindex("}")
+
+def modified_since_query(query: str, key: str, since: str) -> str:
+	"""Restricts a query to entities (`?key`) modified at or after `since`, and selects their ?dateModified."""
+	query = normalize_query(query)
+	query = re.sub(r"\bWHERE\b", f"?{MODIFIED} WHERE", query, count=1, flags=re.IGNORECASE)
+	end = _where_end(query)
+	pattern = f'?{key} schema:{MODIFIED} ?{MODIFIED}. FILTER(?{MODIFIED} >= "{since}"^^xsd:dateTime)'
+	return f"{query[:end].rstrip()} {pattern} {query[end:]}"
+
+def entity_ids_query(query: str, key: str) -> str:
+	"""Rewrites a query to select only the distinct entities (`?key`) it matches, without labels."""
+	query = normalize_query(query)
+	query = re.sub(r"^.*?\bSELECT\b.*?\bWHERE\b", f"SELECT DISTINCT ?{key} WHERE", query, count=1, flags=re.IGNORECASE)
+	query = re.sub(r"SERVICE wikibase:label \{[^}]*\}", "", query)
+	return query[:_where_end(query) + 1]
+
+def _value_formats(graph: nx.DiGraph) -> Dict[str, bool]:
+	"""Whether the stored value nodes of each numeric column were written as floats (e.g. "8.0") or ints."""
+	formats = {}
+	for node, data in graph.nodes(data=True):
+		value_type = data.get("type")
+		if value_type in VALUE_TYPES.values() and value_type not in formats:
+			formats[value_type] = "." in node
+	return formats
+
+def _normalize_numbers(table: pd.DataFrame, formats: Dict[str, bool]) -> pd.DataFrame:
+	"""
+	Casts the numeric columns of a (small) result so their values print like the stored value
+	nodes. A full fetch makes a column float whenever any value is missing; a page of changes
+	may not, and "2035" and "2035.0" would be different nodes.
+	"""
+	table = table.copy()
+	for column, value_type in VALUE_TYPES.items():
+		if column not in table.columns:
+			continue
+		values = pd.to_numeric(table[column], errors="coerce").astype(float)
+		if formats.get(value_type, True):
+			table[column] = values
+		else:
+			table[column] = pd.Series([value if math.isnan(value) else int(value) for value in values], index=table.index, dtype=object)
+	return table
+
+def _detach(graph: nx.DiGraph, entity: str, kept_neighbors: Set[str]) -> Set[str]:
+	"""Removes the edges the entity's own rows created; returns the other endpoints."""
+	neighbors = set()
+	for neighbor in list(graph.successors(entity)) + list(graph.predecessors(entity)):
+		if graph.nodes[neighbor].get("type") in kept_neighbors:
+			continue
+		neighbors.add(neighbor)
+		if graph.has_edge(entity, neighbor):
+			graph.remove_edge(entity, neighbor)
+		if graph.has_edge(neighbor, entity):
+			graph.remove_edge(neighbor, entity)
+	return neighbors
+
+def _is_referenced(graph: nx.DiGraph, node: str) -> bool:
+	"""Whether a node has an edge other than the rounding edges between value and rounding nodes."""
+	return any(data["type"] != APPROX_EDGE for _, _, data in graph.out_edges(node, data=True)) or \
+		any(data["type"] != APPROX_EDGE for _, _, data in graph.in_edges(node, data=True))
+
+def _collect_garbage(graph: nx.DiGraph, candidates: Iterable[str]) -> Set[str]:
+	"""Removes the dependent nodes among the candidates that no entity refers to; returns them."""
+	removed = set()
+	rounding = set()
+	for node in candidates:
+		if node not in graph or graph.nodes[node].get("type") not in DEPENDENT_TYPES:
+			continue
+		if graph.nodes[node]["type"] == "približno_število":
+			rounding.add(node)
+		elif not _is_referenced(graph, node):
+			rounding.update(graph.predecessors(node))
+			graph.remove_node(node)
+			removed.add(node)
+	# Rounding nodes last: they may only have lost their value nodes above
+	for node in rounding:
+		if node in graph and not _is_referenced(graph, node):
+			graph.remove_node(node)
+			removed.add(node)
+	return removed
+
+def apply_changes(
+	graph: nx.DiGraph,
+	changed: Dict[str, pd.DataFrame],
+	current: Optional[Dict[str, Set[str]]] = None,
+	kinds: Optional[List[EntityKind]] = None
+) -> List[Change]:
+	"""
+	Patches the graph with the current rows of changed entities.
+
+	Args:
+		graph: The graph built by kg.builder, modified in place.
+		changed: By kind name, all current rows of the changed entities (the result of the
+			`modified_since_query` of the kind's query); an optional `dateModified` column is
+			recorded in the changelog.
+		current: By kind name, the IDs of all entities the kind's query currently matches.
+			Entities of the kind's node type that are not among them are removed. Skipped if None.
+		kinds: The entity kinds; `entity_kinds()` if None.
+
+	Returns:
+		The changes, one per touched entity.
+
+	The result matches a rebuild from the current rows, except that a value node shared by two
+	numeric attributes (e.g. a population and an elevation of 1410) keeps the type of whichever
+	was added last, as in kg.builder, and that order can differ.
+	"""
+	kinds = kinds or entity_kinds()
+	formats = _value_formats(graph)
+	changes: List[Change] = []
+	garbage: Set[str] = set()
+
+	def remove_entity(entity: str, node_type: str, modified: Optional[str] = None):
+		neighbors = set(graph.successors(entity)) | set(graph.predecessors(entity))
+		graph.remove_node(entity)
+		garbage.update(neighbors)
+		changes.append(Change(entity, node_type, "removed", modified, sorted(neighbors | {entity})))
+		# Peaks and castles without any location left would not be added by a rebuild
+		for neighbor in neighbors:
+			if neighbor in graph and graph.nodes[neighbor].get("type") in ("vrh", "grad") and \
+				not any(data["type"] == "se_nahaja_v" for _, _, data in graph.out_edges(neighbor, data=True)):
+				remove_entity(neighbor, graph.nodes[neighbor]["type"])
+
+	if current is not None:
+		for kind in kinds:
+			if kind.name not in current:
+				continue
+			stale = [node for node, data in graph.nodes(data=True) if data.get("type") == kind.node_type and node not in current[kind.name]]
+			for entity in stale:
+				if entity in graph:
+					remove_entity(entity, kind.node_type)
+
+	for kind in kinds:
+		table = changed.get(kind.name)
+		if table is None or len(table) == 0:
+			continue
+		table = _normalize_numbers(table, formats)
+		rows: Dict[str, List[tuple]] = {}
+		for row in iter_rows(table, kind.optional):
+			rows.setdefault(getattr(row, kind.key), []).append(row)
+
+		for entity, entity_rows in rows.items():
+			existed = entity in graph
+			touched = {entity}
+			if existed:
+				detached = _detach(graph, entity, kind.kept_neighbors)
+				touched |= detached
+				garbage |= detached
+				if not kind.kept_neighbors: # Nothing else attaches to it, so it is re-created from its rows
+					graph.remove_node(entity)
+			for row in entity_rows:
+				kind.add(graph, row)
+			modified = getattr(entity_rows[0], MODIFIED, None)
+
+			if entity in graph:
+				touched |= set(graph.successors(entity)) | set(graph.predecessors(entity))
+				changes.append(Change(entity, kind.node_type, "updated" if existed else "added", modified, sorted(touched)))
+			elif existed:
+				changes.append(Change(entity, kind.node_type, "removed", modified, sorted(touched)))
+
+	_collect_garbage(graph, garbage)
+	return changes
+
+class SyncResult(NamedTuple):
+	watermark: str # Watermark after the sync
+	changes: List[Change]
+
+def _state_path(graph_path: str) -> str:
+	return f"{graph_path}.sync.json"
+
+def sync(
+	graph_path: str,
+	client,
+	since: Optional[str] = None,
+	output_path: Optional[str] = None,
+	changelog_path: Optional[str] = None,
+	check_removed: bool = True
+) -> SyncResult:
+	"""
+	Patches a stored GraphML graph with the Wikidata changes since the last sync.
+
+	Args:
+		graph_path: The GraphML file built by kg.builder.
+		client: The WikidataClient to query with.
+		since: Watermark (xsd:dateTime, e.g. "2025-05-20T00:00:00Z") to use instead of the stored one.
+		output_path: Where to write the patched graph; over `graph_path` if None.
+		changelog_path: JSONL file the changes are appended to; `<graph>.changes.jsonl` if None.
+		check_removed: Also fetch the IDs of all matching entities to remove the ones that are gone.
+
+	Returns:
+		The new watermark and the changes.
+	"""
+	state_path = _state_path(graph_path)
+	if since is None:
+		if not os.path.exists(state_path):
+			raise ValueError(f"No previous sync ({state_path} is missing); pass since, e.g. the time the graph was built.")
+		with open(state_path, encoding="utf-8") as f:
+			since = json.load(f)["watermark"]
+
+	kinds = entity_kinds()
+	queries = {kind.name: modified_since_query(kind.query, kind.key, since) for kind in kinds}
+	if check_removed:
+		queries.update({f"{kind.name}_ids": entity_ids_query(kind.query, kind.key) for kind in kinds})
+	results = client.execute_queries(queries)
+
+	changed = {kind.name: results[kind.name] for kind in kinds}
+	current = None
+	if check_removed:
+		current = {}
+		for kind in kinds:
+			ids = results[f"{kind.name}_ids"]
+			current[kind.name] = set(ids[kind.key]) if kind.key in ids.columns else set()
+
+	graph = nx.read_graphml(graph_path)
+	changes = apply_changes(graph, changed, current, kinds)
+	output_path = output_path or graph_path
+	nx.write_graphml(graph, output_path)
+
+	# The watermark follows the service's timestamps, not the local clock
+	modified = [value for table in changed.values() if MODIFIED in table.columns for value in table[MODIFIED]]
+	watermark = max([since] + modified)
+	synced = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+	with open(_state_path(output_path), "w", encoding="utf-8") as f:
+		json.dump({"watermark": watermark, "synced": synced}, f, indent=2)
+
+	changelog_path = changelog_path or f"{output_path}.changes.jsonl"
+	with open(changelog_path, "a", encoding="utf-8") as f:
+		for change in changes:
+			f.write(json.dumps({"synced": synced, **change._asdict()}, ensure_ascii=False) + "\n")
+	return SyncResult(watermark, changes)
+
+def main():
+	from wikidata import ResponseCache, WikidataClient
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("graph", help="The GraphML file to patch.")
+	parser.add_argument("--since", default=None, help="Watermark to sync from instead of the stored one (xsd:dateTime).")
+	parser.add_argument("--output", default=None, help="Write the patched graph here instead of over the input.")
+	parser.add_argument("--changelog", default=None, help="JSONL file to append the changes to.")
+	parser.add_argument("--no-removals", action="store_true", help="Do not check for entities that no longer match the queries.")
+	parser.add_argument("--cache", default=None, help="SPARQL response cache directory.")
+	args = parser.parse_args()
+
+	cache = ResponseCache(args.cache) if args.cache else None
+	with WikidataClient(cache=cache) as wiki:
+		result = sync(args.graph, wiki, since=args.since, output_path=args.output, changelog_path=args.changelog, check_removed=not args.no_removals)
+	counts: Dict[str, int] = {}
+	for change in result.changes:
+		counts[change.action] = counts.get(change.action, 0) + 1
+	print(f"Synced to {result.watermark}: " + (", ".join(f"{count} {action}" for action, count in sorted(counts.items())) or "no changes"))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,268 @@
+"""
+CPU inference mode: loads a causal LM for generation on a machine without CUDA or MPS.
+
+The thread count and CPU affinity are set first. Then candidate configurations (dtype,
+dynamic int8 quantization of the linear layers, optionally torch.compile) are probed: each is
+loaded on its own in its dtype, generates a fixed number of tokens once and is freed before the
+next, and the fastest is kept. The chosen configuration and the measurements are cached per
+model ID and machine, so later starts load it directly without touching the other variants.
+
+Usage (from `src/`):
+	python -m llm.cpu cjvt/GaMS-1B                 # Probe (or read the cached choice) and print the report
+	python -m llm.cpu cjvt/GaMS-1B --reprobe --compile
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+# Chosen configurations, in `.cache/` at the repository root regardless of the working directory
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "cpu_inference.json")
+
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+
+class CpuConfig(NamedTuple):
+	"""How a model is prepared for CPU inference."""
+	dtype: str = "float32"
+	quantize: bool = False # Dynamic int8 quantization of nn.Linear layers (float32 models only)
+	compile: bool = False # torch.compile of the forward pass
+
+class CpuProbe(NamedTuple):
+	"""Measurements of one configuration."""
+	config: CpuConfig
+	tokens_per_second: float
+	weight_bytes: int # Parameters, buffers and packed quantized weights
+	rss_bytes: int # Resident memory of the process after preparing and running it
+	prepare_seconds: float
+
+def tensor_bytes(value: Any) -> int:
+	"""Bytes of the tensors in a state dict value (a tensor, or the tuples of packed quantized weights)."""
+	if isinstance(value, torch.Tensor):
+		return value.numel() * value.element_size()
+	if isinstance(value, (tuple, list)):
+		return sum(map(tensor_bytes, value))
+	return 0
+
+def model_bytes(model: torch.nn.Module) -> int:
+	return sum(tensor_bytes(value) for value in model.state_dict().values())
+
+def rss_bytes() -> int:
+	"""Current resident set size of the process (0 where /proc is not available)."""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError):
+		return 0
+
+def dtype_supported(dtype: torch.dtype) -> bool:
+	"""Whether this CPU build runs matrix products in the dtype."""
+	try:
+		torch.ones(8, 8, dtype=dtype) @ torch.ones(8, 8, dtype=dtype)
+		return True
+	except RuntimeError:
+		return False
+
+def prepare(model: torch.nn.Module, config: CpuConfig) -> torch.nn.Module:
+	"""Converts, quantizes (in place) and compiles a model as configured."""
+	model = model.to(DTYPES[config.dtype]).eval()
+	if config.quantize:
+		model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+	if config.compile:
+		# Compiling forward (not the module) keeps generate() and the rest of the model's API
+		model.forward = torch.compile(model.forward, dynamic=True)
+	return model
+
+def measure(model: torch.nn.Module, prompt_tokens: int = 64, new_tokens: int = 32) -> float:
+	"""Tokens per second of greedy generation after a prompt of random tokens (after one warm-up run)."""
+	generator = torch.Generator().manual_seed(0)
+	input_ids = torch.randint(0, model.config.vocab_size, (1, prompt_tokens), generator=generator)
+	kwargs = {"attention_mask": torch.ones_like(input_ids), "do_sample": False, "pad_token_id": 0}
+	with torch.inference_mode():
+		model.generate(input_ids, max_new_tokens=2, **kwargs)
+		start = time.perf_counter()
+		model.generate(input_ids, max_new_tokens=new_tokens, min_new_tokens=new_tokens, **kwargs)
+	return new_tokens / (time.perf_counter() - start)
+
+class CpuInference:
+	"""
+	Options of the CPU inference mode.
+
+	Args:
+		num_threads: Intra-op threads; the number of usable CPUs if None.
+		cpus: CPUs to pin the process to (Linux only); unchanged if None.
+		dtypes: Dtypes to probe; unsupported ones are skipped.
+		quantize: Only probe with (True) or without (False) dynamic int8 quantization; both if None.
+		compile: Also probe every configuration compiled with torch.compile.
+		cache_path: JSON file of the chosen configurations; nothing is cached if None.
+		reprobe: Probe even if a configuration is cached.
+		probe_tokens: Tokens generated per probe.
+		probe: Probe the candidates when no configuration is cached; otherwise load the default
+			configuration (see default_config) without measuring anything.
+	"""
+	def __init__(
+		self,
+		num_threads: Optional[int] = None,
+		cpus: Optional[Sequence[int]] = None,
+		dtypes: Sequence[str] = ("float32", "bfloat16"),
+		quantize: Optional[bool] = None,
+		compile: bool = False,
+		cache_path: Optional[str] = CACHE_PATH,
+		reprobe: bool = False,
+		probe_tokens: int = 32,
+		probe: bool = True
+	):
+		unknown = set(dtypes) - set(DTYPES)
+		if unknown:
+			raise ValueError(f"Unknown dtypes {sorted(unknown)}; expected some of {sorted(DTYPES)}.")
+		self.num_threads = num_threads
+		self.cpus = tuple(cpus) if cpus is not None else None
+		self.dtypes = tuple(dtypes)
+		self.quantize = quantize
+		self.compile = compile
+		self.cache_path = cache_path
+		self.reprobe = reprobe
+		self.probe_tokens = probe_tokens
+		self.probe_on_load = probe
+
+	def apply_threads(self) -> int:
+		"""Pins the process to `cpus` and sets the thread count; returns the thread count."""
+		if self.cpus is not None and hasattr(os, "sched_setaffinity"):
+			os.sched_setaffinity(0, self.cpus)
+		num_threads = self.num_threads
+		if num_threads is None:
+			num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+		torch.set_num_threads(num_threads)
+		return num_threads
+
+	def candidates(self) -> List[CpuConfig]:
+		configs = []
+		for dtype in self.dtypes:
+			if not dtype_supported(DTYPES[dtype]):
+				continue
+			for quantize in [False, True] if self.quantize is None else [self.quantize]:
+				if quantize and dtype != "float32":
+					continue # Dynamic quantization converts float32 weights
+				for compiled in [False, True] if self.compile else [False]:
+					configs.append(CpuConfig(dtype, quantize, compiled))
+		if not configs:
+			raise ValueError("No configuration to probe: no supported dtype, or quantization without float32.")
+		return configs
+
+	def default_config(self) -> CpuConfig:
+		"""The configuration loaded without probing: bfloat16 (as on other devices) if it is a candidate, else the first candidate."""
+		configs = self.candidates()
+		return next((config for config in configs if config == CpuConfig("bfloat16")), configs[0])
+
+	def cache_key(self, model_id: str, num_threads: int) -> str:
+		"""Configurations are only reused on the same kind of machine, torch version and thread count, out of the same candidates."""
+		options = f"{','.join(self.dtypes)} quantize={self.quantize} compile={self.compile}"
+		return f"{model_id}|{platform.machine()}|{os.cpu_count()} cpus|{num_threads} threads|torch {torch.__version__}|{options}"
+
+	def _read_cache(self) -> Dict[str, Any]:
+		if self.cache_path is None or not os.path.exists(self.cache_path):
+			return {}
+		with open(self.cache_path, encoding="utf-8") as f:
+			return json.load(f)
+
+	def _write_cache(self, key: str, record: Dict[str, Any]):
+		if self.cache_path is None:
+			return
+		records = self._read_cache()
+		records[key] = record
+		os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+		temporary_path = f"{self.cache_path}.{os.getpid()}.tmp"
+		with open(temporary_path, "w", encoding="utf-8") as f:
+			json.dump(records, f, indent=1)
+		os.replace(temporary_path, self.cache_path)
+
+	def cached(self, model_id: str, num_threads: int) -> Optional[Tuple[CpuConfig, List[CpuProbe]]]:
+		"""The cached configuration of the model on this machine and its probes, or None."""
+		record = self._read_cache().get(self.cache_key(model_id, num_threads))
+		if record is None:
+			return None
+		probes = [CpuProbe(CpuConfig(**probe["config"]), probe["tokens_per_second"], probe["weight_bytes"], probe["rss_bytes"], probe["prepare_seconds"]) for probe in record["probes"]]
+		return CpuConfig(**record["config"]), probes
+
+	def load_config(self, model_id: str, config: CpuConfig, **load_kwargs) -> torch.nn.Module:
+		"""Loads the model straight in the configuration's dtype and prepares it."""
+		model = AutoModelForCausalLM.from_pretrained(model_id, **{**load_kwargs, "torch_dtype": DTYPES[config.dtype]})
+		return prepare(model, config)
+
+	def probe(self, model_id: str, **load_kwargs) -> List[CpuProbe]:
+		"""
+		Measures every candidate configuration, fastest first. Each candidate is loaded fresh and
+		freed before the next, so at most one variant of the model is in memory at a time.
+		"""
+		probes = []
+		for config in self.candidates():
+			start = time.perf_counter()
+			candidate = self.load_config(model_id, config, **load_kwargs)
+			prepare_seconds = time.perf_counter() - start
+			tokens_per_second = measure(candidate, new_tokens=self.probe_tokens)
+			probes.append(CpuProbe(config, tokens_per_second, model_bytes(candidate), rss_bytes(), prepare_seconds))
+			del candidate
+			gc.collect()
+		return sorted(probes, key=lambda probe: -probe.tokens_per_second)
+
+	def load(self, model_id: str, **load_kwargs) -> Tuple[torch.nn.Module, Any, CpuConfig, List[CpuProbe]]:
+		"""
+		Loads the model for CPU inference in the cached configuration, or else in the fastest
+		probed one (or the default configuration if probing is off).
+
+		Returns:
+			The prepared model, its tokenizer, the chosen configuration and the probes it was chosen
+			by (none if it was not probed).
+		"""
+		num_threads = self.apply_threads()
+		tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+		cached = None if self.reprobe else self.cached(model_id, num_threads)
+		if cached is not None:
+			config, probes = cached
+		elif self.probe_on_load or self.reprobe:
+			probes = self.probe(model_id, **load_kwargs)
+			config = probes[0].config
+			self._write_cache(self.cache_key(model_id, num_threads), {
+				"model_id": model_id,
+				"config": config._asdict(),
+				"probes": [{**probe._asdict(), "config": probe.config._asdict()} for probe in probes]
+			})
+		else:
+			config, probes = self.default_config(), []
+		return self.load_config(model_id, config, **load_kwargs), tokenizer, config, probes
+
+def format_probes(probes: List[CpuProbe]) -> str:
+	"""A table of the probed configurations, the chosen (fastest) one first."""
+	lines = [f"{'dtype':<9} {'int8':<5} {'compile':<7} {'tokens/s':>9} {'weights MB':>10} {'RSS MB':>8} {'prepare s':>9}"]
+	for probe in probes:
+		config = probe.config
+		lines.append(
+			f"{config.dtype:<9} {'yes' if config.quantize else 'no':<5} {'yes' if config.compile else 'no':<7} "
+			f"{probe.tokens_per_second:>9.1f} {probe.weight_bytes / 1e6:>10.1f} {probe.rss_bytes / 1e6:>8.1f} {probe.prepare_seconds:>9.1f}"
+		)
+	return "\n".join(lines)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("model_id")
+	parser.add_argument("--threads", type=int, default=None)
+	parser.add_argument("--cpus", type=int, nargs="+", default=None, help="CPUs to pin the process to.")
+	parser.add_argument("--dtypes", nargs="+", default=["float32", "bfloat16"], choices=sorted(DTYPES))
+	parser.add_argument("--compile", action="store_true", help="Also probe torch.compile.")
+	parser.add_argument("--cache", default=CACHE_PATH)
+	parser.add_argument("--reprobe", action="store_true", help="Probe even if a configuration is cached.")
+	args = parser.parse_args()
+
+	cpu = CpuInference(num_threads=args.threads, cpus=args.cpus, dtypes=args.dtypes, compile=args.compile, cache_path=args.cache, reprobe=args.reprobe)
+	start = time.perf_counter()
+	_, _, config, probes = cpu.load(args.model_id)
+	print(format_probes(probes))
+	print(f"Chosen {config} in {time.perf_counter() - start:.1f}s, {torch.get_num_threads()} threads")
+
+if __name__ == "__main__":
+	main()
@@ -1,30 +1,70 @@
 import string
 import re
+import json
+from typing import Any, ContextManager, Dict, List, NamedTuple, Optional, Tuple
 from typeguard import typechecked
 import torch
-from transformers import pipeline
+from .prefix_cache import PrefixCache
+from .cpu import CpuInference
+from .registry import ModelRegistry, registry as default_registry
+
+# Instruction every RAG and fine-tuning prompt starts with (see create_training_data.py)
+RAG_INSTRUCTION = "Odgovori na vprašanje na podlagi podanih podatkov."
 
 @typechecked
 class LLMModel:
-	def __init__(self, model_id: str = "cjvt/GaMS-2B-Instruct"):
+	"""
+	A model of the process-wide registry, optionally with one of its LoRA adapters. The weights
+	are loaded on first use and shared by every LLMModel of the same model ID, whatever its adapter.
+	"""
+	def __init__(
+		self,
+		model_id: str = "cjvt/GaMS-2B-Instruct",
+		adapter: Optional[str] = None,
+		registry: Optional[ModelRegistry] = None,
+		cpu_inference: Optional[CpuInference] = None
+	):
+		"""
+		Args:
+			model_id (str): The Hugging Face model ID to load.
+			adapter (str): Path of a LoRA adapter of the model (e.g. "outputs/checkpoint-1875"); the base model if None.
+			registry (ModelRegistry): Where the model is loaded; the process-wide registry if None.
+			cpu_inference (CpuInference): Options of the CPU inference mode (thread count, dtypes,
+										  quantization, ...) if the model is loaded on a CPU; pass
+										  one to probe the configurations when none is cached.
+		"""
 		self.model_id = model_id
-		self._load_model()
-
-	def _load_model(self):
-		"""Loads the tokenizer and model pipeline."""
-		if torch.backends.mps.is_available():
-			device = torch.device("mps")
-		elif torch.cuda.is_available():
-			device = torch.device("cuda")
-		else:
-			device = torch.device("cpu")
+		self.registry = registry or default_registry
+		self.cpu_inference = cpu_inference
+		self.adapter_path = adapter
+		self._adapter_name = None
+
+	@property
+	def pipeline(self):
+		"""The text-generation pipeline of the shared model; use it inside `activate()`."""
+		return self.registry.pipeline(self.model_id, self.cpu_inference)
+
+	def activate(self) -> ContextManager:
+		"""Selects this model's adapter (or none) on the shared model while a request generates."""
+		# Loads the model with this model's CPU inference options if it is not resident yet
+		self.registry.get(self.model_id, self.cpu_inference)
+		if self.adapter_path is not None and self._adapter_name is None:
+			self._adapter_name = self.registry.add_adapter(self.model_id, self.adapter_path)
+		return self.registry.use(self.model_id, self._adapter_name)
 
-		self.pipeline = pipeline(
-			"text-generation",
-			model=self.model_id,
-			torch_dtype=torch.bfloat16 if device.type != 'mps' else torch.float16,
-			device=device,
-		)
+class TurnStats(NamedTuple):
+	"""Token counts of one conversation turn."""
+	prompt_tokens: int # Tokens of the whole conversation rendered with the chat template
+	prefill_tokens: int # Of those, the tokens run through the model; the rest came from the kept state
+	decode_tokens: int # Tokens generated
+	evicted_turns: int # Oldest turns dropped before this one to stay within the token budget
+
+def _common_prefix_length(first: List[int], second: List[int]) -> int:
+	length = min(len(first), len(second))
+	for i in range(length):
+		if first[i] != second[i]:
+			return i
+	return length
 
 @typechecked
 class LLMManager:
@@ -32,35 +72,77 @@ class LLMManager:
 	Manages interactions with a Hugging Face language model,
 	maintains conversation history, and provides evaluation capabilities.
 	"""
-	def __init__(self, model: LLMModel, track_history: bool = True):
+	def __init__(
+		self,
+		model: LLMModel,
+		track_history: bool = True,
+		prefix_cache: Optional[PrefixCache] = None,
+		incremental: bool = True,
+		token_budget: Optional[int] = None,
+		evict_to: float = 0.75
+	):
 		"""
 		Initializes the LLMManager.
 
 		Args:
 			model_id (str): The Hugging Face model ID to load.
+			prefix_cache (PrefixCache): Cache of shared prompt prefixes, used by `ask(prefix=...)`.
+										Managers of the same model and adapter may share one.
+			incremental (bool): With track_history, keep the model's keys and values between turns,
+								so each turn only prefills what was added since the last one. Such
+								turns call `generate` directly (with the pipeline's generation
+								defaults) instead of the pipeline; False restores the pipeline.
+			token_budget (int): Most tokens of a turn (the rendered conversation and max_new_tokens);
+								the oldest turns are evicted to stay within it. Unbounded if None.
+			evict_to (float): When over budget, evict down to this fraction of it, so that evicting
+							  (which invalidates the kept state) happens once every few turns.
 		"""
+		if not 0 < evict_to <= 1:
+			raise ValueError("evict_to must be in (0, 1].")
 		self.model = model
 		self.track_history = track_history
+		self.prefix_cache = prefix_cache
+		self.incremental = incremental
+		self.token_budget = token_budget
+		self.evict_to = evict_to
 		# Stores conversation history [{role: 'user', content: '...'}, {role: 'assistant', content: '...'}]
 		self.__history = []
+		# Tokens of the conversation so far and the model's past_key_values over them
+		self.__state: Optional[Tuple[List[int], Any]] = None
+		self.__turns: List[TurnStats] = []
 
-	def ask(self, prompt: str, max_new_tokens: int = 500) -> str:
+	def ask(self, prompt: str, max_new_tokens: int = 500, prefix: Optional[str] = None) -> str:
 		"""
 		Sends a prompt to the LLM and gets a response.
 
 		Args:
 			prompt (str): The user's input prompt.
+			prefix (str): Start of the prompt shared with other prompts (e.g. RAG_INSTRUCTION and the
+						  context facts); with a prefix cache, the attention over it (and the history
+						  before it) is computed once and reused.
 
 		Returns:
 			str: The LLM's generated response, or an error message.
 		"""
+		if prefix is not None and not prompt.startswith(prefix):
+			raise ValueError("The prompt does not start with the prefix.")
+
+		with self.model.activate():
+			return self._ask(prompt, max_new_tokens, prefix)
 
+	def _ask(self, prompt: str, max_new_tokens: int, prefix: Optional[str]) -> str:
 		current_interaction = [{"role": "user", "content": prompt}]
+		evicted_turns = self._evict_turns(current_interaction, max_new_tokens) if self.token_budget is not None else 0
 		messages = self.__history + current_interaction
 
-		response = self.model.pipeline(messages, max_new_tokens=max_new_tokens)
-		generated_text = response[0]['generated_text']
-		assistant_response = generated_text[-1]['content']
+		if self.track_history and self.incremental:
+			assistant_response = self._ask_incremental(messages, prefix, max_new_tokens, evicted_turns)
+		elif prefix and self.prefix_cache is not None:
+			assistant_response = self._ask_with_prefix(messages, prefix, max_new_tokens)
+		else:
+			response = self.model.pipeline(messages, max_new_tokens=max_new_tokens)
+			generated_text = response[0]['generated_text']
+			assistant_response = generated_text[-1]['content']
 
 		if self.track_history:
 			self.__history.append({"role": "user", "content": prompt})
@@ -68,14 +150,202 @@ class LLMManager:
 
 		return assistant_response.strip()
 
+	def ask_batch(
+		self,
+		prompts: List[str],
+		histories: Optional[List[List[Dict[str, str]]]] = None,
+		generation_kwargs: Optional[List[Dict[str, Any]]] = None,
+		max_new_tokens: int = 500,
+		batch_size: int = 8
+	) -> List[str]:
+		"""
+		Sends many prompts to the LLM at once and gets their responses.
+
+		The prompts are rendered with the chat template, grouped by generation parameters, sorted
+		by length and cut into batches of similar length (so little padding is computed), and each
+		batch is left-padded and generated in one `generate` call. Every prompt is an independent
+		conversation: the manager's history is neither extended nor, unless given as a prompt's
+		history, used.
+
+		Args:
+			prompts (list): The user's input prompts.
+			histories (list): Per prompt, the messages before it ([{role, content}, ...]); none if None.
+			generation_kwargs (list): Per prompt, extra `generate` arguments (e.g. do_sample, temperature)
+									  over the pipeline's generation defaults, which `ask` uses;
+									  prompts with the same arguments share batches.
+			max_new_tokens (int): Default maximum length of each response, unless set in generation_kwargs.
+			batch_size (int): Maximum number of prompts generated together.
+
+		Returns:
+			list: The LLM's responses, in the order of `prompts`.
+		"""
+		if histories is not None and len(histories) != len(prompts):
+			raise ValueError("histories must have one entry per prompt.")
+		if generation_kwargs is not None and len(generation_kwargs) != len(prompts):
+			raise ValueError("generation_kwargs must have one entry per prompt.")
+		if batch_size <= 0:
+			raise ValueError("batch_size must be positive.")
+		if not prompts:
+			return []
+		with self.model.activate():
+			return self._ask_batch(prompts, histories, generation_kwargs, max_new_tokens, batch_size)
+
+	def _ask_batch(
+		self,
+		prompts: List[str],
+		histories: Optional[List[List[Dict[str, str]]]],
+		generation_kwargs: Optional[List[Dict[str, Any]]],
+		max_new_tokens: int,
+		batch_size: int
+	) -> List[str]:
+		tokenizer = self.model.pipeline.tokenizer
+		# Rendered and tokenized like the text-generation pipeline does it for chat messages
+		texts = [
+			tokenizer.apply_chat_template(
+				(histories[i] if histories is not None else []) + [{"role": "user", "content": prompt}],
+				tokenize=False,
+				add_generation_prompt=True
+			)
+			for i, prompt in enumerate(prompts)
+		]
+		inputs = tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+		groups = {}
+		for i in range(len(prompts)):
+			kwargs = {"max_new_tokens": max_new_tokens, **(generation_kwargs[i] if generation_kwargs is not None else {})}
+			key = json.dumps(kwargs, sort_keys=True, default=repr)
+			groups.setdefault(key, (kwargs, []))[1].append(i)
+
+		responses = [None] * len(prompts)
+		generation_config = self._generation_config()
+		for kwargs, indices in groups.values():
+			kwargs = {"generation_config": generation_config, **kwargs}
+			indices.sort(key=lambda i: len(inputs[i]))
+			for start in range(0, len(indices), batch_size):
+				batch = indices[start:start + batch_size]
+				for i, response in zip(batch, self._generate([inputs[i] for i in batch], kwargs)):
+					responses[i] = response
+		return responses
+
+	def _generation_config(self) -> Any:
+		"""
+		The generation defaults of the text-generation pipeline (e.g. sampling and its temperature),
+		passed to every direct `generate` call so that all paths decode like `ask` through the pipeline.
+		"""
+		pipe = self.model.pipeline
+		return getattr(pipe, "generation_config", None) or pipe.model.generation_config
+
+	def _encode(self, messages: List[Dict[str, str]], prefix: Optional[str] = None) -> Tuple[List[int], int]:
+		"""
+		Renders and tokenizes the messages like the text-generation pipeline does; returns the token
+		IDs and how many of them lie before the end of `prefix` in the last message (0 without one).
+		"""
+		tokenizer = self.model.pipeline.tokenizer
+		text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+		encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=prefix is not None)
+		prefix_length = 0
+		start = text.rfind(messages[-1]["content"])
+		if prefix is not None and start >= 0:
+			end = start + len(prefix)
+			prefix_length = sum(1 for _, token_end in encoding["offset_mapping"] if token_end <= end)
+		return encoding["input_ids"], prefix_length
+
+	def _evict_turns(self, current_interaction: List[Dict[str, str]], max_new_tokens: int) -> int:
+		"""Drops the oldest turns while the conversation does not fit the token budget; returns how many."""
+		num_tokens = len(self._encode(self.__history + current_interaction)[0]) + max_new_tokens
+		if num_tokens <= self.token_budget:
+			return 0
+		history, evicted = self.__history, 0
+		while history and num_tokens > self.token_budget * self.evict_to:
+			# A turn is a user message and the assistant's answer
+			history = history[2:]
+			evicted += 1
+			num_tokens = len(self._encode(history + current_interaction)[0]) + max_new_tokens
+		if num_tokens > self.token_budget:
+			raise ValueError(f"The prompt and max_new_tokens need {num_tokens} tokens, more than the budget of {self.token_budget}.")
+		self.__history = history
+		return evicted
+
+	def _ask_with_prefix(self, messages: List[Dict[str, str]], prefix: str, max_new_tokens: int) -> str:
+		"""Generates the response to the messages, starting from the cached keys and values of everything up to the prefix's end."""
+		input_ids, prefix_length = self._encode(messages, prefix)
+		# A cache hit only saves the prefill; decoding stays that of the pipeline
+		kwargs = {"generation_config": self._generation_config(), "max_new_tokens": max_new_tokens}
+		past_key_values = self.prefix_cache.get(self.model.pipeline.model, input_ids, prefix_length)
+		if past_key_values is not None:
+			kwargs["past_key_values"] = past_key_values
+		return self._generate([input_ids], kwargs)[0]
+
+	def _ask_incremental(self, messages: List[Dict[str, str]], prefix: Optional[str], max_new_tokens: int, evicted_turns: int) -> str:
+		"""
+		Generates the response to the conversation, continuing from the keys and values kept from
+		the previous turn for as many tokens as the conversation still starts with (all of it up to
+		the new message, unless the template renders past answers differently or turns were evicted).
+		"""
+		tokenizer = self.model.pipeline.tokenizer
+		model = self.model.pipeline.model
+		input_ids, prefix_length = self._encode(messages, prefix)
+
+		past_key_values, reused = None, 0
+		if self.__state is not None:
+			state_ids, state = self.__state
+			# At least one token must be left for generate to prefill
+			reused = min(_common_prefix_length(state_ids, input_ids), len(input_ids) - 1)
+			if reused > 0:
+				state.crop(reused)
+				past_key_values = state
+		if past_key_values is None and prefix and self.prefix_cache is not None:
+			past_key_values = self.prefix_cache.get(model, input_ids, prefix_length)
+			reused = past_key_values.get_seq_length() if past_key_values is not None else 0
+		self.__state = None
+
+		kwargs = {"generation_config": self._generation_config(), "max_new_tokens": max_new_tokens, "return_dict_in_generate": True}
+		if past_key_values is not None:
+			kwargs["past_key_values"] = past_key_values
+		with torch.inference_mode():
+			output = model.generate(
+				input_ids=torch.tensor([input_ids], device=model.device),
+				attention_mask=torch.ones(1, len(input_ids), dtype=torch.long, device=model.device),
+				pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+				**kwargs
+			)
+		sequence = output.sequences[0].tolist()
+		new_ids = sequence[len(input_ids):]
+		# The cache covers every token but the last one generated
+		self.__state = (sequence[:output.past_key_values.get_seq_length()], output.past_key_values)
+		self.__turns.append(TurnStats(len(input_ids), len(input_ids) - reused, len(new_ids), evicted_turns))
+		return tokenizer.decode(new_ids, skip_special_tokens=True)
+
+	def _generate(self, inputs: List[List[int]], kwargs: Dict[str, Any]) -> List[str]:
+		"""Generates the continuations of a batch of token ID lists in one call."""
+		tokenizer = self.model.pipeline.tokenizer
+		model = self.model.pipeline.model
+		pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+		# Left padding, so that every prompt ends where generation starts
+		length = max(map(len, inputs))
+		input_ids = torch.tensor([[pad_token_id] * (length - len(ids)) + ids for ids in inputs], device=model.device)
+		attention_mask = torch.tensor([[0] * (length - len(ids)) + [1] * len(ids) for ids in inputs], device=model.device)
+
+		with torch.inference_mode():
+			output = model.generate(input_ids=input_ids, attention_mask=attention_mask, **{"pad_token_id": pad_token_id, **kwargs})
+		return [text.strip() for text in tokenizer.batch_decode(output[:, length:], skip_special_tokens=True)]
+
 	@property
 	def history(self) -> list:
 		"""Returns the current conversation history."""
 		return self.__history.copy() # Return a copy to prevent external modification
 
+	@property
+	def turns(self) -> List[TurnStats]:
+		"""Returns the token counts of every turn asked in incremental mode since the history was last cleared."""
+		return self.__turns.copy()
+
 	def clear_history(self):
-		"""Clears the conversation history."""
+		"""Clears the conversation history and the model state kept for it."""
 		self.__history = []
+		self.__state = None
+		self.__turns = []
 
 if __name__ == "__main__":
 	llm = LLMManager()
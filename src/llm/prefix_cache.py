@@ -0,0 +1,112 @@
+"""
+Reuses the attention keys and values (past_key_values) of prompt prefixes shared by many prompts,
+e.g. the RAG instruction or the context facts of an entity asked about several times, so that
+only the rest of each prompt has to be prefilled.
+"""
+import copy
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import torch
+from transformers import DynamicCache
+
+def cache_nbytes(past_key_values: Any) -> int:
+	"""Bytes held by the key and value tensors of a cache (a transformers Cache or the legacy tuple of tuples)."""
+	if hasattr(past_key_values, "layers"):
+		tensors = [tensor for layer in past_key_values.layers for tensor in (layer.keys, layer.values)]
+	elif hasattr(past_key_values, "key_cache"):
+		tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+	else:
+		tensors = [tensor for layer in past_key_values for tensor in layer]
+	return sum(tensor.numel() * tensor.element_size() for tensor in tensors if isinstance(tensor, torch.Tensor))
+
+class PrefixCache:
+	"""
+	A size-bounded LRU of past_key_values by the token IDs of the prefix they were computed for.
+
+	Keys are token IDs, not text, so a prefix is only reused when the prompt tokenizes to exactly
+	the same tokens, and a cache is only valid for the model and adapter it was computed with
+	(use one PrefixCache per model and adapter). Every lookup hands out a private copy, since
+	generation appends to it.
+
+	Args:
+		max_bytes: Most bytes of keys and values kept; least recently used prefixes are evicted.
+		max_entries: Most prefixes kept; unbounded if None.
+		min_prefix_tokens: Shorter prefixes are not worth a lookup and are prefilled as usual.
+	"""
+	def __init__(self, max_bytes: int = 1 << 30, max_entries: Optional[int] = None, min_prefix_tokens: int = 16):
+		self.max_bytes = max_bytes
+		self.max_entries = max_entries
+		self.min_prefix_tokens = min_prefix_tokens
+		self.nbytes = 0 # Bytes of the cached prefixes
+		self.hits = 0 # Lookups served from the cache
+		self.misses = 0 # Lookups that computed their prefix
+		self.evictions = 0 # Prefixes dropped to stay within the bounds
+		self.prompt_tokens = 0 # Tokens of all prompts looked up
+		self.saved_tokens = 0 # Prompt tokens not prefilled thanks to a hit
+		self._entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	@property
+	def hit_rate(self) -> float:
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.0
+
+	def stats(self) -> Dict[str, float]:
+		"""Counters for reporting, including the share of prompt tokens whose prefill was saved."""
+		return {
+			"entries": len(self._entries),
+			"megabytes": self.nbytes / 1e6,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": self.hit_rate,
+			"evictions": self.evictions,
+			"prompt_tokens": self.prompt_tokens,
+			"saved_tokens": self.saved_tokens,
+			"saved_fraction": self.saved_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+		}
+
+	def clear(self):
+		self._entries.clear()
+		self.nbytes = 0
+
+	def get(self, model: Any, input_ids: List[int], prefix_length: int) -> Optional[Any]:
+		"""
+		Returns past_key_values for the first `prefix_length` tokens of a prompt, to pass to
+		`model.generate` with the whole prompt, or None if the prefix is too short to cache.
+
+		On a miss the prefix is run through the model once and kept; either way the caller gets
+		its own copy. The prefix is shortened to leave at least one token for generate to prefill.
+		"""
+		self.prompt_tokens += len(input_ids)
+		prefix_length = min(prefix_length, len(input_ids) - 1)
+		if prefix_length < self.min_prefix_tokens:
+			return None
+
+		key = tuple(input_ids[:prefix_length])
+		entry = self._entries.get(key)
+		if entry is not None:
+			self._entries.move_to_end(key)
+			self.hits += 1
+			self.saved_tokens += prefix_length
+			return copy.deepcopy(entry[0])
+
+		self.misses += 1
+		with torch.inference_mode():
+			past_key_values = model(input_ids=torch.tensor([key], device=model.device), use_cache=True).past_key_values
+		if isinstance(past_key_values, tuple):
+			past_key_values = DynamicCache.from_legacy_cache(past_key_values)
+		nbytes = cache_nbytes(past_key_values)
+		if nbytes > self.max_bytes:
+			return past_key_values # Too large to keep; this caller may have it
+		self._entries[key] = (past_key_values, nbytes)
+		self.nbytes += nbytes
+		self._evict()
+		return copy.deepcopy(past_key_values)
+
+	def _evict(self):
+		while self._entries and (self.nbytes > self.max_bytes or (self.max_entries is not None and len(self._entries) > self.max_entries)):
+			_, (_, nbytes) = self._entries.popitem(last=False)
+			self.nbytes -= nbytes
+			self.evictions += 1
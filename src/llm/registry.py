@@ -0,0 +1,229 @@
+"""
+A process-wide registry of loaded language models.
+
+Each base model is loaded once, on first use, and shared by everything that asks for it by
+model ID. LoRA adapters (e.g. `outputs/checkpoint-1875`) are attached to the resident base
+model by name and selected (or all disabled, for the base model's answers) per request, so
+switching between a base model and its fine-tuned variants never reloads the weights. On a
+machine without CUDA or MPS, models are loaded in the CPU inference mode of `llm.cpu` (in its
+cached configuration, or bfloat16; configurations are only probed when asked for).
+
+Usage (from `src/`):
+	from llm.registry import registry
+	name = registry.add_adapter("cjvt/GaMS-1B", "outputs/checkpoint-1875")
+	pipe = registry.pipeline("cjvt/GaMS-1B")  # After add_adapter, so it wraps the PeftModel
+	with registry.use("cjvt/GaMS-1B", name):
+		pipe("Vprašanje: ...")       # With the adapter
+	with registry.use("cjvt/GaMS-1B", None):
+		pipe("Vprašanje: ...")       # The base model
+	print(registry.memory_report())
+"""
+import contextlib
+import gc
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from .cpu import CpuConfig, CpuInference, CpuProbe, tensor_bytes
+
+def default_device() -> torch.device:
+	if torch.backends.mps.is_available():
+		return torch.device("mps")
+	if torch.cuda.is_available():
+		return torch.device("cuda")
+	return torch.device("cpu")
+
+class ModelMemory(NamedTuple):
+	"""Memory held by a resident model's weights."""
+	model_id: str
+	device: str
+	dtype: str
+	base_bytes: int # Parameters and buffers of the base model
+	adapter_bytes: Dict[str, int] # Parameters of each attached adapter
+	load_seconds: float
+
+class ResidentModel:
+	"""A loaded base model, its tokenizer and its attached adapters; see ModelRegistry."""
+	def __init__(
+		self,
+		model_id: str,
+		model: Any,
+		tokenizer: Any,
+		load_seconds: float,
+		cpu_config: Optional[CpuConfig] = None,
+		cpu_probes: Optional[List[CpuProbe]] = None
+	):
+		self.model_id = model_id
+		self.model = model # The base model, or a PeftModel wrapping it once an adapter is attached
+		self.tokenizer = tokenizer
+		self.load_seconds = load_seconds
+		self.cpu_config = cpu_config # Configuration chosen in CPU inference mode
+		self.cpu_probes = cpu_probes or [] # Measurements it was chosen by
+		self.adapters: Dict[str, str] = {} # Path by adapter name
+		self.lock = threading.RLock() # Held while an adapter selection is in use
+		self._pipeline = None
+
+	@property
+	def pipeline(self) -> Any:
+		"""A text-generation pipeline around the (possibly wrapped) model."""
+		if self._pipeline is None or self._pipeline.model is not self.model:
+			self._pipeline = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer)
+		return self._pipeline
+
+	def memory(self) -> ModelMemory:
+		adapter_bytes = {name: 0 for name in self.adapters}
+		base_bytes = 0
+		# The state dict also holds the packed weights of dynamically quantized layers
+		for name, value in self.model.state_dict().items():
+			nbytes = tensor_bytes(value)
+			adapter = next((adapter for adapter in self.adapters if f".{adapter}." in name or name.endswith(f".{adapter}")), None)
+			if adapter is None:
+				base_bytes += nbytes
+			else:
+				adapter_bytes[adapter] += nbytes
+		parameter = next(self.model.parameters())
+		dtype = str(parameter.dtype).replace("torch.", "")
+		if self.cpu_config is not None and self.cpu_config.quantize:
+			dtype = "int8"
+		return ModelMemory(self.model_id, str(parameter.device), dtype, base_bytes, adapter_bytes, self.load_seconds)
+
+class ModelRegistry:
+	"""
+	Loads causal LMs lazily, once per model ID, and manages their LoRA adapters.
+
+	Adapters are switched on the shared module, so a request must hold `use()` for as long as it
+	generates; `use()` serializes requests to the same model that need different adapters.
+
+	Args:
+		cpu_inference: Options of the CPU inference mode, used when there is no CUDA or MPS device
+			and no device_map or torch_dtype is asked for. If None, the defaults of CpuInference
+			without probing: a cached configuration is used, otherwise bfloat16 is loaded.
+	"""
+	def __init__(self, cpu_inference: Optional[CpuInference] = None):
+		self.cpu_inference = cpu_inference
+		self._models: Dict[str, ResidentModel] = {}
+		self._lock = threading.Lock()
+
+	def get(self, model_id: str, cpu_inference: Optional[CpuInference] = None, **load_kwargs) -> ResidentModel:
+		"""
+		Returns the resident model, loading it on first use.
+
+		Args:
+			model_id: Hugging Face model ID or path.
+			cpu_inference: Options of the CPU inference mode for this model, instead of the registry's.
+			load_kwargs: `from_pretrained` arguments for the first load (e.g. torch_dtype,
+				device_map); by default bfloat16 (float16 on MPS) on the best available device,
+				or the CPU inference mode on a CPU. Ignored once the model is resident.
+		"""
+		with self._lock:
+			resident = self._models.get(model_id)
+			if resident is None:
+				resident = self._load(model_id, cpu_inference or self.cpu_inference, load_kwargs)
+				self._models[model_id] = resident
+			return resident
+
+	def _load(self, model_id: str, cpu_inference: Optional[CpuInference], load_kwargs: Dict[str, Any]) -> ResidentModel:
+		start = time.perf_counter()
+		device = None
+		if "device_map" not in load_kwargs:
+			device = default_device()
+			if device.type == "cpu" and "torch_dtype" not in load_kwargs:
+				model, tokenizer, config, probes = (cpu_inference or CpuInference(probe=False)).load(model_id, **load_kwargs)
+				return ResidentModel(model_id, model, tokenizer, time.perf_counter() - start, config, probes)
+			load_kwargs = {"torch_dtype": torch.bfloat16 if device.type != "mps" else torch.float16, **load_kwargs}
+		model = AutoModelForCausalLM.from_pretrained(model_id, **load_kwargs)
+		if device is not None:
+			model = model.to(device)
+		model.eval()
+		tokenizer = AutoTokenizer.from_pretrained(model_id)
+		return ResidentModel(model_id, model, tokenizer, time.perf_counter() - start)
+
+	def pipeline(self, model_id: str, cpu_inference: Optional[CpuInference] = None, **load_kwargs) -> Any:
+		"""
+		The text-generation pipeline of the resident model (see get); select adapters with use().
+
+		Attaching an adapter wraps the model, so take the pipeline after add_adapter.
+		"""
+		return self.get(model_id, cpu_inference, **load_kwargs).pipeline
+
+	def add_adapter(self, model_id: str, path: str, name: Optional[str] = None) -> str:
+		"""
+		Attaches a LoRA adapter to the resident model (loading the model if needed), unless one of
+		that name is attached already. Attached adapters are inactive until selected with use().
+
+		Args:
+			model_id: The base model the adapter was trained on.
+			path: Directory of the adapter, e.g. "outputs/checkpoint-1875".
+			name: Name to select it by; the directory name if None.
+
+		Returns:
+			The adapter's name.
+		"""
+		from peft import PeftModel
+
+		name = name or os.path.basename(os.path.normpath(path)).replace(".", "_")
+		resident = self.get(model_id)
+		with resident.lock:
+			if name in resident.adapters:
+				if resident.adapters[name] != path:
+					raise ValueError(f"Adapter {name!r} of {model_id} is already attached from {resident.adapters[name]}.")
+				return name
+			if isinstance(resident.model, PeftModel):
+				resident.model.load_adapter(path, adapter_name=name, is_trainable=False)
+			else:
+				resident.model = PeftModel.from_pretrained(resident.model, path, adapter_name=name, is_trainable=False)
+				resident.model.eval()
+			resident.adapters[name] = path
+		return name
+
+	@contextlib.contextmanager
+	def use(self, model_id: str, adapter: Optional[str] = None) -> Iterator[ResidentModel]:
+		"""
+		Selects an attached adapter of the resident model, or none (the base model's weights), for
+		the duration of the block, during which other selections of the same model wait.
+		"""
+		resident = self.get(model_id)
+		with resident.lock:
+			if adapter is not None and adapter not in resident.adapters:
+				raise KeyError(f"No adapter {adapter!r} attached to {model_id}; attached: {sorted(resident.adapters)}.")
+			if not resident.adapters:
+				yield resident
+			elif adapter is None:
+				with resident.model.disable_adapter():
+					yield resident
+			else:
+				resident.model.set_adapter(adapter)
+				yield resident
+
+	def resident(self) -> List[str]:
+		"""IDs of the loaded models."""
+		with self._lock:
+			return list(self._models)
+
+	def unload(self, model_id: str):
+		"""Drops a model (and its adapters) from the registry, freeing its memory once no one else holds it."""
+		with self._lock:
+			resident = self._models.pop(model_id, None)
+		if resident is not None:
+			del resident
+			gc.collect()
+			if torch.cuda.is_available():
+				torch.cuda.empty_cache()
+
+	def memory(self) -> List[ModelMemory]:
+		with self._lock:
+			residents = list(self._models.values())
+		return [resident.memory() for resident in residents]
+
+	def memory_report(self) -> str:
+		"""A table of the memory held by each resident model and its adapters."""
+		lines = [f"{'model':<40} {'device':<8} {'dtype':<9} {'MB':>9} {'load s':>7}  adapters (MB)"]
+		for memory in self.memory():
+			adapters = ", ".join(f"{name} {nbytes / 1e6:.1f}" for name, nbytes in memory.adapter_bytes.items()) or "-"
+			lines.append(f"{memory.model_id:<40} {memory.device:<8} {memory.dtype:<9} {memory.base_bytes / 1e6:>9.1f} {memory.load_seconds:>7.1f}  {adapters}")
+		return "\n".join(lines)
+
+# The registry shared by the whole process
+registry = ModelRegistry()
@@ -0,0 +1,2 @@
+from .runner import FileInput, Pipeline, Stage, StageContext
+from .stages import build_pipeline
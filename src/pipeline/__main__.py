@@ -0,0 +1,47 @@
+"""
+Runs the cached data and training pipeline up to the requested stages.
+
+Usage (from `src/`):
+	python -m pipeline qa_dataset knowledge_dataset --graph ../data/municipalities_peaks_castles.graphml
+	python -m pipeline adapter --seed 1
+	python -m pipeline graph --force fetch_municipalities fetch_peaks fetch_castles
+
+Stages whose inputs and dependency artifacts are unchanged are skipped; their artifact
+directories are printed at the end.
+"""
+import argparse
+from qa.templates import ALL_TEMPLATES, TEMPLATES
+from .stages import MODEL_ID, build_pipeline
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("targets", nargs="*", default=["qa_dataset", "knowledge_dataset"], help="Stages to bring up to date (default: both datasets).")
+	parser.add_argument("--cache-dir", default="../.cache/pipeline", help="Directory of the cached artifacts.")
+	parser.add_argument("--graph", default=None, help="Start from this GraphML file instead of fetching from Wikidata.")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--qa-samples", type=int, default=5000)
+	parser.add_argument("--knowledge-samples", type=int, default=5000)
+	parser.add_argument("--numeric", action="store_true", help="Also generate aggregate and comparative questions (ALL_TEMPLATES).")
+	parser.add_argument("--model", default=MODEL_ID)
+	parser.add_argument("--train-on", default="knowledge_dataset", choices=["qa_dataset", "knowledge_dataset"])
+	parser.add_argument("--epochs", type=int, default=3)
+	parser.add_argument("--force", nargs="*", default=[], help="Stages to rerun even if cached.")
+	args = parser.parse_args()
+
+	pipeline = build_pipeline(
+		args.cache_dir,
+		graph_path=args.graph,
+		seed=args.seed,
+		num_qa=args.qa_samples,
+		num_knowledge=args.knowledge_samples,
+		templates=ALL_TEMPLATES if args.numeric else TEMPLATES,
+		model_id=args.model,
+		train_on=args.train_on,
+		num_train_epochs=args.epochs
+	)
+	outputs = pipeline.run(args.targets, force=args.force)
+	for name in args.targets:
+		print(f"{name}: {outputs[name]}")
+
+if __name__ == "__main__":
+	main()
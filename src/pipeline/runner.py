@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+class FileInput(NamedTuple):
+	"""A stage input that is fingerprinted by the content of a file or directory, not its path."""
+	path: str
+
+class StageContext(NamedTuple):
+	"""What a stage's run function receives."""
+	output_dir: str # Empty directory the stage writes its artifacts to
+	inputs: Dict[str, Any] # The stage's inputs as given
+	deps: Dict[str, str] # Dependency stage name -> its artifact directory
+
+def hash_path(path: str) -> str:
+	"""SHA-256 of a file's bytes, or of the relative paths and contents of all files in a directory."""
+	digest = hashlib.sha256()
+	if os.path.isdir(path):
+		for root, directories, files in os.walk(path):
+			directories.sort()
+			for name in sorted(files):
+				file_path = os.path.join(root, name)
+				digest.update(os.path.relpath(file_path, path).replace(os.sep, "/").encode("utf-8") + b"\0")
+				digest.update(hash_path(file_path).encode("ascii"))
+		return digest.hexdigest()
+
+	with open(path, "rb") as f:
+		while chunk := f.read(1 << 20):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def _canonical(value: Any) -> Any:
+	"""Converts an input value into JSON-serializable data that only depends on its content."""
+	if isinstance(value, FileInput):
+		return {"file": hash_path(value.path)}
+	if value is None or isinstance(value, (str, int, float, bool)):
+		return value
+	if isinstance(value, dict):
+		return {str(key): _canonical(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+	if hasattr(value, "_asdict"): # NamedTuple
+		return [type(value).__name__, _canonical(value._asdict())]
+	if isinstance(value, (list, tuple)):
+		return [_canonical(item) for item in value]
+	if hasattr(value, "__dict__"): # Plain objects such as QuestionTemplate
+		return [type(value).__name__, _canonical(vars(value))]
+	raise TypeError(f"Cannot fingerprint a stage input of type {type(value).__name__}.")
+
+def fingerprint(value: Any) -> str:
+	"""SHA-256 of the canonical form of a stage input (files by content, objects by attributes)."""
+	encoded = json.dumps(_canonical(value), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class Stage:
+	"""
+	A step of the pipeline: a function from inputs and dependency artifacts to an artifact directory.
+
+	The stage runs again only when its cache key changes. The key covers the stage name, its
+	`version` (bump it when the stage's code changes meaningfully), the fingerprint of every
+	input, and the content hash of every dependency's artifacts, so a dependency that reruns
+	but produces identical output does not invalidate the stages after it.
+	"""
+	def __init__(
+		self,
+		name: str,
+		run: Callable[[StageContext], None],
+		inputs: Optional[Dict[str, Any]] = None,
+		deps: Iterable[str] = (),
+		version: str = "1"
+	):
+		self.name = name
+		self.run = run
+		self.inputs = inputs or {}
+		self.deps = list(deps)
+		self.version = version
+
+	def __repr__(self):
+		return f"Stage(name='{self.name}', deps={self.deps})"
+
+class Pipeline:
+	"""
+	A DAG of stages whose artifacts are cached by content in `cache_dir`.
+
+	Artifacts of a stage live in `cache_dir/<stage>/<key prefix>/` next to a `manifest.json`
+	recording the key, input fingerprints and output hash. A run computes the keys in
+	topological order and only executes stages without a finished artifact for their key.
+	"""
+	MANIFEST = "manifest.json"
+
+	def __init__(self, cache_dir: str):
+		self.cache_dir = cache_dir
+		self.stages: Dict[str, Stage] = {}
+
+	def add(self, stage: Stage) -> Stage:
+		if stage.name in self.stages:
+			raise ValueError(f"Duplicate stage {stage.name!r}.")
+		for dep in stage.deps:
+			if dep not in self.stages:
+				raise ValueError(f"Stage {stage.name!r} depends on unknown stage {dep!r}; add stages in dependency order.")
+		self.stages[stage.name] = stage
+		return stage
+
+	def _required(self, targets: Iterable[str]) -> List[str]:
+		"""The targets and all their dependencies, in insertion (hence topological) order."""
+		required: Set[str] = set()
+		pending = list(targets)
+		while pending:
+			name = pending.pop()
+			if name not in self.stages:
+				raise KeyError(f"Unknown stage {name!r}.")
+			if name not in required:
+				required.add(name)
+				pending.extend(self.stages[name].deps)
+		return [name for name in self.stages if name in required]
+
+	def run(self, targets: Optional[Iterable[str]] = None, force: Iterable[str] = ()) -> Dict[str, str]:
+		"""
+		Brings the target stages up to date.
+
+		Args:
+			targets: Stage names to produce; all stages if None.
+			force: Stage names to rerun even if cached (e.g. to refetch changing remote data).
+
+		Returns:
+			The artifact directory of every stage that was needed, by stage name.
+		"""
+		force = set(force)
+		outputs: Dict[str, str] = {}
+		output_hashes: Dict[str, str] = {}
+		for name in self._required(self.stages if targets is None else targets):
+			stage = self.stages[name]
+			input_fingerprints = {key: fingerprint(value) for key, value in stage.inputs.items()}
+			key = fingerprint({
+				"stage": name,
+				"version": stage.version,
+				"inputs": input_fingerprints,
+				"deps": {dep: output_hashes[dep] for dep in stage.deps}
+			})
+			output_dir = os.path.join(self.cache_dir, name, key[:16])
+			manifest_path = os.path.join(output_dir, self.MANIFEST)
+
+			if os.path.exists(manifest_path) and name not in force:
+				with open(manifest_path, encoding="utf-8") as f:
+					output_hashes[name] = json.load(f)["output_hash"]
+				print(f"[{name}] up to date ({output_dir})")
+			else:
+				output_hashes[name] = self._execute(stage, key, input_fingerprints, output_dir, outputs)
+			outputs[name] = output_dir
+		return outputs
+
+	def _execute(self, stage: Stage, key: str, input_fingerprints: Dict[str, str], output_dir: str, outputs: Dict[str, str]) -> str:
+		"""Runs a stage into a temporary directory and moves it into place once it succeeded."""
+		print(f"[{stage.name}] running")
+		temporary_dir = f"{output_dir}.tmp{os.getpid()}"
+		shutil.rmtree(temporary_dir, ignore_errors=True)
+		os.makedirs(temporary_dir)
+		start = time.perf_counter()
+		try:
+			stage.run(StageContext(temporary_dir, stage.inputs, {dep: outputs[dep] for dep in stage.deps}))
+		except BaseException:
+			shutil.rmtree(temporary_dir, ignore_errors=True)
+			raise
+		seconds = time.perf_counter() - start
+
+		output_hash = hash_path(temporary_dir)
+		with open(os.path.join(temporary_dir, self.MANIFEST), "w", encoding="utf-8") as f:
+			json.dump({
+				"stage": stage.name,
+				"key": key,
+				"version": stage.version,
+				"inputs": input_fingerprints,
+				"deps": stage.deps,
+				"output_hash": output_hash,
+				"seconds": round(seconds, 3),
+				"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+			}, f, indent=2)
+
+		shutil.rmtree(output_dir, ignore_errors=True)
+		os.replace(temporary_dir, output_dir)
+		print(f"[{stage.name}] done in {seconds:.1f} s ({output_dir})")
+		return output_hash
@@ -0,0 +1,134 @@
+import os
+import shutil
+from typing import List, Optional
+from qa.question import QuestionTemplate
+from qa.templates import TEMPLATES
+from .runner import FileInput, Pipeline, Stage, StageContext
+
+MODEL_ID = "cjvt/GaMS-1B"
+
+def _fetch(ctx: StageContext):
+	from wikidata import WikidataClient
+	WikidataClient(ctx.inputs["endpoint"]).execute_query(ctx.inputs["query"]).to_pickle(os.path.join(ctx.output_dir, "result.pkl"))
+
+def _build_graph(ctx: StageContext):
+	import networkx as nx
+	import pandas as pd
+	from kg.builder import build_graph
+	tables = [pd.read_pickle(os.path.join(ctx.deps[name], "result.pkl")) for name in ("fetch_municipalities", "fetch_peaks", "fetch_castles")]
+	nx.write_graphml(build_graph(*tables), os.path.join(ctx.output_dir, "graph.graphml"))
+
+def _copy_graph(ctx: StageContext):
+	shutil.copyfile(ctx.inputs["graph"].path, os.path.join(ctx.output_dir, "graph.graphml"))
+
+def _qa_dataset(ctx: StageContext):
+	from create_training_data import generate_training_jsonl
+	generate_training_jsonl(
+		graph_path=os.path.join(ctx.deps["graph"], "graph.graphml"),
+		output_path=os.path.join(ctx.output_dir, "data.jsonl"),
+		num_samples=ctx.inputs["num_samples"],
+		seed=ctx.inputs["seed"],
+		templates=ctx.inputs["templates"]
+	)
+
+def _knowledge_dataset(ctx: StageContext):
+	from create_knowledge_training_data import generate_knowledge_jsonl
+	generate_knowledge_jsonl(
+		graph_path=os.path.join(ctx.deps["graph"], "graph.graphml"),
+		output_path=os.path.join(ctx.output_dir, "data.jsonl"),
+		num_samples=ctx.inputs["num_samples"],
+		seed=ctx.inputs["seed"],
+		templates=ctx.inputs["templates"]
+	)
+
+def _tokenizer(ctx: StageContext):
+	from train import load_tokenizer
+	load_tokenizer(ctx.inputs["model_id"]).save_pretrained(ctx.output_dir)
+
+def _tokenized(ctx: StageContext):
+	from train import load_tokenizer, tokenize_dataset
+	tokenizer = load_tokenizer(ctx.deps["tokenizer"])
+	data_path = os.path.join(ctx.deps[ctx.inputs["dataset"]], "data.jsonl")
+	tokenize_dataset(data_path, tokenizer, max_length=ctx.inputs["max_length"]).save_to_disk(os.path.join(ctx.output_dir, "dataset"))
+
+def _adapter(ctx: StageContext):
+	from datasets import load_from_disk
+	from train import load_tokenizer, train
+	tokenizer = load_tokenizer(ctx.deps["tokenizer"])
+	tokenized_dataset = load_from_disk(os.path.join(ctx.deps["tokenized"], "dataset"))
+	trainer = train(
+		tokenized_dataset,
+		tokenizer,
+		output_dir=os.path.join(ctx.output_dir, "checkpoints"),
+		model_id=ctx.inputs["model_id"],
+		num_train_epochs=ctx.inputs["num_train_epochs"],
+		learning_rate=ctx.inputs["learning_rate"]
+	)
+	trainer.save_model(os.path.join(ctx.output_dir, "adapter"))
+
+def build_pipeline(
+	cache_dir: str,
+	graph_path: Optional[str] = None,
+	seed: int = 0,
+	num_qa: int = 5000,
+	num_knowledge: int = 5000,
+	templates: List[QuestionTemplate] = TEMPLATES,
+	model_id: str = MODEL_ID,
+	train_on: str = "knowledge_dataset",
+	max_length: int = 512,
+	num_train_epochs: int = 3,
+	learning_rate: float = 2e-4,
+	endpoint_url: Optional[str] = None
+) -> Pipeline:
+	"""
+	Builds the pipeline from Wikidata to the LoRA adapter.
+
+	Stages: `fetch_municipalities`, `fetch_peaks`, `fetch_castles` (only without `graph_path`),
+	`graph`, `qa_dataset`, `knowledge_dataset`, `tokenizer`, `tokenized` and `adapter`.
+	Each writes to its own artifact directory (`result.pkl`, `graph.graphml`, `data.jsonl`,
+	the saved tokenizer, `dataset/` from `save_to_disk`, and `checkpoints/` plus `adapter/`).
+
+	Args:
+		cache_dir: Directory of the cached artifacts.
+		graph_path: Use this GraphML file instead of fetching the graph from Wikidata; it is
+			fingerprinted by content, so editing it reruns everything downstream.
+		seed: Seed of both datasets. Unlike the scripts, a pipeline is always seeded, so its
+			datasets are reproducible and cacheable.
+		num_qa: Number of examples in `qa_dataset`.
+		num_knowledge: Number of examples in `knowledge_dataset`.
+		templates: Question templates of both datasets; fingerprinted by their attributes. Pass
+			ALL_TEMPLATES to add the aggregate and comparative questions.
+		model_id: Model (and tokenizer) to fine-tune.
+		train_on: The dataset stage the adapter is trained on.
+		max_length: Token length of the tokenized examples.
+		num_train_epochs: Training epochs.
+		learning_rate: Training learning rate.
+		endpoint_url: SPARQL endpoint of the fetch stages; the WikidataClient default if None.
+
+	Returns:
+		The Pipeline; run it with `pipeline.run(["adapter"])` or any other targets.
+	"""
+	pipeline = Pipeline(cache_dir)
+
+	if graph_path is None:
+		from wikidata import WikidataClient
+		from wikidata.queries import SPARQL_MUNICIPALITIES, SPARQL_PEAKS, SPARQL_CASTLES
+		endpoint_url = endpoint_url or WikidataClient.DEFAULT_ENDPOINT_URL
+		# Remote data can change under an unchanged query; refetch with `force`
+		for name, query in (("municipalities", SPARQL_MUNICIPALITIES), ("peaks", SPARQL_PEAKS), ("castles", SPARQL_CASTLES)):
+			pipeline.add(Stage(f"fetch_{name}", _fetch, inputs={"query": query, "endpoint": endpoint_url}))
+		pipeline.add(Stage("graph", _build_graph, deps=["fetch_municipalities", "fetch_peaks", "fetch_castles"]))
+	else:
+		pipeline.add(Stage("graph", _copy_graph, inputs={"graph": FileInput(graph_path)}))
+
+	pipeline.add(Stage("qa_dataset", _qa_dataset, inputs={"num_samples": num_qa, "seed": seed, "templates": templates}, deps=["graph"]))
+	pipeline.add(Stage("knowledge_dataset", _knowledge_dataset, inputs={"num_samples": num_knowledge, "seed": seed, "templates": templates}, deps=["graph"]))
+	pipeline.add(Stage("tokenizer", _tokenizer, inputs={"model_id": model_id}))
+	pipeline.add(Stage("tokenized", _tokenized, inputs={"dataset": train_on, "max_length": max_length}, deps=["tokenizer", train_on]))
+	pipeline.add(Stage(
+		"adapter",
+		_adapter,
+		inputs={"model_id": model_id, "num_train_epochs": num_train_epochs, "learning_rate": learning_rate},
+		deps=["tokenizer", "tokenized"]
+	))
+	return pipeline
@@ -1,4 +1,5 @@
-from typing import List, Dict, Tuple, NamedTuple, Optional
+from array import array
+from typing import Iterable, List, Dict, Tuple, NamedTuple, Optional
 
 class Fact(NamedTuple):
 	"""Represents a single Subject-Predicate-Object fact derived from the graph."""
@@ -14,24 +15,111 @@ class Fact(NamedTuple):
 		"""Convert Fact to a simple tuple for set operations."""
 		return (self.subject, self.predicate, self.object)
 
+class FactTable:
+	"""
+	Interned storage for facts shared by many QA objects.
+
+	Subjects, predicates and objects are interned into one string table, and each distinct
+	fact is a row of three string IDs in parallel arrays. QA objects refer to facts by row ID.
+	"""
+	def __init__(self):
+		self.strings: List[str] = []
+		self._string_ids: Dict[str, int] = {}
+		self.subjects = array("I")
+		self.predicates = array("I")
+		self.objects = array("I")
+		self._fact_ids: Dict[Tuple[int, int, int], int] = {}
+
+	def __len__(self) -> int:
+		return len(self.subjects)
+
+	def intern(self, string: str) -> int:
+		"""Returns the ID of a string, adding it to the string table if needed."""
+		string_id = self._string_ids.get(string)
+		if string_id is None:
+			string_id = self._string_ids[string] = len(self.strings)
+			self.strings.append(string)
+		return string_id
+
+	def add(self, subject: str, predicate: str, object: str) -> int:
+		"""Returns the ID of a fact, adding it to the table if needed."""
+		key = (self.intern(subject), self.intern(predicate), self.intern(object))
+		fact_id = self._fact_ids.get(key)
+		if fact_id is None:
+			fact_id = self._fact_ids[key] = len(self.subjects)
+			self.subjects.append(key[0])
+			self.predicates.append(key[1])
+			self.objects.append(key[2])
+		return fact_id
+
+	def add_fact(self, fact: Fact) -> int:
+		"""Returns the ID of a Fact, adding it to the table if needed."""
+		return self.add(fact.subject, fact.predicate, fact.object)
+
+	def merge(self, other: "FactTable") -> List[int]:
+		"""Adds every fact of another table; returns the ID in this table of each of its rows."""
+		strings = other.strings
+		return [self.add(strings[s], strings[p], strings[o]) for s, p, o in zip(other.subjects, other.predicates, other.objects)]
+
+	def get(self, fact_id: int) -> Fact:
+		"""Materializes a fact row as a Fact."""
+		strings = self.strings
+		return Fact(strings[self.subjects[fact_id]], strings[self.predicates[fact_id]], strings[self.objects[fact_id]])
+
+	def format(self, fact_id: int) -> str:
+		"""Formats a fact row like str(Fact) without creating the Fact."""
+		strings = self.strings
+		return f"<{strings[self.subjects[fact_id]]}> <{strings[self.predicates[fact_id]]}> <{strings[self.objects[fact_id]]}>."
+
 class QA:
-	"""Represents a generated Question, Answer, and supporting Context Facts."""
-	def __init__(self, question: str, answer: str, context_facts: List[Fact]):
+	"""
+	Represents a generated Question, Answer, and supporting Context Facts.
+
+	Context facts are stored as an array of fact IDs into a FactTable, which is normally shared
+	by all QA objects of a generator; strings are only built when the QA is serialized.
+	"""
+	__slots__ = ("question", "answer", "fact_ids", "fact_table")
+
+	def __init__(
+		self,
+		question: str,
+		answer: str,
+		context_facts: Optional[List[Fact]] = None,
+		fact_table: Optional[FactTable] = None,
+		fact_ids: Optional[Iterable[int]] = None
+	):
+		"""
+		Args:
+			question: The question text.
+			answer: The answer text.
+			context_facts: Fact objects to intern into `fact_table`.
+			fact_table: The table the facts live in; a private one is created if omitted.
+			fact_ids: IDs of facts already in `fact_table`, instead of `context_facts`.
+		"""
 		self.question = question
 		self.answer = answer
-		self.context_facts = context_facts # List of Fact objects
+		self.fact_table = fact_table if fact_table is not None else FactTable()
+		if fact_ids is not None:
+			self.fact_ids = array("I", fact_ids)
+		else:
+			self.fact_ids = array("I", (self.fact_table.add_fact(fact) for fact in context_facts or []))
+
+	@property
+	def context_facts(self) -> List[Fact]:
+		"""The context facts as Fact objects, materialized on access."""
+		return [self.fact_table.get(fact_id) for fact_id in self.fact_ids]
 
 	def __repr__(self):
-		return f"QA(question='{self.question}', answer='{self.answer}', num_facts={len(self.context_facts)})"
+		return f"QA(question='{self.question}', answer='{self.answer}', num_facts={len(self.fact_ids)})"
 
 	def to_dict(self) -> Dict[str, str]:
 		"""Convert QA to a dictionary representation."""
 		return {
 			"question": self.question,
 			"answer": self.answer,
-			"context_facts": [str(fact) for fact in self.context_facts]
+			"context_facts": [self.fact_table.format(fact_id) for fact_id in self.fact_ids]
 		}
 
 	def get_context_string(self, separator: str = " ") -> str:
 		"""Helper to get context facts as a single string."""
-		return separator.join(map(str, self.context_facts))
\ No newline at end of file
+		return separator.join(map(self.fact_table.format, self.fact_ids))
@@ -0,0 +1,59 @@
+import json
+from typing import Dict, Iterable, List
+from .answer import FactTable, QA
+
+FORMAT_VERSION = 1
+
+def save_qa_dataset(qas: Iterable[QA], path: str):
+	"""
+	Writes QA pairs in a compact JSON format that stores every distinct fact once.
+
+	The file holds a string table, a fact table of [subject, predicate, object] string IDs,
+	and the QA pairs, each referencing its context facts by fact ID. QA objects may come
+	from different FactTables (e.g. parallel shards); their facts are merged on write.
+
+	Args:
+		qas: The QA objects to write.
+		path: The output file path.
+	"""
+	table = FactTable()
+	entries: List[Dict] = []
+	for qa in qas:
+		source = qa.fact_table
+		fact_ids = [
+			table.add(source.strings[source.subjects[fact_id]], source.strings[source.predicates[fact_id]], source.strings[source.objects[fact_id]])
+			for fact_id in qa.fact_ids
+		]
+		entries.append({"question": qa.question, "answer": qa.answer, "facts": fact_ids})
+
+	with open(path, "w", encoding="utf-8") as f:
+		json.dump({
+			"version": FORMAT_VERSION,
+			"strings": table.strings,
+			"facts": [list(row) for row in zip(table.subjects, table.predicates, table.objects)],
+			"qas": entries,
+		}, f, ensure_ascii=False, separators=(",", ":"))
+
+def load_qa_dataset(path: str) -> List[QA]:
+	"""
+	Reads a file written by save_qa_dataset; all returned QA objects share one FactTable.
+
+	Args:
+		path: The dataset file path.
+
+	Returns:
+		A list of QA objects in file order.
+	"""
+	with open(path, encoding="utf-8") as f:
+		data = json.load(f)
+	if data.get("version") != FORMAT_VERSION:
+		raise ValueError(f"Unsupported QA dataset version {data.get('version')} in {path}.")
+
+	table = FactTable()
+	strings = data["strings"]
+	for subject, predicate, object in data["facts"]:
+		table.add(strings[subject], strings[predicate], strings[object])
+	return [
+		QA(question=entry["question"], answer=entry["answer"], fact_table=table, fact_ids=entry["facts"])
+		for entry in data["qas"]
+	]
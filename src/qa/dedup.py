@@ -0,0 +1,357 @@
+"""
+Deduplicates QA datasets and detects questions shared between evaluation and training data.
+
+Every dataset is streamed record by record; only a hash and a MinHash signature of each
+kept question are held in memory. Evaluation files are indexed first, then each training
+file is checked against the evaluation questions (leakage), against itself (duplicates) and
+against the earlier training files, optionally writing the deduplicated records to an
+output directory.
+
+Usage (from `src/`):
+	python -m qa.dedup --eval ../questions.json ../data/qa_example.json \\
+		--train ../data/slovenian_qa_training.jsonl ../data/slovenian_knowledge_training.jsonl ../data/finetune_data.json \\
+		--output-dir ../data/dedup --report ../data/leakage_report.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+import zlib
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Record fields that may hold the question, in order of preference
+QUESTION_FIELDS = ("question", "prompt", "input", "instruction")
+# RAG-style inputs put the context first and the question after this marker
+QUESTION_MARKER = "Vprašanje:"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_SEPARATORS = re.compile(r"[\s,]*")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+def normalize_question(text: str) -> str:
+	"""Normalizes a question for comparison: Unicode NFKC, case folding, no punctuation, single spaces."""
+	text = unicodedata.normalize("NFKC", text).casefold()
+	text = _PUNCTUATION.sub(" ", text)
+	return _WHITESPACE.sub(" ", text).strip()
+
+def question_hash(normalized: str) -> int:
+	"""A stable 64-bit hash of a normalized question (independent of PYTHONHASHSEED)."""
+	return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "big")
+
+def extract_question(record: Any) -> Optional[str]:
+	"""Returns the question of a dataset record, or None if the record has none."""
+	if not isinstance(record, dict):
+		return None
+	for field in QUESTION_FIELDS:
+		value = record.get(field)
+		if isinstance(value, str) and value.strip():
+			if QUESTION_MARKER in value:
+				value = value.rsplit(QUESTION_MARKER, 1)[1]
+			return value.strip()
+	return None
+
+def iter_records(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+	"""
+	Streams the records of a JSONL file, a JSON array, or a dataset written by save_qa_dataset.
+
+	JSON arrays are decoded element by element from fixed-size chunks, so memory stays bounded
+	by the largest record rather than the file size.
+	"""
+	with open(path, encoding="utf-8") as f:
+		if path.endswith(".jsonl"):
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
+			return
+
+		decoder = json.JSONDecoder()
+		buffer = ""
+		while not buffer.lstrip():
+			chunk = f.read(chunk_size)
+			if not chunk:
+				return
+			buffer += chunk
+		buffer = buffer.lstrip()
+		if not buffer.startswith("["):
+			# A single JSON object, e.g. the compact format of qa.dataset; its records are in "qas"
+			data = json.loads(buffer + f.read())
+			yield from data.get("qas", []) if isinstance(data, dict) else []
+			return
+
+		position = 1 # Just after the opening bracket
+		eof = False
+		while True:
+			position = _SEPARATORS.match(buffer, position).end()
+			if position == len(buffer) and not eof:
+				chunk = f.read(chunk_size)
+				eof = not chunk
+				buffer, position = buffer[position:] + chunk, 0
+				continue
+			if position == len(buffer) or buffer[position] == "]":
+				return
+			try:
+				record, end = decoder.raw_decode(buffer, position)
+				# A value ending exactly at the buffer end may be cut off (e.g. a number)
+				complete = end < len(buffer) or eof
+			except json.JSONDecodeError:
+				if eof:
+					raise
+				complete = False
+			if not complete:
+				chunk = f.read(chunk_size)
+				eof = not chunk
+				buffer, position = buffer[position:] + chunk, 0
+				continue
+			yield record
+			position = end
+
+class MinHasher:
+	"""MinHash signatures of character shingles, for estimating Jaccard similarity between questions."""
+	def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+		rng = np.random.default_rng(seed)
+		self.shingle_size = shingle_size
+		self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+		self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+	def signature(self, normalized: str) -> np.ndarray:
+		"""Returns the uint32 signature of a normalized question."""
+		size = self.shingle_size
+		shingles = {normalized[i:i + size] for i in range(max(len(normalized) - size + 1, 1))}
+		hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+		# One (a * x + b) mod p hash per permutation; uint64 wrap-around is deterministic, which is all MinHash needs
+		permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_MERSENNE_PRIME)
+		return permuted.min(axis=0).astype(np.uint32)
+
+class DuplicateIndex:
+	"""
+	Exact and near-duplicate lookup of normalized questions.
+
+	Exact matches use a 64-bit hash of the normalized text. Near duplicates are found with
+	MinHash locality-sensitive hashing: signatures are split into bands, questions sharing a
+	band are candidates, and a candidate is a match if the estimated Jaccard similarity of
+	their shingle sets reaches `threshold`.
+	"""
+	def __init__(self, threshold: float = 0.95, num_perm: int = 64, bands: int = 16, shingle_size: int = 5):
+		if num_perm % bands:
+			raise ValueError("num_perm must be a multiple of bands.")
+		self.threshold = threshold
+		self.bands = bands
+		self.hasher = MinHasher(num_perm, shingle_size)
+		self._exact: Dict[int, int] = {} # Question hash -> entry
+		self._buckets: Dict[Tuple[int, bytes], List[int]] = {} # (band, band bytes) -> entries
+		self._signatures = np.empty((0, num_perm), dtype=np.uint32) # Row per entry, with spare capacity
+		self.keys: List[Any] = [] # Caller's key of every entry
+
+	def __len__(self) -> int:
+		return len(self.keys)
+
+	def find_exact(self, normalized: str) -> Optional[Any]:
+		entry = self._exact.get(question_hash(normalized))
+		return None if entry is None else self.keys[entry]
+
+	def find_near(self, signature: np.ndarray) -> Optional[Tuple[Any, float]]:
+		"""Returns the key and estimated similarity of the most similar indexed question at or above the threshold."""
+		candidates = set()
+		for band, band_bytes in enumerate(signature.reshape(self.bands, -1)):
+			candidates.update(self._buckets.get((band, band_bytes.tobytes()), ()))
+		if not candidates:
+			return None
+		entries = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+		similarities = (self._signatures[entries] == signature).mean(axis=1)
+		best = int(np.argmax(similarities))
+		if similarities[best] < self.threshold:
+			return None
+		return self.keys[entries[best]], float(similarities[best])
+
+	def add(self, key: Any, normalized: str, signature: np.ndarray):
+		entry = len(self.keys)
+		self.keys.append(key)
+		self._exact.setdefault(question_hash(normalized), entry)
+		if entry == len(self._signatures):
+			# Grow the signature matrix geometrically
+			grown = np.empty((max(2 * entry, 1024), len(signature)), dtype=np.uint32)
+			grown[:entry] = self._signatures
+			self._signatures = grown
+		self._signatures[entry] = signature
+		for band, band_bytes in enumerate(signature.reshape(self.bands, -1)):
+			self._buckets.setdefault((band, band_bytes.tobytes()), []).append(entry)
+
+class _RecordWriter:
+	"""Writes records in the format of the input file: JSONL lines or a JSON array."""
+	def __init__(self, path: str):
+		self.jsonl = path.endswith(".jsonl")
+		self._file = open(path, "w", encoding="utf-8")
+		self._count = 0
+		if not self.jsonl:
+			self._file.write("[")
+
+	def write(self, record: Any):
+		if self.jsonl:
+			self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+		else:
+			self._file.write(("," if self._count else "") + "\n  " + json.dumps(record, ensure_ascii=False))
+		self._count += 1
+
+	def close(self):
+		if not self.jsonl:
+			self._file.write("\n]\n")
+		self._file.close()
+
+def deduplicate(
+	eval_paths: List[str],
+	train_paths: List[str],
+	output_dir: Optional[str] = None,
+	threshold: float = 0.95,
+	drop_near_duplicates: bool = False,
+	keep_leaked: bool = False,
+	max_examples: int = 20
+) -> Dict[str, Any]:
+	"""
+	Checks training datasets for duplicates and for questions leaked from evaluation datasets.
+
+	A training record is dropped if its question already occurred earlier in the same file
+	(exact duplicate) or equals an evaluation question (leak, unless `keep_leaked`). Questions
+	also present in an earlier training file are counted but kept, so that every output file
+	remains usable on its own. Near duplicates and near leaks are only reported, unless
+	`drop_near_duplicates` is set: templated questions differing in a short entity name can
+	look alike, so they are worth reviewing before they are removed.
+
+	Args:
+		eval_paths: Evaluation datasets (JSON/JSONL); their questions are only indexed.
+		train_paths: Training datasets to check, and deduplicate if `output_dir` is given.
+		output_dir: Directory for the deduplicated training files, written under their
+			original file names; nothing is written if None.
+		threshold: Estimated Jaccard similarity of character shingles at which two
+			questions count as near duplicates.
+		drop_near_duplicates: Also drop near duplicates and near leaks.
+		keep_leaked: Keep training records that match evaluation questions.
+		max_examples: Number of example matches listed per dataset in the report.
+
+	Returns:
+		The report: per-dataset record counts, duplicates, leaks, and example matches.
+	"""
+	eval_index = DuplicateIndex(threshold)
+	train_index = DuplicateIndex(threshold)
+	hasher = eval_index.hasher
+	report: Dict[str, Any] = {"threshold": threshold, "eval": {}, "train": {}}
+
+	for path in eval_paths:
+		stats = {"records": 0, "without_question": 0, "duplicates": 0}
+		for number, record in enumerate(iter_records(path)):
+			stats["records"] += 1
+			question = extract_question(record)
+			if question is None:
+				stats["without_question"] += 1
+				continue
+			normalized = normalize_question(question)
+			if eval_index.find_exact(normalized) is not None:
+				stats["duplicates"] += 1
+				continue
+			eval_index.add({"file": path, "record": number, "question": question}, normalized, hasher.signature(normalized))
+		report["eval"][path] = stats
+
+	if output_dir is not None:
+		os.makedirs(output_dir, exist_ok=True)
+
+	for path in train_paths:
+		stats = {
+			"records": 0, "without_question": 0, "kept": 0,
+			"exact_duplicates": 0, "near_duplicates": 0, "cross_file_duplicates": 0, "exact_leaks": 0, "near_leaks": 0,
+			"examples": []
+		}
+		file_hashes = set() # Normalized question hashes seen in this file
+		writer = _RecordWriter(os.path.join(output_dir, os.path.basename(path))) if output_dir is not None else None
+
+		def example(kind: str, question: str, match: Dict[str, Any], similarity: float = 1.0):
+			if len(stats["examples"]) < max_examples:
+				stats["examples"].append({"kind": kind, "record": number, "question": question, "matches": match, "similarity": round(similarity, 3)})
+
+		for number, record in enumerate(iter_records(path)):
+			stats["records"] += 1
+			question = extract_question(record)
+			if question is None:
+				stats["without_question"] += 1
+				if writer is not None:
+					writer.write(record)
+				continue
+
+			normalized = normalize_question(question)
+			question_key = question_hash(normalized)
+			if question_key in file_hashes:
+				stats["exact_duplicates"] += 1
+				continue
+			file_hashes.add(question_key)
+			signature = hasher.signature(normalized)
+			keep = True
+
+			leaked = eval_index.find_exact(normalized)
+			if leaked is not None:
+				stats["exact_leaks"] += 1
+				example("exact_leak", question, leaked)
+				keep = keep_leaked
+			else:
+				near_leak = eval_index.find_near(signature)
+				if near_leak is not None:
+					stats["near_leaks"] += 1
+					example("near_leak", question, *near_leak)
+					if drop_near_duplicates:
+						keep = keep_leaked
+
+			# Earlier training files are only reported, so every output file stays usable on its own
+			earlier = train_index.find_exact(normalized)
+			if earlier is not None:
+				stats["cross_file_duplicates"] += 1
+			else:
+				near_duplicate = train_index.find_near(signature)
+				if near_duplicate is not None:
+					stats["near_duplicates"] += 1
+					example("near_duplicate", question, *near_duplicate)
+					if drop_near_duplicates:
+						keep = False
+				if keep:
+					train_index.add({"file": path, "record": number, "question": question}, normalized, signature)
+
+			if keep:
+				stats["kept"] += 1
+				if writer is not None:
+					writer.write(record)
+
+		if writer is not None:
+			writer.close()
+		report["train"][path] = stats
+	return report
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--eval", nargs="*", default=[], help="Evaluation datasets to check for leakage.")
+	parser.add_argument("--train", nargs="+", required=True, help="Training datasets to deduplicate.")
+	parser.add_argument("--output-dir", help="Write deduplicated training files here.")
+	parser.add_argument("--report", help="Write the JSON report here instead of printing it.")
+	parser.add_argument("--threshold", type=float, default=0.95, help="Near-duplicate similarity threshold.")
+	parser.add_argument("--drop-near-duplicates", action="store_true")
+	parser.add_argument("--keep-leaked", action="store_true")
+	args = parser.parse_args()
+
+	report = deduplicate(
+		args.eval, args.train, args.output_dir, args.threshold,
+		drop_near_duplicates=args.drop_near_duplicates, keep_leaked=args.keep_leaked
+	)
+	for path, stats in report["train"].items():
+		print(
+			f"{path}: {stats['records']} records, kept {stats['kept']}, "
+			f"{stats['exact_duplicates']} exact / {stats['near_duplicates']} near duplicates, "
+			f"{stats['cross_file_duplicates']} in earlier files, "
+			f"{stats['exact_leaks']} exact / {stats['near_leaks']} near leaks"
+		)
+	if args.report:
+		with open(args.report, "w", encoding="utf-8") as f:
+			json.dump(report, f, ensure_ascii=False, indent=2)
+	else:
+		print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+	main()
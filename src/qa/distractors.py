@@ -0,0 +1,206 @@
+from bisect import bisect_right
+from itertools import accumulate
+from random import Random
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from .answer import Fact
+from .index import GraphIndex
+
+class _Segment(NamedTuple):
+	"""A run of candidate facts sharing a subject: slots [start, end) of a CSR target array."""
+	subject: str
+	targets: np.ndarray # Target node positions
+	edge_types: Optional[np.ndarray] # Edge type code per slot, or None when all slots share `predicate`
+	predicate: Optional[str]
+	start: int
+	end: int
+
+class DistractorSampler:
+	"""
+	Samples distractor facts from precomputed fact neighborhoods of a GraphIndex.
+
+	The outgoing facts of every node are already a slice of the index's CSR arrays, so the
+	candidates of a question are described by a handful of slices instead of a list of Fact
+	objects. Distractors are drawn as random offsets into the concatenated slices and only
+	the drawn facts are materialized, which keeps the cost per question independent of the
+	degree of the entities involved.
+
+	In hard mode, candidates that resemble the correct facts are preferred: facts of the
+	context entities with the same predicate or target type as a correct fact, and facts with
+	the same predicate about sibling entities (nodes of the same type sharing a neighbor, e.g.
+	the population of another municipality in the same region).
+	"""
+	def __init__(self, index: GraphIndex, max_siblings: int = 16):
+		"""
+		Args:
+			index: The GraphIndex to sample from.
+			max_siblings: Number of siblings kept per node in hard mode. Hubs (e.g. a heritage
+				status shared by most castles) would otherwise make every node a sibling of
+				every other; the siblings closest to the node in graph order are kept.
+		"""
+		self.index = index
+		self.max_siblings = max_siblings
+		self._relations_by_edge_type: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+		for (edge_type, _), relation in index.relations.items():
+			self._relations_by_edge_type.setdefault(edge_type, []).append(relation)
+		# Reverse adjacency and sibling lists are only needed in hard mode, so they are built lazily
+		self._in_indptr: Optional[np.ndarray] = None
+		self._in_sources: Optional[np.ndarray] = None
+		self._siblings: Dict[int, np.ndarray] = {}
+		self._sibling_segments_cache: Dict[Tuple[int, str], List[_Segment]] = {}
+
+	def _positions(self, label: str) -> List[int]:
+		"""Positions of all nodes carrying a label; a label may name several nodes."""
+		position = self.index.node_position
+		return [position[node_id] for node_id in self.index.node_ids_by_label(label)]
+
+	def _neighborhood(self, entities: Dict[str, None]) -> List[_Segment]:
+		"""All labelled out-edges of every node named by the entities, one segment per node."""
+		index = self.index
+		return [
+			_Segment(label, index.out_targets, index.out_edge_types, None, int(index.out_indptr[position]), int(index.out_indptr[position + 1]))
+			for label in entities
+			for position in self._positions(label)
+		]
+
+	def siblings(self, position: int) -> np.ndarray:
+		"""
+		Returns the positions of the nodes of the same type sharing an out-neighbor with a node.
+
+		At most `max_siblings` are returned. Computed once per node and cached.
+		"""
+		siblings = self._siblings.get(position)
+		if siblings is not None:
+			return siblings
+
+		index = self.index
+		if self._in_indptr is None:
+			sources = np.repeat(np.arange(index.num_nodes, dtype=np.int32), np.diff(index.out_indptr))
+			order = np.argsort(index.out_targets, kind="stable")
+			self._in_sources = sources[order]
+			self._in_indptr = np.zeros(index.num_nodes + 1, dtype=np.int64)
+			np.cumsum(np.bincount(index.out_targets, minlength=index.num_nodes), out=self._in_indptr[1:])
+
+		neighbors = index.out_targets[index.out_indptr[position]:index.out_indptr[position + 1]].tolist()
+		if neighbors:
+			candidates = np.concatenate([self._in_sources[self._in_indptr[n]:self._in_indptr[n + 1]] for n in neighbors])
+			candidates = candidates[(index.node_types[candidates] == index.node_types[position]) & (candidates != position)]
+			siblings = np.unique(candidates)
+			if len(siblings) > self.max_siblings:
+				# Deterministic, so the sample does not depend on which process computed it
+				nearest = np.argsort(np.abs(siblings.astype(np.int64) - position), kind="stable")[:self.max_siblings]
+				siblings = siblings[np.sort(nearest)]
+		else:
+			siblings = np.empty(0, dtype=np.int32)
+		self._siblings[position] = siblings
+		return siblings
+
+	def _sibling_segments(self, position: int, predicate: str) -> List[_Segment]:
+		"""Non-empty facts with the predicate about the siblings of a node, cached per (node, predicate)."""
+		key = (position, predicate)
+		segments = self._sibling_segments_cache.get(key)
+		if segments is None:
+			index = self.index
+			label = index.labels[position]
+			segments = []
+			for sibling in self.siblings(position).tolist():
+				sibling_label = index.labels[sibling]
+				if not sibling_label or sibling_label == label:
+					continue
+				for indptr, indices in self._relations_by_edge_type.get(predicate, []):
+					start, end = int(indptr[sibling]), int(indptr[sibling + 1])
+					if start != end:
+						segments.append(_Segment(sibling_label, indices, None, predicate, start, end))
+			self._sibling_segments_cache[key] = segments
+		return segments
+
+	def _hard_segments(self, entities: Dict[str, None], correct_facts: List[Fact]) -> List[_Segment]:
+		"""Candidates resembling the correct facts, see the class docstring."""
+		index = self.index
+		predicates = {fact.predicate for fact in correct_facts}
+		object_types = {index.type_names[index.node_types[position]] for fact in correct_facts for position in self._positions(fact.object)}
+		relations = [
+			(edge_type, indptr, indices)
+			for (edge_type, target_type), (indptr, indices) in index.relations.items()
+			if edge_type in predicates or target_type in object_types
+		]
+
+		segments = []
+		for label in entities:
+			for position in self._positions(label):
+				for edge_type, indptr, indices in relations:
+					start, end = int(indptr[position]), int(indptr[position + 1])
+					if start != end:
+						segments.append(_Segment(label, indices, None, edge_type, start, end))
+
+		for fact in correct_facts:
+			for position in self._positions(fact.subject):
+				segments.extend(self._sibling_segments(position, fact.predicate))
+		return segments
+
+	def _draw(self, segments: List[_Segment], num_facts: int, excluded: Set[Tuple[str, str, str]], rng: Random) -> List[Fact]:
+		"""
+		Draws up to `num_facts` distinct facts uniformly from the segments, skipping excluded ones.
+
+		A few extra offsets are drawn to make up for excluded facts; if that is not enough
+		(e.g. an excluded fact occupies several slots), all offsets are drawn in random order.
+		"""
+		ends = list(accumulate(segment.end - segment.start for segment in segments))
+		total = ends[-1] if ends else 0
+		if total == 0 or num_facts <= 0:
+			return []
+
+		labels = self.index.labels
+		edge_type_names = self.index.edge_type_names
+		num_draws = min(total, num_facts + len(excluded))
+		while True:
+			chosen: List[Fact] = []
+			seen = set(excluded)
+			for offset in rng.sample(range(total), num_draws):
+				number = bisect_right(ends, offset)
+				segment = segments[number]
+				slot = segment.end - (ends[number] - offset)
+				predicate = segment.predicate if segment.edge_types is None else edge_type_names[segment.edge_types[slot]]
+				fact = Fact(subject=segment.subject, predicate=predicate, object=labels[segment.targets[slot]])
+				if fact.to_tuple() in seen:
+					continue
+				seen.add(fact.to_tuple())
+				chosen.append(fact)
+				if len(chosen) == num_facts:
+					return chosen
+			if num_draws == total:
+				return chosen
+			num_draws = total
+
+	def sample(self, correct_facts: List[Fact], num_distractors: int, rng: Random, hard: bool = False) -> List[Fact]:
+		"""
+		Samples distractor facts related to the entities of the correct facts.
+
+		Args:
+			correct_facts: The Fact objects of the question's context.
+			num_distractors: The desired number of distractor facts.
+			rng: The random number generator driving the draw.
+			hard: Prefer candidates resembling the correct facts, topping up with other
+				neighborhood facts if there are not enough of them.
+
+		Returns:
+			A list of distinct Fact objects, none of them a correct fact.
+		"""
+		if not correct_facts or num_distractors <= 0:
+			return []
+
+		# Entities are kept in insertion order (not a set) so that sampling does not depend on string hashing
+		entities: Dict[str, None] = {}
+		for fact in correct_facts:
+			entities[fact.subject] = None
+			entities[fact.object] = None
+		excluded = {fact.to_tuple() for fact in correct_facts}
+
+		distractors: List[Fact] = []
+		if hard:
+			distractors = self._draw(self._hard_segments(entities, correct_facts), num_distractors, excluded, rng)
+			if len(distractors) == num_distractors:
+				return distractors
+			excluded.update(fact.to_tuple() for fact in distractors)
+
+		return distractors + self._draw(self._neighborhood(entities), num_distractors - len(distractors), excluded, rng)
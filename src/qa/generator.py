@@ -1,39 +1,180 @@
-from random import choice, sample, random
+from itertools import product
+from random import Random
 import networkx as nx
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, Iterator, List, Tuple, Optional, Union
 from collections.abc import Set
 from typeguard import typechecked
-from .question import QuestionTemplate, GraphPathStep
-from .answer import Fact, QA
+from .question import QuestionTemplate, AggregateTemplate, ComparativeTemplate
+from .answer import Fact, FactTable, QA
+from .distractors import DistractorSampler
+from .index import GraphIndex
+from .numeric import NumericIndex, NumericTemplateEngine
+from .pool import QuestionPool
+from .sparse import SparseTemplateEngine
+
+def _traverse_path(
+	index: GraphIndex,
+	start_nodes: Dict[str, Dict[str, Any]],
+	template_info: QuestionTemplate
+) -> Tuple[bool, Dict[str, Dict[str, Any]], List[Fact]]:
+	"""
+	Body of QAGenerator.traverse_graph_path over a prebuilt index.
+
+	Kept outside the @typechecked class so the generation loop does not pay for runtime
+	type checks of the captured-node dicts on every traversal.
+	"""
+	captured_nodes = start_nodes.copy()
+	traversal_facts: List[Fact] = [] # Store Fact objects
+	if not start_nodes:
+		return False, captured_nodes, traversal_facts
+	current_step_source_variable = list(start_nodes.keys())[0] # Assume single start node for now
+
+	for step in template_info.path:
+		source_var = step.source_variable if step.source_variable else current_step_source_variable
+
+		if source_var not in captured_nodes:
+			return False, captured_nodes, traversal_facts
+
+		current_node_id = captured_nodes[source_var]["id"]
+		current_node_label = captured_nodes[source_var]["label"]
+
+		# Labelled neighbors over the typed edge, as a slice of the precomputed adjacency
+		possible_next_nodes = index.targets(current_node_id, step.edge_type, step.target_node_type)
+
+		if len(possible_next_nodes) == 1:
+			next_node_position = possible_next_nodes[0]
+			next_node_id = index.node_ids[next_node_position]
+			next_node_label = index.labels[next_node_position]
+
+			captured_nodes[step.capture_as] = {
+				"id": next_node_id,
+				"label": next_node_label,
+				"type": step.target_node_type
+			}
+			# Store step data as a Fact object
+			traversal_facts.append(Fact(
+				subject=current_node_label,
+				predicate=step.edge_type,
+				object=next_node_label
+			))
+			current_step_source_variable = step.capture_as
+		else:
+			return False, captured_nodes, traversal_facts
+
+	if template_info.answer_variable not in captured_nodes:
+		return False, captured_nodes, traversal_facts
+
+	return True, captured_nodes, traversal_facts
+
+def _enumerate_template(index: GraphIndex, template_info: QuestionTemplate, fact_table: FactTable) -> Tuple[int, List[QA]]:
+	"""Traverses every start binding of a template; returns the binding count and the successful QAs."""
+	requirement_keys = list(template_info.requirements.keys())
+	candidates = [index.labelled_nodes_by_type.get(details["type"], []) for details in template_info.requirements.values()]
+
+	num_bindings = 0
+	qas: List[QA] = []
+	for binding in product(*candidates):
+		num_bindings += 1
+		start_nodes = {}
+		format_dict = {}
+		for req_key, node_id in zip(requirement_keys, binding):
+			node_label = index.labels[index.node_position[node_id]]
+			start_nodes[req_key] = {"id": node_id, "label": node_label, "type": template_info.requirements[req_key]["type"]}
+			format_dict[f"{req_key}_label"] = node_label
+
+		success, captured_nodes, context_facts = _traverse_path(index, start_nodes, template_info)
+		if not success or not context_facts:
+			continue
+		answer_label = captured_nodes[template_info.answer_variable]["label"]
+		qas.append(QA(
+			question=template_info.template.format(**format_dict),
+			answer=template_info.answer_pattern.format(target_label=answer_label),
+			context_facts=context_facts,
+			fact_table=fact_table
+		))
+	return num_bindings, qas
+
+def _add_distractors(sampler: DistractorSampler, qa: QA, num_distractors: int, rng: Random, hard: bool = False) -> QA:
+	"""Returns a copy of a pooled QA with distractor facts mixed into its context, in the same FactTable."""
+	fact_table = qa.fact_table
+	distractor_facts = sampler.sample(qa.context_facts, num_distractors, rng, hard=hard)
+	fact_ids = list(qa.fact_ids) + [fact_table.add_fact(fact) for fact in distractor_facts]
+	return QA(
+		question=qa.question,
+		answer=qa.answer,
+		fact_table=fact_table,
+		fact_ids=sorted(fact_ids, key=lambda x: rng.random())
+	)
 
 @typechecked
 class QAGenerator:
-	_node_label_to_id_cache = {}
+	def __init__(self, seed: Optional[int] = None):
+		"""
+		Initializes the QAGenerator.
+
+		Args:
+			seed: Seed for the generator's own random number generator. All sampling goes
+				through it, so runs with the same seed and graph are reproducible.
+		"""
+		self.rng = Random(seed)
+		# Facts of all generated QA objects are interned here
+		self.fact_table = FactTable()
+		# Number of sampled (template, start node) attempts of the last iter_questions run
+		self.last_attempts = 0
+		self._index: Optional[GraphIndex] = None
+		self._distractor_sampler: Optional[DistractorSampler] = None
+		self._numeric_index: Optional[NumericIndex] = None
+		self._pool: Optional[QuestionPool] = None
+		self._pool_key: Optional[Tuple[int, ...]] = None
+
+	def get_index(self, graph: Union[nx.Graph, GraphIndex]) -> GraphIndex:
+		"""
+		Returns the lookup index for the graph, rebuilding it if the graph changed.
 
-	def find_node_id_by_label(self, graph: nx.Graph, label: str) -> Optional[str]:
+		A prebuilt GraphIndex may be passed wherever a graph is expected and is used as is.
+		"""
+		if isinstance(graph, GraphIndex):
+			return graph
+		if self._index is None or not self._index.is_current(graph):
+			self._index = GraphIndex(graph)
+		return self._index
+
+	def invalidate_index(self):
+		"""Drops the cached index, e.g. after editing node attributes in place."""
+		self._index = None
+		self._distractor_sampler = None
+		self._numeric_index = None
+
+	def get_distractor_sampler(self, graph: Union[nx.Graph, GraphIndex]) -> DistractorSampler:
+		"""Returns the distractor sampler over the graph's index, rebuilding it with the index."""
+		index = self.get_index(graph)
+		if self._distractor_sampler is None or self._distractor_sampler.index is not index:
+			self._distractor_sampler = DistractorSampler(index)
+		return self._distractor_sampler
+
+	def get_numeric_index(self, graph: Union[nx.Graph, GraphIndex]) -> NumericIndex:
+		"""Returns the sorted numeric attribute indexes over the graph's index, rebuilding them with the index."""
+		index = self.get_index(graph)
+		if self._numeric_index is None or self._numeric_index.index is not index:
+			self._numeric_index = NumericIndex(index)
+		return self._numeric_index
+
+	def find_node_id_by_label(self, graph: Union[nx.Graph, GraphIndex], label: str) -> Optional[str]:
 		"""Finds the first node ID matching a given label."""
-		if label in self._node_label_to_id_cache:
-			return self._node_label_to_id_cache[label]
-
-		for node_id, data in graph.nodes(data=True):
-			if data.get("label") == label:
-				self._node_label_to_id_cache[label] = node_id # Cache the result
-				return node_id
-		return None
-
-	def get_random_node(self, graph: nx.Graph, node_type: str) -> Optional[str]:
-		"""Selects a random node ID of a specific type from the graph."""
-		nodes_of_type = [
-			node_id for node_id, data in graph.nodes(data=True)
-			if data.get("type") == node_type and data.get("label")  # Ensure it has a label
-		]
-		if not nodes_of_type:
-			return None
-		return sample(nodes_of_type, 1)[0]
+		node_ids = self.get_index(graph).node_ids_by_label(label)
+		return node_ids[0] if node_ids else None
+
+	def find_node_ids_by_label(self, graph: Union[nx.Graph, GraphIndex], label: str) -> List[str]:
+		"""Finds all node IDs matching a given label; labels such as numeric values are not unique."""
+		return list(self.get_index(graph).node_ids_by_label(label))
+
+	def get_random_node(self, graph: Union[nx.Graph, GraphIndex], node_type: str) -> Optional[str]:
+		"""Selects a random labelled node ID of a specific type from the graph."""
+		return self.get_index(graph).random_node(node_type, self.rng)
 
 	def traverse_graph_path(
 		self,
-		graph: nx.Graph,
+		graph: Union[nx.Graph, GraphIndex],
 		start_nodes: Dict[str, Dict[str, Any]],
 		template_info: QuestionTemplate
 	) -> Tuple[bool, Dict[str, Dict[str, Any]], List[Fact]]: # Return List[Fact] now
@@ -41,7 +182,7 @@ class QAGenerator:
 		Traverses the graph based on a declarative path definition using GraphPathStep objects.
 
 		Args:
-			graph: The NetworkX graph.
+			graph: The NetworkX graph, or a prebuilt GraphIndex of it.
 			start_nodes: A dictionary of starting nodes with their IDs and labels.
 			template_info: The QuestionTemplate object containing the path definition.
 
@@ -51,171 +192,185 @@ class QAGenerator:
 			- captured_nodes (dict): All nodes captured during traversal (including start nodes).
 			- traversal_facts (list): List of Fact objects representing successful steps.
 		"""
-		captured_nodes = start_nodes.copy()
-		traversal_facts: List[Fact] = [] # Store Fact objects
-		if not start_nodes:
-			return False, captured_nodes, traversal_facts
-		current_step_source_variable = list(start_nodes.keys())[0] # Assume single start node for now
-
-		for step in template_info.path:
-			source_var = step.source_variable if step.source_variable else current_step_source_variable
-
-			if source_var not in captured_nodes:
-				return False, captured_nodes, traversal_facts
-
-			current_node_id = captured_nodes[source_var]["id"]
-			current_node_label = captured_nodes[source_var]["label"]
-
-			possible_next_nodes = []
-			for neighbor_id in graph.neighbors(current_node_id):
-				edge_data = graph.get_edge_data(current_node_id, neighbor_id, default={})
-				node_data = graph.nodes[neighbor_id]
-				if (edge_data.get("type") == step.edge_type and
-					node_data.get("type") == step.target_node_type and
-					node_data.get("label")):
-					possible_next_nodes.append(neighbor_id)
-
-			if len(possible_next_nodes) == 1:
-				next_node_id = possible_next_nodes[0]
-				next_node_data = graph.nodes[next_node_id]
-				next_node_label = next_node_data.get("label")
-
-				captured_nodes[step.capture_as] = {
-					"id": next_node_id,
-					"label": next_node_label,
-					"type": step.target_node_type
-				}
-				# Store step data as a Fact object
-				traversal_facts.append(Fact(
-					subject=current_node_label,
-					predicate=step.edge_type,
-					object=next_node_label
-				))
-				current_step_source_variable = step.capture_as
-			else:
-				return False, captured_nodes, traversal_facts
-
-		if template_info.answer_variable not in captured_nodes:
-			return False, captured_nodes, traversal_facts
-
-		return True, captured_nodes, traversal_facts
+		return _traverse_path(self.get_index(graph), start_nodes, template_info)
 
 	def generate_distractor_facts(
 		self,
-		graph: nx.Graph,
+		graph: Union[nx.Graph, GraphIndex],
 		correct_facts: List[Fact],
-		num_distractors: int = 2
+		num_distractors: int = 2,
+		hard: bool = False
 	) -> List[Fact]:
 		"""
 		Generates distractor facts related to entities in the correct facts.
 
 		Args:
-			graph: The NetworkX graph.
+			graph: The NetworkX graph, or a prebuilt GraphIndex of it.
 			correct_facts: A list of Fact objects representing the relevant context.
 			num_distractors: The desired number of distractor facts.
+			hard: Prefer hard negatives, i.e. facts sharing a predicate or target type with the
+				correct facts, such as the population of a neighbouring municipality.
 
 		Returns:
 			A list of Fact objects representing distractor facts.
 		"""
-		if not correct_facts or num_distractors <= 0:
-			return []
-
-		# 1. Identify entities and create a set of correct fact tuples for quick lookup
-		entities_of_interest: Set[str] = set()
-		correct_fact_tuples: Set[Tuple[str, str, str]] = set()
-		for fact in correct_facts:
-			entities_of_interest.add(fact.subject)
-			entities_of_interest.add(fact.object)
-			correct_fact_tuples.add(fact.to_tuple())
-
-		# 2. Find candidate distractor facts connected to these entities
-		candidate_distractors: List[Fact] = []
-		processed_entities: Set[str] = set() # Avoid processing the same entity multiple times
-
-		# Clear cache for node lookup before starting generation batch
-		self._node_label_to_id_cache.clear()
-
-		for entity_label in entities_of_interest:
-			if entity_label in processed_entities:
-				continue
+		return self.get_distractor_sampler(graph).sample(correct_facts, num_distractors, self.rng, hard=hard)
 
-			entity_id = self.find_node_id_by_label(graph, entity_label)
-			if entity_id is None or not graph.has_node(entity_id):
-				continue # Entity label not found in graph
-
-			processed_entities.add(entity_label)
-
-			# Find all neighbors and generate potential facts
-			for neighbor_id in graph.neighbors(entity_id):
-				if not graph.has_node(neighbor_id): continue # Should not happen
-
-				neighbor_label = graph.nodes[neighbor_id].get("label")
-				edge_data = graph.get_edge_data(entity_id, neighbor_id, default={})
-				edge_type = edge_data.get("type")
-
-				if neighbor_label and edge_type:
-					# Create fact: <entity> <edge_type> <neighbor>
-					potential_fact = Fact(subject=entity_label, predicate=edge_type, object=neighbor_label)
-					# Add if it's not one of the correct facts
-					if potential_fact.to_tuple() not in correct_fact_tuples:
-						candidate_distractors.append(potential_fact)
+	def build_question_pool(self, graph: Union[nx.Graph, GraphIndex], templates: List[QuestionTemplate]) -> QuestionPool:
+		"""
+		Enumerates every valid (template, start binding) pair of the graph once.
 
-					# Consider adding the inverse fact if your graph represents bidirectional info implicitly
-					# Example: If edge is 'located_in', maybe add '<neighbor> <contains> <entity>'
-					# This depends heavily on your schema and needs careful definition.
-					# For now, we only add the direct fact found.
+		Templates with a single requirement are executed for all start nodes in one batch by
+		the SparseTemplateEngine; others fall back to traversing each binding. Aggregate and
+		comparative templates are answered from the NumericIndex.
 
-		# 3. Select distractors randomly
-		if not candidate_distractors:
-			return []
+		The pool is cached on the generator and reused while the graph index and the
+		template objects stay the same.
 
-		num_to_sample = min(num_distractors, len(candidate_distractors))
-		selected_distractors = sample(candidate_distractors, num_to_sample)
+		Args:
+			graph: The populated NetworkX graph, or a prebuilt GraphIndex of it.
+			templates: A list of QuestionTemplate objects.
 
-		return selected_distractors
+		Returns:
+			A QuestionPool with all unique questions, grouped by template.
+		"""
+		index = self.get_index(graph)
+		pool_key = (id(index), *map(id, templates))
+		if self._pool is not None and self._pool_key == pool_key:
+			return self._pool
+
+		engine = SparseTemplateEngine(index, self.fact_table)
+		numeric_engine = NumericTemplateEngine(self.get_numeric_index(index), self.fact_table)
+		entries: Dict[int, List[QA]] = {}
+		answers_by_question: Dict[str, Optional[str]] = {}
+		num_bindings = 0
+		for position, template_info in enumerate(templates):
+			if isinstance(template_info, (AggregateTemplate, ComparativeTemplate)):
+				template_bindings, qas = numeric_engine.enumerate(template_info)
+			elif len(template_info.requirements) == 1:
+				# Single start variable: run the path for all start nodes at once
+				result = engine.execute(template_info)
+				template_bindings, qas = len(result.start_positions), engine.materialize(template_info, result)
+			else:
+				template_bindings, qas = _enumerate_template(index, template_info, self.fact_table)
+			num_bindings += template_bindings
+			entries[position] = qas
+			for qa in qas:
+				# None marks a question text whose bindings disagree on the answer
+				previous = answers_by_question.setdefault(qa.question, qa.answer)
+				if previous is not None and previous != qa.answer:
+					answers_by_question[qa.question] = None
+
+		seen_questions: Set[str] = set()
+		for position, qas in entries.items():
+			unique_qas = []
+			for qa in qas:
+				if answers_by_question[qa.question] is None or qa.question in seen_questions:
+					continue
+				seen_questions.add(qa.question)
+				unique_qas.append(qa)
+			entries[position] = unique_qas
+
+		self._pool = QuestionPool(templates, entries, num_bindings)
+		self._pool_key = pool_key
+		return self._pool
+
+	def count_unique_questions(self, graph: Union[nx.Graph, GraphIndex], templates: List[QuestionTemplate]) -> int:
+		"""Returns the exact number of unique questions the templates can produce on the graph."""
+		return len(self.build_question_pool(graph, templates))
 
 	def generate_questions(
 		self,
-		graph: nx.Graph,
+		graph: Union[nx.Graph, GraphIndex],
 		templates: List[QuestionTemplate],
 		num_questions: int = 50,
-		add_distractors: int = 0
+		add_distractors: int = 0,
+		exhaustive: bool = False,
+		stratify: bool = False,
+		hard_distractors: bool = False
 	) -> List[QA]:
 		"""
 		Generates questions based on generalized QuestionTemplate objects, optionally adding distractor facts.
 
+		Collects iter_questions into a list; see there for the arguments and sampling modes.
+
+		Returns:
+			A list of QA objects.
+		"""
+		return list(self.iter_questions(graph, templates, num_questions, add_distractors, exhaustive, stratify, hard_distractors))
+
+	def iter_questions(
+		self,
+		graph: Union[nx.Graph, GraphIndex],
+		templates: List[QuestionTemplate],
+		num_questions: int = 50,
+		add_distractors: int = 0,
+		exhaustive: bool = False,
+		stratify: bool = False,
+		hard_distractors: bool = False
+	) -> Iterator[QA]:
+		"""
+		Lazily generates questions, yielding each QA object as soon as it is complete.
+
+		By default template and start nodes are drawn at random and rejected when the path is
+		not unique, which may repeat questions. With `exhaustive=True` all valid bindings are
+		enumerated once (see build_question_pool) and sampled without replacement, so there
+		are no wasted traversals and no duplicates; fewer than `num_questions` are yielded
+		if the graph does not support that many.
+
 		Args:
-			graph: The populated NetworkX graph.
+			graph: The populated NetworkX graph, or a prebuilt GraphIndex of it.
 			templates: A list of QuestionTemplate objects.
 			num_questions: The desired number of questions to generate.
 			add_distractors: The number of distractor facts to add to each generated QA pair.
+			exhaustive: Sample from the enumerated pool of unique questions instead of rejection sampling.
+			stratify: In exhaustive mode, spread the questions evenly across templates.
+			hard_distractors: Prefer hard negatives as distractors (see generate_distractor_facts).
 
-		Returns:
-			A list of QA objects.
+		Yields:
+			QA objects, in generation order.
 		"""
 		if not graph or graph.number_of_nodes() == 0:
 			print("Graph is empty. Cannot generate questions.")
-			return []
-
-		generated_data: List[QA] = []
+			return
+
+		index = self.get_index(graph)
+		sampler = self.get_distractor_sampler(index)
+		numeric_engine = NumericTemplateEngine(self.get_numeric_index(index), self.fact_table)
+
+		if exhaustive:
+			pool = self.build_question_pool(graph, templates)
+			num_generated = 0
+			for qa in pool.sample(num_questions, self.rng, stratify=stratify):
+				num_generated += 1
+				yield _add_distractors(sampler, qa, add_distractors, self.rng, hard_distractors)
+			self.last_attempts = num_generated
+			print(f"Generated {num_generated} questions from a pool of {len(pool)} unique questions.")
+			return
+
+		num_generated = 0
 		attempts = 0
 		max_attempts = num_questions * 25
 
-		# Clear node lookup cache at the start of generation
-		self._node_label_to_id_cache.clear()
-
-		while len(generated_data) < num_questions and attempts < max_attempts:
+		while num_generated < num_questions and attempts < max_attempts:
 			attempts += 1
-			template_info: QuestionTemplate = choice(templates)
+			template_info: QuestionTemplate = self.rng.choice(templates)
+
+			if isinstance(template_info, (AggregateTemplate, ComparativeTemplate)):
+				qa = numeric_engine.sample(template_info, self.rng)
+				if qa is not None:
+					num_generated += 1
+					yield _add_distractors(sampler, qa, add_distractors, self.rng, hard_distractors)
+				continue
 
 			start_nodes = {}
 			format_dict = {}
 			for req_key, req_details in template_info.requirements.items():
-				node_id = self.get_random_node(graph, req_details["type"])
+				node_id = index.random_node(req_details["type"], self.rng)
 				if node_id is None:
 					raise ValueError(f"No nodes of type {req_details['type']} not found in graph.")
 
-				node_label = graph.nodes[node_id].get("label")
+				node_label = index.labels[index.node_position[node_id]]
 				if not node_label:
 					raise ValueError(f"Node {node_id} does not have a label.")
 
@@ -224,8 +379,8 @@ class QAGenerator:
 
 			question = template_info.template.format(**format_dict)
 
-			success, captured_nodes, context_facts = self.traverse_graph_path(
-				graph, start_nodes, template_info
+			success, captured_nodes, context_facts = _traverse_path(
+				index, start_nodes, template_info
 			)
 			if not success:
 				continue
@@ -240,17 +395,16 @@ class QAGenerator:
 
 			# Generate distractor facts if requested
 			if add_distractors > 0 and context_facts:
-				distractor_facts = self.generate_distractor_facts(graph, context_facts, add_distractors)
+				distractor_facts = sampler.sample(context_facts, add_distractors, self.rng, hard=hard_distractors)
 
 			if context_facts: # Ensure context was generated
-				generated_data.append(QA(
+				num_generated += 1
+				yield QA(
 					question=question,
 					answer=answer,
-					context_facts=sorted(context_facts + distractor_facts, key=lambda x: random())
-				))
-
-		# Clear cache after generation batch
-		self._node_label_to_id_cache.clear()
+					context_facts=sorted(context_facts + distractor_facts, key=lambda x: self.rng.random()),
+					fact_table=self.fact_table
+				)
 
-		print(f"Generated {len(generated_data)} questions after {attempts} attempts.")
-		return generated_data
\ No newline at end of file
+		self.last_attempts = attempts
+		print(f"Generated {num_generated} questions after {attempts} attempts.")
\ No newline at end of file
@@ -0,0 +1,234 @@
+import weakref
+from random import Random
+import numpy as np
+import networkx as nx
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class GraphIndex:
+	"""
+	Read-only lookup structures over a knowledge graph, built once per graph.
+
+	Nodes are interned to integer positions (`node_ids[pos]`, `node_position[node_id]`), and
+	typed adjacency is stored CSR-style per (edge type, target node type) relation, so the
+	labelled targets of a node along a relation are a single array slice.
+
+	The index registers a token in the graph's `__networkx_cache__`, which networkx clears
+	whenever nodes or edges are added or removed. A missing token therefore means the graph
+	has been mutated and the index must be rebuilt. Edits made directly to attribute dicts
+	(e.g. `graph.nodes[n]["label"] = ...`) bypass networkx and are not detected.
+	"""
+	def __init__(self, graph: nx.Graph):
+		self._graph_ref = weakref.ref(graph)
+		self._token = object()
+
+		self._build_nodes(
+			graph.number_of_nodes(),
+			((node_id, data.get("type"), data.get("label")) for node_id, data in graph.nodes(data=True))
+		)
+
+		self.edge_type_names: List[str] = []
+		self.edge_type_codes: Dict[str, int] = {}
+		sources, targets, edge_types = [], [], []
+		position = self.node_position
+		for source_id, target_id, edge_type in graph.edges(data="type"):
+			if edge_type is None:
+				continue
+			code = self.edge_type_codes.get(edge_type)
+			if code is None:
+				code = self.edge_type_codes[edge_type] = len(self.edge_type_names)
+				self.edge_type_names.append(edge_type)
+			sources.append(position[source_id])
+			targets.append(position[target_id])
+			edge_types.append(code)
+			if not graph.is_directed():
+				sources.append(position[target_id])
+				targets.append(position[source_id])
+				edge_types.append(code)
+
+		self._build_relations(
+			np.asarray(sources, dtype=np.int32),
+			np.asarray(targets, dtype=np.int32),
+			np.asarray(edge_types, dtype=np.int32)
+		)
+
+		cache = getattr(graph, "__networkx_cache__", None)
+		if cache is not None:
+			cache[self._token] = True
+
+	@classmethod
+	def from_arrays(
+		cls,
+		node_ids: List[str],
+		node_types: np.ndarray,
+		type_names: List[Optional[str]],
+		labels: List[Optional[str]],
+		edge_sources: np.ndarray,
+		edge_targets: np.ndarray,
+		edge_types: np.ndarray,
+		edge_type_names: List[str]
+	) -> "GraphIndex":
+		"""
+		Builds a detached index from interned arrays, without a networkx graph.
+
+		Args:
+			node_ids: Node IDs in position order.
+			node_types: Type code of every node, indexing `type_names`.
+			type_names: Node type names by code.
+			labels: Node labels in position order (falsy for unlabelled nodes).
+			edge_sources: Source node position of every directed edge.
+			edge_targets: Target node position of every directed edge.
+			edge_types: Edge type code of every edge, indexing `edge_type_names`.
+			edge_type_names: Edge type names by code.
+
+		Returns:
+			A GraphIndex that is not tied to any graph.
+		"""
+		index = cls.__new__(cls)
+		index._graph_ref = None
+		index._token = None
+		index._build_nodes(
+			len(node_ids),
+			zip(node_ids, (type_names[code] for code in np.asarray(node_types).tolist()), labels)
+		)
+		index.edge_type_names = list(edge_type_names)
+		index.edge_type_codes = {name: code for code, name in enumerate(index.edge_type_names)}
+		index._build_relations(
+			np.asarray(edge_sources, dtype=np.int32),
+			np.asarray(edge_targets, dtype=np.int32),
+			np.asarray(edge_types, dtype=np.int32)
+		)
+		return index
+
+	def _build_nodes(self, num_nodes: int, nodes: Iterable[Tuple[str, Optional[str], Optional[str]]]):
+		"""Interns (node ID, type, label) triples and groups them by type and label."""
+		self.num_nodes = num_nodes
+
+		# Intern node IDs, types and labels
+		self.node_ids: List[str] = []
+		self.node_position: Dict[str, int] = {}
+		self.labels: List[Optional[str]] = []
+		self.type_names: List[Optional[str]] = []
+		self.type_codes: Dict[Optional[str], int] = {}
+		node_types = np.empty(num_nodes, dtype=np.int32)
+
+		# Node IDs grouped by type, and the subset of them that carries a label
+		self.nodes_by_type: Dict[str, List[str]] = {}
+		self.labelled_nodes_by_type: Dict[str, List[str]] = {}
+		# Reverse label index; labels are not unique (e.g. numeric values), so each maps to all IDs
+		self.nodes_by_label: Dict[str, List[str]] = {}
+		for position, (node_id, node_type, label) in enumerate(nodes):
+			self.node_ids.append(node_id)
+			self.node_position[node_id] = position
+			self.labels.append(label)
+			node_types[position] = self._intern_type(node_type)
+			self.nodes_by_type.setdefault(node_type, []).append(node_id)
+			if label:
+				self.labelled_nodes_by_type.setdefault(node_type, []).append(node_id)
+				self.nodes_by_label.setdefault(label, []).append(node_id)
+		self.node_types = node_types
+
+	def _intern_type(self, node_type: Optional[str]) -> int:
+		code = self.type_codes.get(node_type)
+		if code is None:
+			code = self.type_codes[node_type] = len(self.type_names)
+			self.type_names.append(node_type)
+		return code
+
+	def _build_relations(self, sources: np.ndarray, targets: np.ndarray, edge_types: np.ndarray):
+		"""Builds one CSR adjacency (indptr, indices) per (edge type, target type) relation."""
+		self.num_edges = len(sources)
+
+		# Traversal only ever moves to labelled nodes, so unlabelled targets are left out
+		has_label = np.fromiter((bool(label) for label in self.labels), dtype=bool, count=self.num_nodes)
+		keep = has_label[targets]
+		sources, targets, edge_types = sources[keep], targets[keep], edge_types[keep]
+
+		# All labelled out-edges grouped by source, for enumerating a node's facts
+		order = np.argsort(sources, kind="stable")
+		self.out_indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+		np.cumsum(np.bincount(sources, minlength=self.num_nodes), out=self.out_indptr[1:])
+		self.out_targets = targets[order]
+		self.out_edge_types = edge_types[order]
+
+		num_types = len(self.type_names)
+		relation_keys = edge_types.astype(np.int64) * num_types + self.node_types[targets]
+		order = np.lexsort((targets, sources, relation_keys))
+		sources, targets, relation_keys = sources[order], targets[order], relation_keys[order]
+
+		self.relations: Dict[Tuple[str, Optional[str]], Tuple[np.ndarray, np.ndarray]] = {}
+		boundaries = np.flatnonzero(np.diff(relation_keys)) + 1
+		for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(relation_keys)]):
+			if start == end:
+				continue
+			edge_type_code, target_type_code = divmod(int(relation_keys[start]), num_types)
+			indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+			np.cumsum(np.bincount(sources[start:end], minlength=self.num_nodes), out=indptr[1:])
+			key = (self.edge_type_names[edge_type_code], self.type_names[target_type_code])
+			self.relations[key] = (indptr, targets[start:end])
+
+	def __getstate__(self):
+		# The graph reference and mutation token only make sense in the building process;
+		# an unpickled index is detached from any graph and used as a standalone graph.
+		state = self.__dict__.copy()
+		state["_graph_ref"] = None
+		state["_token"] = None
+		return state
+
+	def __len__(self) -> int:
+		return self.num_nodes
+
+	def number_of_nodes(self) -> int:
+		"""Mirrors nx.Graph.number_of_nodes so the index can stand in for its graph."""
+		return self.num_nodes
+
+	def number_of_edges(self) -> int:
+		"""Number of typed directed edges the index was built from."""
+		return self.num_edges
+
+	def is_current(self, graph: nx.Graph) -> bool:
+		"""Checks whether the index was built from this graph and the graph is unchanged since."""
+		if self._graph_ref is None or self._graph_ref() is not graph or graph.number_of_nodes() != self.num_nodes:
+			return False
+		cache = getattr(graph, "__networkx_cache__", None)
+		return cache is None or self._token in cache
+
+	def random_node(self, node_type: str, rng: Random) -> Optional[str]:
+		"""Selects a random labelled node ID of a specific type in O(1)."""
+		nodes_of_type = self.labelled_nodes_by_type.get(node_type)
+		if not nodes_of_type:
+			return None
+		return rng.choice(nodes_of_type)
+
+	def node_ids_by_label(self, label: str) -> List[str]:
+		"""Returns the IDs of all nodes carrying the label, in graph order (empty if none)."""
+		return self.nodes_by_label.get(label, [])
+
+	def out_edges(self, node_id: str) -> List[Tuple[str, str]]:
+		"""Returns (edge type, target label) for every labelled out-edge of a node."""
+		position = self.node_position.get(node_id)
+		if position is None:
+			return []
+		start, end = self.out_indptr[position], self.out_indptr[position + 1]
+		return [
+			(self.edge_type_names[edge_type], self.labels[target])
+			for edge_type, target in zip(self.out_edge_types[start:end].tolist(), self.out_targets[start:end].tolist())
+		]
+
+	def targets(self, node_id: str, edge_type: str, target_node_type: str) -> np.ndarray:
+		"""
+		Returns positions of the labelled neighbors reached from a node over a typed edge.
+
+		Args:
+			node_id: The source node ID.
+			edge_type: The required edge `type` attribute.
+			target_node_type: The required `type` attribute of the neighbor.
+
+		Returns:
+			An array slice of node positions (empty if there are none).
+		"""
+		relation = self.relations.get((edge_type, target_node_type))
+		position = self.node_position.get(node_id)
+		if relation is None or position is None:
+			return np.empty(0, dtype=np.int32)
+		indptr, indices = relation
+		return indices[indptr[position]:indptr[position + 1]]
@@ -0,0 +1,254 @@
+from random import Random
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from utils.numbers import round_number
+from .answer import FactTable, QA
+from .index import GraphIndex
+from .question import AggregateTemplate, ComparativeTemplate
+
+class SortedValues(NamedTuple):
+	"""Entities carrying a numeric attribute, as parallel arrays sorted by ascending value."""
+	values: np.ndarray # Attribute values (float64)
+	entities: np.ndarray # Entity node positions
+	attributes: np.ndarray # Attribute node positions
+
+	def slice(self, start: int, end: int) -> "SortedValues":
+		return SortedValues(self.values[start:end], self.entities[start:end], self.attributes[start:end])
+
+	def between(
+		self,
+		low: Optional[float] = None,
+		high: Optional[float] = None,
+		include_low: bool = True,
+		include_high: bool = True
+	) -> "SortedValues":
+		"""Returns the entries with low <= value <= high (bounds optional, strict if not included), by bisection."""
+		start = 0 if low is None else int(np.searchsorted(self.values, low, side="left" if include_low else "right"))
+		end = len(self.values) if high is None else int(np.searchsorted(self.values, high, side="right" if include_high else "left"))
+		return self.slice(start, max(start, end))
+
+	def top_k(self, k: int, largest: bool = True) -> "SortedValues":
+		"""Returns the k entries with the largest (in descending order) or smallest values."""
+		if largest:
+			start = max(len(self.values) - k, 0)
+			return SortedValues(self.values[start:][::-1], self.entities[start:][::-1], self.attributes[start:][::-1])
+		return self.slice(0, k)
+
+class GroupedValues(NamedTuple):
+	"""SortedValues ordered by group and then by value; the members of group g are items indptr[g]:indptr[g + 1]."""
+	indptr: np.ndarray # Per group node position
+	members: SortedValues
+	groups: np.ndarray # Group node position of every item
+
+	def group(self, group_position: int) -> SortedValues:
+		return self.members.slice(int(self.indptr[group_position]), int(self.indptr[group_position + 1]))
+
+def _parse_number(label: Optional[str]) -> float:
+	try:
+		return float(label)
+	except (TypeError, ValueError):
+		return np.nan
+
+class NumericIndex:
+	"""
+	Sorted indexes of numeric attributes over a GraphIndex.
+
+	Numeric attributes (e.g. `ima_populacijo` -> `populacija`) are separate nodes whose labels
+	hold the value. For an (entity type, attribute) pair, every labelled entity with exactly one
+	parseable attribute node is sorted by value once, so range and top-k queries are a bisection
+	and a slice. Groupings (e.g. municipalities by `se_nahaja_v` region) reorder the same
+	entries by group, keeping each group sorted by value. Indexes are built on first use.
+	"""
+	def __init__(self, index: GraphIndex):
+		self.index = index
+		self._attributes: Dict[Tuple[str, str, str], SortedValues] = {}
+		self._groupings: Dict[Tuple[str, str, str, str, str], GroupedValues] = {}
+		self._pairs: Dict[Tuple[str, ...], np.ndarray] = {}
+
+	def _single_targets(self, positions: np.ndarray, edge_type: str, target_type: str) -> np.ndarray:
+		"""Target of every node over a relation, or -1 where the node has none or several."""
+		relation = self.index.relations.get((edge_type, target_type))
+		targets = np.full(len(positions), -1, dtype=np.int64)
+		if relation is None or len(positions) == 0:
+			return targets
+		indptr, indices = relation
+		single = (indptr[positions + 1] - indptr[positions]) == 1
+		targets[single] = indices[indptr[positions[single]]]
+		return targets
+
+	def attribute(self, entity_type: str, attribute_edge_type: str, attribute_type: str) -> SortedValues:
+		"""
+		Returns the entities of a type sorted by the value of a numeric attribute.
+
+		Args:
+			entity_type: The `type` of the entities, e.g. "občina".
+			attribute_edge_type: The edge from an entity to its attribute node, e.g. "ima_populacijo".
+			attribute_type: The `type` of the attribute nodes, e.g. "populacija".
+		"""
+		key = (entity_type, attribute_edge_type, attribute_type)
+		if key not in self._attributes:
+			index = self.index
+			entities = np.fromiter(
+				(index.node_position[node_id] for node_id in index.labelled_nodes_by_type.get(entity_type, [])),
+				dtype=np.int64
+			)
+			attributes = self._single_targets(entities, attribute_edge_type, attribute_type)
+			values = np.array([_parse_number(index.labels[position]) if position >= 0 else np.nan for position in attributes.tolist()], dtype=np.float64)
+			keep = ~np.isnan(values)
+			entities, attributes, values = entities[keep], attributes[keep], values[keep]
+			order = np.argsort(values, kind="stable")
+			self._attributes[key] = SortedValues(values[order], entities[order], attributes[order])
+		return self._attributes[key]
+
+	def grouped(
+		self,
+		entity_type: str,
+		attribute_edge_type: str,
+		attribute_type: str,
+		group_edge_type: str,
+		group_type: str
+	) -> GroupedValues:
+		"""
+		Returns the attribute index of `attribute` split by group.
+
+		An entity belongs to the group node it reaches over its single `group_edge_type` edge to
+		a node of `group_type` (e.g. "se_nahaja_v" -> "regija"); entities without one are left out.
+		"""
+		key = (entity_type, attribute_edge_type, attribute_type, group_edge_type, group_type)
+		if key not in self._groupings:
+			members = self.attribute(entity_type, attribute_edge_type, attribute_type)
+			groups = self._single_targets(members.entities, group_edge_type, group_type)
+			keep = groups >= 0
+			members = SortedValues(members.values[keep], members.entities[keep], members.attributes[keep])
+			groups = groups[keep]
+			# Stable sort by group keeps the members of a group in value order
+			order = np.argsort(groups, kind="stable")
+			members = SortedValues(members.values[order], members.entities[order], members.attributes[order])
+			groups = groups[order]
+			indptr = np.zeros(self.index.num_nodes + 1, dtype=np.int64)
+			np.cumsum(np.bincount(groups, minlength=self.index.num_nodes), out=indptr[1:])
+			self._groupings[key] = GroupedValues(indptr, members, groups)
+		return self._groupings[key]
+
+	def adjacent_pairs(self, template_info: ComparativeTemplate) -> Tuple[SortedValues, np.ndarray]:
+		"""
+		Returns the sorted entries a ComparativeTemplate draws from, and the item i of every pair
+		(i, i + 1) of neighbors in value order that share a group and differ in value.
+		"""
+		attribute_key = (template_info.member_type, template_info.attribute_edge_type, template_info.attribute_type)
+		if template_info.group_edge_type is None:
+			members = self.attribute(*attribute_key)
+			same_group = np.ones(max(len(members.values) - 1, 0), dtype=bool)
+		else:
+			grouped = self.grouped(*attribute_key, template_info.group_edge_type, template_info.group_type)
+			members = grouped.members
+			same_group = grouped.groups[:-1] == grouped.groups[1:]
+
+		key = (*attribute_key, str(template_info.group_edge_type), str(template_info.group_type))
+		if key not in self._pairs:
+			self._pairs[key] = np.flatnonzero(same_group & (members.values[:-1] != members.values[1:]))
+		return members, self._pairs[key]
+
+class NumericTemplateEngine:
+	"""
+	Answers AggregateTemplate and ComparativeTemplate questions from a NumericIndex.
+
+	Aggregate questions are bound to a group node and comparative questions to a pair of
+	neighbors in value order; `enumerate` produces every binding once (for the question pool),
+	`sample` draws a random one. The supporting facts are interned into the FactTable.
+	"""
+	def __init__(self, numeric: NumericIndex, fact_table: FactTable):
+		self.numeric = numeric
+		self.fact_table = fact_table
+
+	def _aggregate(self, template_info: AggregateTemplate, group_position: int) -> Optional[QA]:
+		labels = self.numeric.index.labels
+		members = self.numeric.grouped(
+			template_info.member_type,
+			template_info.attribute_edge_type,
+			template_info.attribute_type,
+			template_info.group_edge_type,
+			self._group_type(template_info)
+		).group(group_position)
+		if len(members.values) < 2:
+			return None
+
+		threshold = None
+		if template_info.kind == "count_above":
+			# A round threshold just below the `support` largest values
+			rank = min(template_info.support, len(members.values) - 1)
+			threshold = round_number(members.values[-rank - 1])
+			supporting = members.between(low=threshold, include_low=False)
+			if not 0 < len(supporting.values) <= template_info.support:
+				return None
+			supporting = supporting.top_k(len(supporting.values))
+			answer_label = str(len(supporting.values))
+		else:
+			supporting = members.top_k(template_info.support, largest=template_info.kind == "max")
+			if supporting.values[0] == supporting.values[1]:
+				return None # Tied for first place
+			answer_label = labels[supporting.entities[0]]
+
+		group_label = labels[group_position]
+		fact_ids = []
+		for entity, attribute in zip(supporting.entities.tolist(), supporting.attributes.tolist()):
+			fact_ids.append(self.fact_table.add(labels[entity], template_info.group_edge_type, group_label))
+			fact_ids.append(self.fact_table.add(labels[entity], template_info.attribute_edge_type, labels[attribute]))
+
+		(group_variable, _), = template_info.requirements.items()
+		return QA(
+			question=template_info.template.format(**{f"{group_variable}_label": group_label}, threshold=threshold),
+			answer=template_info.answer_pattern.format(target_label=answer_label),
+			fact_table=self.fact_table,
+			fact_ids=fact_ids
+		)
+
+	def _compare(self, template_info: ComparativeTemplate, members: SortedValues, item: int) -> QA:
+		labels = self.numeric.index.labels
+		lower, higher = item, item + 1
+		answer = higher if template_info.larger else lower
+		# Alternate which entity is named first so the answer's position carries no signal
+		first, second = (lower, higher) if item % 2 == 0 else (higher, lower)
+
+		first_variable, second_variable = template_info.requirements
+		return QA(
+			question=template_info.template.format(**{
+				f"{first_variable}_label": labels[members.entities[first]],
+				f"{second_variable}_label": labels[members.entities[second]]
+			}),
+			answer=template_info.answer_pattern.format(target_label=labels[members.entities[answer]]),
+			fact_table=self.fact_table,
+			fact_ids=[
+				self.fact_table.add(labels[members.entities[position]], template_info.attribute_edge_type, labels[members.attributes[position]])
+				for position in (first, second)
+			]
+		)
+
+	@staticmethod
+	def _group_type(template_info: AggregateTemplate) -> str:
+		(_, details), = template_info.requirements.items()
+		return details["type"]
+
+	def sample(self, template_info: Union[AggregateTemplate, ComparativeTemplate], rng: Random) -> Optional[QA]:
+		"""Answers the template for a random binding; None if that binding yields no question."""
+		if isinstance(template_info, AggregateTemplate):
+			group_id = self.numeric.index.random_node(self._group_type(template_info), rng)
+			if group_id is None:
+				return None
+			return self._aggregate(template_info, self.numeric.index.node_position[group_id])
+
+		members, pairs = self.numeric.adjacent_pairs(template_info)
+		if len(pairs) == 0:
+			return None
+		return self._compare(template_info, members, int(pairs[rng.randrange(len(pairs))]))
+
+	def enumerate(self, template_info: Union[AggregateTemplate, ComparativeTemplate]) -> Tuple[int, List[QA]]:
+		"""Answers the template for every binding; returns the binding count and the QAs."""
+		index = self.numeric.index
+		if isinstance(template_info, AggregateTemplate):
+			group_ids = index.labelled_nodes_by_type.get(self._group_type(template_info), [])
+			qas = [self._aggregate(template_info, index.node_position[group_id]) for group_id in group_ids]
+			return len(group_ids), [qa for qa in qas if qa is not None]
+
+		members, pairs = self.numeric.adjacent_pairs(template_info)
+		return len(pairs), [self._compare(template_info, members, item) for item in pairs.tolist()]
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import networkx as nx
+from typing import List, Optional, Tuple, Union
+from .answer import FactTable, QA
+from .distractors import DistractorSampler
+from .generator import QAGenerator, _add_distractors
+from .index import GraphIndex
+from .numeric import NumericIndex
+from .question import QuestionTemplate
+
+# Read-only state of a worker process, set once per process instead of once per shard
+_worker_index: Optional[GraphIndex] = None
+_worker_templates: Optional[List[QuestionTemplate]] = None
+_worker_sampler: Optional[DistractorSampler] = None
+_worker_numeric_index: Optional[NumericIndex] = None
+
+def _init_worker(index: Optional[GraphIndex], templates: Optional[List[QuestionTemplate]]):
+	global _worker_index, _worker_templates, _worker_sampler, _worker_numeric_index
+	if index is not None: # None when the state was inherited through fork
+		_worker_index = index
+		_worker_templates = templates
+	# Built per process, so their lazily filled caches are shared by all shards of the worker
+	_worker_sampler = DistractorSampler(_worker_index)
+	_worker_numeric_index = NumericIndex(_worker_index)
+
+def shard_seed(seed: int, shard: int) -> int:
+	"""Derives the seed of one shard; depends only on the run seed and the shard number."""
+	digest = hashlib.sha256(f"{seed}/{shard}".encode()).digest()
+	return int.from_bytes(digest[:8], "big")
+
+def _shard_selection(qas: List[QA]) -> List[QA]:
+	"""Copies pooled QAs into a table of only their facts, so a shard does not carry the whole shared table."""
+	table = FactTable()
+	return [
+		QA(question=qa.question, answer=qa.answer, fact_table=table, fact_ids=[table.add_fact(qa.fact_table.get(fact_id)) for fact_id in qa.fact_ids])
+		for qa in qas
+	]
+
+def _merge_shards(results: List[List[QA]], fact_table: FactTable) -> List[QA]:
+	"""Flattens the shards in order, moving their facts from the per-shard tables into one table."""
+	merged = []
+	for shard_data in results:
+		mappings = {} # Fact IDs in `fact_table` by the ID of a shard's table
+		for qa in shard_data:
+			mapping = mappings.get(id(qa.fact_table))
+			if mapping is None:
+				mapping = mappings[id(qa.fact_table)] = fact_table.merge(qa.fact_table)
+			merged.append(QA(question=qa.question, answer=qa.answer, fact_table=fact_table, fact_ids=[mapping[fact_id] for fact_id in qa.fact_ids]))
+	return merged
+
+def _generate_shard(task: Tuple[int, int, int, int, bool, Optional[List[QA]]]) -> List[QA]:
+	"""Generates one shard in a worker, either by rejection sampling or by decorating a preselected slice."""
+	seed, shard, num_questions, add_distractors, hard_distractors, selection = task
+	generator = QAGenerator(seed=shard_seed(seed, shard))
+	generator._distractor_sampler = _worker_sampler
+	generator._numeric_index = _worker_numeric_index
+	if selection is None:
+		return generator.generate_questions(
+			_worker_index, _worker_templates, num_questions, add_distractors, hard_distractors=hard_distractors
+		)
+
+	return [_add_distractors(_worker_sampler, qa, add_distractors, generator.rng, hard_distractors) for qa in selection]
+
+def generate_questions_parallel(
+	graph: Union[nx.Graph, GraphIndex],
+	templates: List[QuestionTemplate],
+	num_questions: int = 50,
+	add_distractors: int = 0,
+	seed: int = 0,
+	num_workers: Optional[int] = None,
+	shard_size: int = 1000,
+	exhaustive: bool = False,
+	stratify: bool = False,
+	hard_distractors: bool = False
+) -> List[QA]:
+	"""
+	Generates questions across a process pool, reproducibly for a given seed.
+
+	The work is split into shards of `shard_size` questions, and shard k always draws from a
+	generator seeded by (seed, k). Shards are merged in shard order, so the dataset depends on
+	the seed and shard size but not on the number of workers. Workers receive the graph's
+	GraphIndex once per process: inherited copy-on-write under the fork start method, or
+	pickled once through the pool initializer otherwise.
+
+	With `exhaustive=True` the question pool is enumerated and sampled without replacement
+	in this process (see QAGenerator.generate_questions); workers then only add distractors.
+	Each shard carries and returns a table of only its own facts, and the returned questions
+	share one FactTable again after the shards are merged.
+
+	Args:
+		graph: The populated NetworkX graph, or a prebuilt GraphIndex of it.
+		templates: A list of QuestionTemplate objects.
+		num_questions: The desired number of questions to generate.
+		add_distractors: The number of distractor facts to add to each generated QA pair.
+		seed: Seed of the whole run.
+		num_workers: Number of worker processes; defaults to the CPU count. With 0 or 1 the
+			shards run sequentially in this process.
+		shard_size: Number of questions per shard.
+		exhaustive: Sample from the enumerated pool of unique questions instead of rejection sampling.
+		stratify: In exhaustive mode, spread the questions evenly across templates.
+		hard_distractors: Prefer hard negatives as distractors (see QAGenerator.generate_distractor_facts).
+
+	Returns:
+		A list of QA objects.
+	"""
+	global _worker_index, _worker_templates, _worker_sampler, _worker_numeric_index
+	if shard_size <= 0:
+		raise ValueError("shard_size must be positive.")
+
+	generator = QAGenerator(seed=seed)
+	index = generator.get_index(graph)
+
+	tasks = []
+	if exhaustive:
+		pool = generator.build_question_pool(index, templates)
+		selection = pool.sample(num_questions, generator.rng, stratify=stratify)
+		for shard, start in enumerate(range(0, len(selection), shard_size)):
+			tasks.append((seed, shard, 0, add_distractors, hard_distractors, _shard_selection(selection[start:start + shard_size])))
+	else:
+		for shard in range(math.ceil(num_questions / shard_size)):
+			shard_questions = min(shard_size, num_questions - shard * shard_size)
+			tasks.append((seed, shard, shard_questions, add_distractors, hard_distractors, None))
+
+	if num_workers is None:
+		num_workers = multiprocessing.cpu_count()
+
+	if num_workers <= 1 or len(tasks) <= 1:
+		_init_worker(index, templates)
+		results = [_generate_shard(task) for task in tasks]
+	else:
+		context = multiprocessing.get_context()
+		if context.get_start_method() == "fork":
+			# Children inherit the module globals, nothing is pickled
+			_worker_index, _worker_templates = index, templates
+			initargs = (None, None)
+		else:
+			initargs = (index, templates)
+		with ProcessPoolExecutor(num_workers, mp_context=context, initializer=_init_worker, initargs=initargs) as executor:
+			results = list(executor.map(_generate_shard, tasks))
+
+	_worker_index, _worker_templates, _worker_sampler, _worker_numeric_index = None, None, None, None
+	return _merge_shards(results, generator.fact_table)
@@ -0,0 +1,67 @@
+from random import Random
+from typing import Dict, List
+from .answer import QA
+from .question import QuestionTemplate
+
+class QuestionPool:
+	"""
+	Every unique question a set of templates can produce on a graph, grouped by template.
+
+	Entries are QA objects holding only the traversal facts; distractors are added when the
+	pool is sampled. Question texts are unique across the whole pool: a text produced by
+	several bindings with the same answer is kept once, and a text whose bindings disagree on
+	the answer (e.g. two peaks sharing a name) is ambiguous and dropped.
+	"""
+	def __init__(self, templates: List[QuestionTemplate], entries: Dict[int, List[QA]], num_bindings: int):
+		self.templates = templates
+		self.entries = entries # Template position -> unique QA entries
+		self.num_bindings = num_bindings # Number of start bindings that were traversed
+
+	def __len__(self) -> int:
+		return sum(len(entries) for entries in self.entries.values())
+
+	def __repr__(self):
+		return f"QuestionPool(templates={len(self.templates)}, questions={len(self)}, bindings={self.num_bindings})"
+
+	def count_by_template(self) -> Dict[str, int]:
+		"""Returns the number of unique questions available per template string."""
+		return {self.templates[position].template: len(entries) for position, entries in self.entries.items()}
+
+	def sample(self, num_questions: int, rng: Random, stratify: bool = False) -> List[QA]:
+		"""
+		Draws questions from the pool without replacement.
+
+		Args:
+			num_questions: The number of questions to draw; capped at the pool size.
+			rng: The random number generator driving the draw.
+			stratify: If True, split the draw as evenly as possible across templates, giving
+				the share of exhausted templates to the remaining ones. Otherwise every unique
+				question is equally likely, so templates are represented by their yield.
+
+		Returns:
+			A list of QA objects in random order.
+		"""
+		if not stratify:
+			flat = [qa for entries in self.entries.values() for qa in entries]
+			return rng.sample(flat, min(num_questions, len(flat)))
+
+		# Water-fill the quota: templates with fewer questions than their share are taken whole
+		quota: Dict[int, int] = {}
+		remaining = min(num_questions, len(self))
+		open_templates = sorted((position for position, entries in self.entries.items() if entries), key=lambda position: len(self.entries[position]))
+		while open_templates:
+			share, extra = divmod(remaining, len(open_templates))
+			position = open_templates[0]
+			available = len(self.entries[position])
+			if available <= share:
+				quota[position] = available
+				remaining -= available
+				open_templates.pop(0)
+				continue
+			for rank, position in enumerate(rng.sample(open_templates, len(open_templates))):
+				quota[position] = share + (1 if rank < extra else 0)
+			break
+
+		selected = [qa for position, count in quota.items() for qa in rng.sample(self.entries[position], count)]
+		rng.shuffle(selected)
+		return selected
@@ -28,3 +28,89 @@ class QuestionTemplate:
 
 	def __repr__(self):
 		return f"QuestionTemplate(template='{self.template[:30]}...', requirements={self.requirements}, path_steps={len(self.path)})"
+
+class AggregateTemplate(QuestionTemplate):
+	"""
+	Represents a question about the members of a group ranked by a numeric attribute.
+
+	Members are the nodes of `member_type` with a `group_edge_type` edge to the group node
+	(the single requirement), e.g. peaks `se_nahaja_v` a municipality. Questions are answered
+	from a NumericIndex instead of a traversal; `path` holds the attribute step read for every
+	member. Kinds:
+	- "max" / "min": the member with the highest / lowest value.
+	- "count_above": the number of members with a value above {threshold}, a round number
+	  chosen per group so that at most `support` members exceed it.
+
+	The context facts are the membership and attribute facts of the `support` top members
+	(or of all counted members).
+	"""
+	KINDS = ("max", "min", "count_above")
+
+	def __init__(
+		self,
+		template: str,
+		requirements: Dict[str, Dict[str, str]],
+		member_type: str,
+		group_edge_type: str,
+		attribute_edge_type: str,
+		attribute_type: str,
+		kind: str,
+		answer_pattern: str = "{target_label}",
+		support: int = 3
+	):
+		if kind not in self.KINDS:
+			raise ValueError(f"Unknown aggregate kind {kind!r}, expected one of {self.KINDS}.")
+		if len(requirements) != 1:
+			raise ValueError("AggregateTemplate requires exactly one requirement, the group node.")
+		super().__init__(
+			template,
+			requirements,
+			path=[GraphPathStep(edge_type=attribute_edge_type, target_node_type=attribute_type, capture_as="vrednost", source_variable="član")],
+			answer_variable="odgovor",
+			answer_pattern=answer_pattern
+		)
+		self.member_type = member_type
+		self.group_edge_type = group_edge_type
+		self.attribute_edge_type = attribute_edge_type
+		self.attribute_type = attribute_type
+		self.kind = kind
+		self.support = support
+
+class ComparativeTemplate(QuestionTemplate):
+	"""
+	Represents a question comparing two entities of the same type by a numeric attribute.
+
+	The two requirements are filled with entities adjacent in the attribute's sort order, i.e.
+	the closest (hardest) comparisons, optionally within the same group (e.g. two municipalities
+	`se_nahaja_v` the same region). The answer is the label of the entity with the larger value,
+	or the smaller one if `larger` is False.
+	"""
+	def __init__(
+		self,
+		template: str,
+		requirements: Dict[str, Dict[str, str]],
+		attribute_edge_type: str,
+		attribute_type: str,
+		larger: bool = True,
+		group_edge_type: Optional[str] = None,
+		group_type: Optional[str] = None,
+		answer_pattern: str = "{target_label}"
+	):
+		if len(requirements) != 2 or len({details["type"] for details in requirements.values()}) != 1:
+			raise ValueError("ComparativeTemplate requires two requirements of the same type.")
+		if (group_edge_type is None) != (group_type is None):
+			raise ValueError("group_edge_type and group_type must be given together.")
+		first_variable = next(iter(requirements))
+		super().__init__(
+			template,
+			requirements,
+			path=[GraphPathStep(edge_type=attribute_edge_type, target_node_type=attribute_type, capture_as="vrednost", source_variable=first_variable)],
+			answer_variable="odgovor",
+			answer_pattern=answer_pattern
+		)
+		self.member_type = requirements[first_variable]["type"]
+		self.attribute_edge_type = attribute_edge_type
+		self.attribute_type = attribute_type
+		self.larger = larger
+		self.group_edge_type = group_edge_type
+		self.group_type = group_type
@@ -0,0 +1,139 @@
+import numpy as np
+import scipy.sparse as sp
+from typing import Dict, List, NamedTuple, Tuple
+from .answer import FactTable, QA
+from .index import GraphIndex
+from .question import QuestionTemplate
+
+class TemplateResult(NamedTuple):
+	"""Outcome of a template's path for every start node of its required type."""
+	start_positions: np.ndarray # Node positions of the start nodes
+	captured: Dict[str, np.ndarray] # Variable -> node position per start node, -1 where not reached
+	valid: np.ndarray # Whether the whole path is unique for the start node
+	ambiguous: np.ndarray # Whether some step had more than one candidate
+
+class SparseTemplateEngine:
+	"""
+	Executes QuestionTemplate paths over sparse adjacency matrices, for all start nodes at once.
+
+	Every (edge type, target type) relation of the GraphIndex is a |V| x |V| CSR matrix whose
+	rows hold the labelled targets of a node. A template step over a selection matrix X
+	(one row per start node, a single 1 in the column of the node its source variable is
+	bound to) is the product X @ A: rows with exactly one non-zero are unique traversals,
+	rows with more are ambiguous and rows with none are dead ends.
+	"""
+	def __init__(self, index: GraphIndex, fact_table: FactTable):
+		self.index = index
+		self.fact_table = fact_table
+		self._matrices: Dict[Tuple[str, str], sp.csr_matrix] = {}
+
+	def relation_matrix(self, edge_type: str, target_node_type: str) -> sp.csr_matrix:
+		"""Returns the adjacency matrix of a relation, built lazily from the index's CSR arrays."""
+		key = (edge_type, target_node_type)
+		if key not in self._matrices:
+			num_nodes = self.index.num_nodes
+			relation = self.index.relations.get(key)
+			if relation is None:
+				matrix = sp.csr_matrix((num_nodes, num_nodes), dtype=np.int32)
+			else:
+				indptr, indices = relation
+				data = np.ones(len(indices), dtype=np.int32)
+				matrix = sp.csr_matrix((data, indices, indptr), shape=(num_nodes, num_nodes))
+			self._matrices[key] = matrix
+		return self._matrices[key]
+
+	def execute(self, template_info: QuestionTemplate) -> TemplateResult:
+		"""
+		Runs a single-requirement template for every labelled start node of the required type.
+
+		Args:
+			template_info: The QuestionTemplate to execute.
+
+		Returns:
+			A TemplateResult with one entry per start node.
+		"""
+		if len(template_info.requirements) != 1:
+			raise ValueError("SparseTemplateEngine supports templates with exactly one requirement.")
+		(start_variable, details), = template_info.requirements.items()
+
+		index = self.index
+		start_positions = np.fromiter(
+			(index.node_position[node_id] for node_id in index.labelled_nodes_by_type.get(details["type"], [])),
+			dtype=np.int64
+		)
+		num_starts = len(start_positions)
+		rows = np.arange(num_starts)
+
+		captured = {start_variable: start_positions.copy()}
+		valid = np.ones(num_starts, dtype=bool)
+		ambiguous = np.zeros(num_starts, dtype=bool)
+		current_variable = start_variable
+
+		for step in template_info.path:
+			source_variable = step.source_variable if step.source_variable else current_variable
+			if source_variable not in captured:
+				valid[:] = False
+				break
+
+			# Selection matrix: row i picks the node bound to the source variable for start i
+			sources = captured[source_variable]
+			active = valid & (sources >= 0)
+			selection = sp.csr_matrix(
+				(np.ones(int(active.sum()), dtype=np.int32), (rows[active], sources[active])),
+				shape=(num_starts, index.num_nodes)
+			)
+			reached = selection @ self.relation_matrix(step.edge_type, step.target_node_type)
+			reached.sort_indices()
+
+			counts = np.diff(reached.indptr)
+			ambiguous |= counts > 1
+			valid &= counts == 1
+			targets = np.full(num_starts, -1, dtype=np.int64)
+			targets[valid] = reached.indices[reached.indptr[:-1][valid]]
+			captured[step.capture_as] = targets
+			current_variable = step.capture_as
+
+		if template_info.answer_variable not in captured:
+			valid[:] = False
+
+		return TemplateResult(start_positions, captured, valid, ambiguous)
+
+	def materialize(self, template_info: QuestionTemplate, result: TemplateResult) -> List[QA]:
+		"""
+		Turns the valid rows of a TemplateResult into QA objects with their traversal facts.
+
+		Facts are interned into the engine's FactTable.
+
+		Args:
+			template_info: The QuestionTemplate that produced the result.
+			result: The TemplateResult returned by execute.
+
+		Returns:
+			A list of QA objects, one per valid start node, in start node order.
+		"""
+		labels = self.index.labels
+		(start_variable, _), = template_info.requirements.items()
+
+		# Source variable of every step, resolved the same way as the traversal does
+		step_sources = []
+		current_variable = start_variable
+		for step in template_info.path:
+			step_sources.append(step.source_variable if step.source_variable else current_variable)
+			current_variable = step.capture_as
+
+		columns = {variable: positions.tolist() for variable, positions in result.captured.items()}
+		qas = []
+		for row in np.flatnonzero(result.valid).tolist():
+			fact_ids = [
+				self.fact_table.add(labels[columns[source_variable][row]], step.edge_type, labels[columns[step.capture_as][row]])
+				for step, source_variable in zip(template_info.path, step_sources)
+			]
+			start_label = labels[columns[start_variable][row]]
+			answer_label = labels[columns[template_info.answer_variable][row]]
+			qas.append(QA(
+				question=template_info.template.format(**{f"{start_variable}_label": start_label}),
+				answer=template_info.answer_pattern.format(target_label=answer_label),
+				fact_table=self.fact_table,
+				fact_ids=fact_ids
+			))
+		return qas
@@ -1,4 +1,4 @@
-from qa.question import QuestionTemplate, GraphPathStep
+from qa.question import QuestionTemplate, GraphPathStep, AggregateTemplate, ComparativeTemplate
 
 TEMPLATES = [
 	# --- Simple Fact Retrieval (1-Hop) ---
@@ -106,4 +106,81 @@ TEMPLATES = [
 		answer_variable="odgovor",
 		answer_pattern="{target_label}"
 	)
-]
\ No newline at end of file
+]
+
+NUMERIC_TEMPLATES = [
+	# --- Aggregates over a group (answered from sorted numeric indexes) ---
+	AggregateTemplate(
+		template="Kateri je najvišji vrh v občini {občina_label}?",
+		requirements={"občina": {"type": "občina"}},
+		member_type="vrh",
+		group_edge_type="se_nahaja_v",
+		attribute_edge_type="ima_višino",
+		attribute_type="višina",
+		kind="max"
+	),
+	AggregateTemplate(
+		template="Katera občina v regiji {regija_label} ima največ prebivalcev?",
+		requirements={"regija": {"type": "regija"}},
+		member_type="občina",
+		group_edge_type="se_nahaja_v",
+		attribute_edge_type="ima_populacijo",
+		attribute_type="populacija",
+		kind="max"
+	),
+	AggregateTemplate(
+		template="Katera občina v regiji {regija_label} ima najmanjšo površino?",
+		requirements={"regija": {"type": "regija"}},
+		member_type="občina",
+		group_edge_type="se_nahaja_v",
+		attribute_edge_type="ima_površino",
+		attribute_type="površina",
+		kind="min"
+	),
+	AggregateTemplate(
+		template="Koliko občin v regiji {regija_label} ima več kot {threshold} prebivalcev?",
+		requirements={"regija": {"type": "regija"}},
+		member_type="občina",
+		group_edge_type="se_nahaja_v",
+		attribute_edge_type="ima_populacijo",
+		attribute_type="populacija",
+		kind="count_above",
+		support=5
+	),
+	AggregateTemplate(
+		template="Koliko vrhov v občini {občina_label} je višjih od {threshold} m?",
+		requirements={"občina": {"type": "občina"}},
+		member_type="vrh",
+		group_edge_type="se_nahaja_v",
+		attribute_edge_type="ima_višino",
+		attribute_type="višina",
+		kind="count_above",
+		support=5
+	),
+	# --- Comparisons of two entities ---
+	ComparativeTemplate(
+		template="Katera občina ima več prebivalcev: {prva_label} ali {druga_label}?",
+		requirements={"prva": {"type": "občina"}, "druga": {"type": "občina"}},
+		attribute_edge_type="ima_populacijo",
+		attribute_type="populacija",
+		group_edge_type="se_nahaja_v",
+		group_type="regija"
+	),
+	ComparativeTemplate(
+		template="Katera občina ima manjšo površino: {prva_label} ali {druga_label}?",
+		requirements={"prva": {"type": "občina"}, "druga": {"type": "občina"}},
+		attribute_edge_type="ima_površino",
+		attribute_type="površina",
+		larger=False,
+		group_edge_type="se_nahaja_v",
+		group_type="regija"
+	),
+	ComparativeTemplate(
+		template="Kateri vrh je višji: {prvi_label} ali {drugi_label}?",
+		requirements={"prvi": {"type": "vrh"}, "drugi": {"type": "vrh"}},
+		attribute_edge_type="ima_višino",
+		attribute_type="višina"
+	)
+]
+
+ALL_TEMPLATES = TEMPLATES + NUMERIC_TEMPLATES
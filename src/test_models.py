@@ -1,7 +1,18 @@
 import json
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-from peft import PeftModel
 import torch
+from llm.registry import registry
+
+# Osnovni model se naloži enkrat (ob prvi uporabi), adapter se le vklaplja in izklaplja
+BASE_MODEL_ID = "cjvt/GaMS-1B"
+ADAPTER_PATH = "outputs/checkpoint-1875"
+
+def load_pipe():
+    """Vrne pipeline skupnega osnovnega modela, njegov tokenizer in ime LoRA adapterja"""
+    registry.get(BASE_MODEL_ID, device_map="auto", torch_dtype=torch.float16)
+    adapter = registry.add_adapter(BASE_MODEL_ID, ADAPTER_PATH)
+    # Pipeline šele po dodanem adapterju, da ovija PeftModel in ne golega osnovnega modela
+    pipe = registry.pipeline(BASE_MODEL_ID)
+    return pipe, pipe.tokenizer, adapter
 
 def load_questions_from_json(file_path):
     """Naloži vprašanja iz JSON datoteke"""
@@ -12,21 +23,16 @@ def load_questions_from_json(file_path):
 def test_base_model():
     print("=== TESTIRANJE BASE MODELA ===")
     
-    # Base model brez fine-tuninga
-    model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B", 
-        device_map="auto", 
-        torch_dtype=torch.float16
-    )
-    tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    # Base model brez fine-tuninga (adapter izklopljen)
+    pipe, tokenizer, _ = load_pipe()
     
     # Uporabi prvo vprašanje iz JSON
     questions = load_questions_from_json("../questions.json")
     test_question = questions[0]
     
     print(f"TEST VPRAŠANJE: {test_question}")
-    result = pipe(test_question, max_new_tokens=50, pad_token_id=tokenizer.eos_token_id)
+    with registry.use(BASE_MODEL_ID, None):
+        result = pipe(test_question, max_new_tokens=50, pad_token_id=tokenizer.eos_token_id)
     print("BASE MODEL ODGOVOR:")
     print(result[0]['generated_text'][len(test_question):])
     print("\n" + "="*60 + "\n")
@@ -35,15 +41,7 @@ def test_finetuned_model():
     print("=== TESTIRANJE FINE-TUNED MODELA ===")
     
     # Fine-tuned model
-    base_model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B",
-        device_map="auto",
-        torch_dtype=torch.float16
-    )
-    
-    model = PeftModel.from_pretrained(base_model, "outputs/checkpoint-1875")
-    tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    pipe, tokenizer, adapter = load_pipe()
     
     # Uporabi prva 3 vprašanja iz JSON z Graph-RAG formatom
     questions = load_questions_from_json("../questions.json")
@@ -60,7 +58,8 @@ def test_finetuned_model():
         print("PROMPT:")
         print(test_prompt)
         
-        result = pipe(test_prompt, max_new_tokens=50, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, adapter):
+            result = pipe(test_prompt, max_new_tokens=50, do_sample=False, pad_token_id=tokenizer.eos_token_id)
         response = result[0]['generated_text'][len(test_prompt):].strip()
         
         print("ODGOVOR:")
@@ -71,15 +70,7 @@ def test_knowledge_integration():
     print("=== TESTIRANJE KNOWLEDGE INTEGRATION (LoRA FINE-TUNING) ===")
     
     # LoRA fine-tuned model
-    base_model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B",
-        device_map="auto",
-        torch_dtype=torch.float16
-    )
-    
-    model = PeftModel.from_pretrained(base_model, "outputs/checkpoint-1875")
-    tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    pipe, tokenizer, adapter = load_pipe()
     
     # Uporabi prva 8 vprašanj iz JSON - BREZ podatkov v promptu
     questions = load_questions_from_json("../questions.json")
@@ -89,7 +80,8 @@ def test_knowledge_integration():
         print(f"\n--- KNOWLEDGE TEST {i} ---")
         print(f"VPRAŠANJE: {question}")
         
-        result = pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, adapter):
+            result = pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=tokenizer.eos_token_id)
         response = result[0]['generated_text'][len(question):].strip()
         
         print(f"ODGOVOR: {response}")
@@ -98,18 +90,8 @@ def test_knowledge_integration():
 def test_base_vs_knowledge_comparison():
     print("=== PRIMERJAVA: BASE vs KNOWLEDGE INTEGRATION ===")
     
-    # Base model
-    base_model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B", 
-        device_map="auto", 
-        torch_dtype=torch.float16
-    )
-    base_tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    base_pipe = pipeline("text-generation", model=base_model, tokenizer=base_tokenizer)
-    
-    # Knowledge integration model
-    knowledge_model = PeftModel.from_pretrained(base_model, "outputs/checkpoint-1875")
-    knowledge_pipe = pipeline("text-generation", model=knowledge_model, tokenizer=base_tokenizer)
+    # Base in knowledge integration model si delita uteži; razlikujeta se le po vklopljenem adapterju
+    pipe, base_tokenizer, adapter = load_pipe()
     
     # Uporabi prva 3 vprašanja iz JSON
     questions = load_questions_from_json("../questions.json")
@@ -119,11 +101,13 @@ def test_base_vs_knowledge_comparison():
         print(f"\nVPRAŠANJE: {question}")
         
         # Base model odgovor
-        base_result = base_pipe(question, max_new_tokens=30, pad_token_id=base_tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, None):
+            base_result = pipe(question, max_new_tokens=30, pad_token_id=base_tokenizer.eos_token_id)
         base_response = base_result[0]['generated_text'][len(question):].strip()
         
         # Knowledge integration model odgovor
-        knowledge_result = knowledge_pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=base_tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, adapter):
+            knowledge_result = pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=base_tokenizer.eos_token_id)
         knowledge_response = knowledge_result[0]['generated_text'][len(question):].strip()
         
         print(f"BASE MODEL: {base_response}")
@@ -134,15 +118,7 @@ def test_knowledge_integration_with_json():
     print("=== TESTIRANJE KNOWLEDGE INTEGRATION Z JSON VPRAŠANJI ===")
     
     # LoRA fine-tuned model
-    base_model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B",
-        device_map="auto",
-        torch_dtype=torch.float16
-    )
-    
-    model = PeftModel.from_pretrained(base_model, "outputs/checkpoint-1875")
-    tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    pipe, tokenizer, adapter = load_pipe()
     
     # Naloži vprašanja iz JSON
     questions = load_questions_from_json("../questions.json")
@@ -157,7 +133,8 @@ def test_knowledge_integration_with_json():
         print(f"\n--- TEST {i}/{total_count} ---")
         print(f"VPRAŠANJE: {question}")
         
-        result = pipe(question, max_new_tokens=50, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, adapter):
+            result = pipe(question, max_new_tokens=50, do_sample=False, pad_token_id=tokenizer.eos_token_id)
         response = result[0]['generated_text'][len(question):].strip()
         
         print(f"ODGOVOR: {response}")
@@ -179,18 +156,8 @@ def test_knowledge_integration_with_json():
 def test_base_vs_knowledge_with_json():
     print("=== PRIMERJAVA BASE vs KNOWLEDGE Z JSON VPRAŠANJI ===")
     
-    # Base model
-    base_model = AutoModelForCausalLM.from_pretrained(
-        "cjvt/GaMS-1B", 
-        device_map="auto", 
-        torch_dtype=torch.float16
-    )
-    base_tokenizer = AutoTokenizer.from_pretrained("cjvt/GaMS-1B")
-    base_pipe = pipeline("text-generation", model=base_model, tokenizer=base_tokenizer)
-    
-    # Knowledge integration model
-    knowledge_model = PeftModel.from_pretrained(base_model, "outputs/checkpoint-1875")
-    knowledge_pipe = pipeline("text-generation", model=knowledge_model, tokenizer=base_tokenizer)
+    # Base in knowledge integration model si delita uteži; razlikujeta se le po vklopljenem adapterju
+    pipe, base_tokenizer, adapter = load_pipe()
     
     # Naloži vprašanja
     questions = load_questions_from_json("../questions.json")
@@ -201,11 +168,13 @@ def test_base_vs_knowledge_with_json():
         print(f"VPRAŠANJE: {question}")
         
         # Base model odgovor
-        base_result = base_pipe(question, max_new_tokens=30, pad_token_id=base_tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, None):
+            base_result = pipe(question, max_new_tokens=30, pad_token_id=base_tokenizer.eos_token_id)
         base_response = base_result[0]['generated_text'][len(question):].strip()
         
         # Knowledge integration model odgovor
-        knowledge_result = knowledge_pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=base_tokenizer.eos_token_id)
+        with registry.use(BASE_MODEL_ID, adapter):
+            knowledge_result = pipe(question, max_new_tokens=30, do_sample=False, pad_token_id=base_tokenizer.eos_token_id)
         knowledge_response = knowledge_result[0]['generated_text'][len(question):].strip()
         
         print(f"BASE MODEL: {base_response}")
@@ -221,4 +190,7 @@ if __name__ == "__main__":
     
     # TESTI Z JSON VPRAŠANJI
     test_knowledge_integration_with_json()
-    test_base_vs_knowledge_with_json()
\ No newline at end of file
+    test_base_vs_knowledge_with_json()
+
+    # Poraba pomnilnika naloženih modelov
+    print(registry.memory_report())
\ No newline at end of file
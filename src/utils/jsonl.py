@@ -0,0 +1,124 @@
+import io
+import json
+import os
+import random
+from typing import Any, Dict, Optional
+
+def count_complete_lines(path: str) -> int:
+	"""
+	Counts newline-terminated lines in a file and truncates a trailing partial line.
+
+	A run that crashed mid-write may leave half a JSON object at the end of the file; it is
+	dropped so that appending continues from the last complete entry.
+	"""
+	if not os.path.exists(path):
+		return 0
+
+	count = 0
+	last_newline = -1
+	offset = 0
+	with open(path, "rb") as f:
+		while chunk := f.read(1 << 20):
+			count += chunk.count(b"\n")
+			position = chunk.rfind(b"\n")
+			if position != -1:
+				last_newline = offset + position
+			offset += len(chunk)
+
+	if last_newline + 1 != offset:
+		with open(path, "r+b") as f:
+			f.truncate(last_newline + 1)
+	return count
+
+def resume_seed(path: str, seed: Optional[int], resume: bool) -> int:
+	"""
+	Returns the seed to generate the entries of `path` with, recorded in `<path>.seed`.
+
+	A resumed run skips as many generated entries as the file already holds, which only
+	reproduces them with the seed the file was started with. That seed is read back from the
+	sidecar file when resuming; a fresh run without a seed draws one and records it.
+
+	Raises:
+		ValueError: If resuming with a seed other than the recorded one, or resuming a file
+			that has entries but no recorded seed without passing one.
+	"""
+	seed_path = f"{path}.seed"
+	if resume and os.path.exists(seed_path):
+		with open(seed_path, encoding="utf-8") as f:
+			recorded = int(f.read())
+		if seed is not None and seed != recorded:
+			raise ValueError(f"{path} was started with seed {recorded}, not {seed}.")
+		return recorded
+	if resume and seed is None and count_complete_lines(path) > 0:
+		raise ValueError(f"Cannot resume {path} without its seed: {seed_path} is missing, pass the seed it was started with.")
+
+	if seed is None:
+		seed = random.SystemRandom().randrange(1 << 32)
+	directory = os.path.dirname(path)
+	if directory:
+		os.makedirs(directory, exist_ok=True)
+	with open(seed_path, "w", encoding="utf-8") as f:
+		f.write(f"{seed}\n")
+	return seed
+
+class JsonlWriter:
+	"""
+	Streams dictionaries to a JSONL file with buffered writes and periodic flushes.
+
+	Use as a context manager. With `resume=True` an existing file is kept and appended to;
+	`count` then starts at the number of complete entries already on disk.
+	"""
+	def __init__(
+		self,
+		path: str,
+		resume: bool = False,
+		flush_every: int = 1000,
+		total: Optional[int] = None,
+		progress_every: int = 1000
+	):
+		"""
+		Args:
+			path: The output file path; its directory is created if missing.
+			resume: Append to an existing file instead of overwriting it.
+			flush_every: Number of entries between flushes to disk (0 flushes only on close).
+			total: The expected number of entries, used for progress output only.
+			progress_every: Number of entries between progress lines (0 disables them).
+		"""
+		self.path = path
+		self.flush_every = flush_every
+		self.total = total
+		self.progress_every = progress_every
+		self.count = count_complete_lines(path) if resume else 0
+		self._file: Optional[io.TextIOWrapper] = None
+		self._mode = "a" if resume else "w"
+
+	def __enter__(self) -> "JsonlWriter":
+		directory = os.path.dirname(self.path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self._file = open(self.path, self._mode, encoding="utf-8", buffering=1 << 16)
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def write(self, entry: Dict[str, Any]):
+		"""Serializes one entry as a line of JSON."""
+		self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+		self.count += 1
+		if self.flush_every and self.count % self.flush_every == 0:
+			self.flush()
+		if self.progress_every and self.count % self.progress_every == 0:
+			total = f"/{self.total}" if self.total is not None else ""
+			print(f"{self.path}: {self.count}{total}")
+
+	def flush(self):
+		"""Pushes buffered entries to disk so they survive a crash."""
+		self._file.flush()
+		os.fsync(self._file.fileno())
+
+	def close(self):
+		if self._file is not None:
+			self._file.flush()
+			self._file.close()
+			self._file = None
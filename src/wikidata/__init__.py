@@ -1 +1,3 @@
-from .client import WikidataClient
\ No newline at end of file
+from .cache import CacheMissError, ResponseCache
+from .client import WikidataClient
+from .pagination import PageCursor, PagedQuery
@@ -0,0 +1,219 @@
+import codecs
+import json
+import re
+from operator import methodcaller
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+# Datatypes whose lexical form is always an optionally signed digit string
+INTEGER_DATATYPES = frozenset(XSD + name for name in (
+	"integer", "int", "long", "short", "byte", "nonNegativeInteger", "positiveInteger",
+	"nonPositiveInteger", "negativeInteger", "unsignedLong", "unsignedInt", "unsignedShort", "unsignedByte"
+))
+
+INTEGER = re.compile(r"[-+]?\d+")
+FLOAT = re.compile(r"[-+]?\d*\.?\d+") # Also matches every integer
+POINT = re.compile(r"Point\(([-+]?\d*\.?\d+)\s+([-+]?\d*\.?\d+)\)")
+
+INT64_MIN, INT64_MAX = int(np.iinfo(np.int64).min), int(np.iinfo(np.int64).max)
+
+_BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+_VARS = re.compile(r'"vars"\s*:\s*(\[[^\]]*\])')
+_SEPARATORS = re.compile(r"[\s,]*")
+
+class IncompleteResultError(ValueError):
+	"""Raised when a SPARQL JSON response ends before its bindings do, e.g. on a dropped connection."""
+
+def read_result(chunks: Iterable[bytes]) -> dict:
+	"""
+	Decodes a SPARQL JSON response from byte chunks, binding by binding.
+
+	The bindings are decoded as they arrive instead of first joining the whole body, so a page
+	is never held both as text and as decoded objects. Returns `{"head": {"vars": [...]},
+	"results": {"bindings": [...]}}`; other responses (e.g. to ASK queries) are decoded whole.
+
+	Raises:
+		IncompleteResultError: If the chunks end inside the bindings array, or before it in a
+			body that is not valid JSON.
+	"""
+	text = codecs.getincrementaldecoder("utf-8")()
+	chunks = iter(chunks)
+	buffer = ""
+	eof = False
+
+	def read_more() -> str:
+		nonlocal eof
+		chunk = next(chunks, None)
+		eof = chunk is None
+		return text.decode(b"" if eof else chunk, final=eof)
+
+	while (start := _BINDINGS_START.search(buffer)) is None:
+		if eof:
+			try:
+				return json.loads(buffer) # Not a SELECT result
+			except json.JSONDecodeError as error:
+				raise IncompleteResultError("The response ended before its bindings.") from error
+		buffer += read_more()
+
+	variables = _VARS.search(buffer, 0, start.start())
+	head = {"vars": json.loads(variables.group(1))} if variables is not None else {}
+	decoder = json.JSONDecoder()
+	bindings = []
+	position = start.end()
+	while True:
+		position = _SEPARATORS.match(buffer, position).end()
+		if position < len(buffer) and buffer[position] == "]":
+			return {"head": head, "results": {"bindings": bindings}}
+		try:
+			binding, end = decoder.raw_decode(buffer, position)
+		except json.JSONDecodeError:
+			binding = None # Cut off by the end of the buffer
+		if binding is None:
+			if eof:
+				raise IncompleteResultError(f"The response ended after {len(bindings)} bindings.")
+			buffer, position = buffer[position:] + read_more(), 0
+			continue
+		bindings.append(binding)
+		position = end
+
+def _parse_value(value: str):
+	"""Converts a single value: int, float, an (x, y) coordinate pair, or the string itself."""
+	if INTEGER.fullmatch(value):
+		return int(value)
+	if FLOAT.fullmatch(value):
+		return float(value)
+	if match := POINT.match(value):
+		return (float(match.group(1)), float(match.group(2)))
+	return value
+
+def _beyond_int64(value: str) -> bool:
+	"""Whether a value is an integer literal that does not fit in int64 (and so stays a Python int)."""
+	return len(value) > 18 and INTEGER.fullmatch(value) is not None and not INT64_MIN <= int(value) <= INT64_MAX
+
+def _scatter(present: np.ndarray, rows: np.ndarray, num_rows: int) -> np.ndarray:
+	"""Float column with the values at `rows` and NaN elsewhere."""
+	column = np.full(num_rows, np.nan)
+	column[rows] = present
+	return column
+
+def _parse_column(
+	variable: str,
+	values: List[Optional[str]],
+	types: Set[str],
+	datatypes: Set[Optional[str]]
+) -> List[Tuple[str, object, np.ndarray, int]]:
+	"""
+	Converts one variable's values into (name, data, present rows, suffix) output columns, where
+	suffix orders the `_x` (0) and `_y` (1) columns of a coordinate.
+
+	A column whose values are all integers, all numbers, all coordinates or all non-numeric
+	strings is converted in bulk; the `types` and `datatypes` of its values let IRI and
+	integer-typed columns skip the regexes. Anything else is converted value by value.
+	"""
+	num_rows = len(values)
+	complete = None not in values
+	if complete:
+		rows, present = np.arange(num_rows), values
+	else:
+		rows = np.flatnonzero(np.fromiter((value is not None for value in values), dtype=bool, count=num_rows))
+		present = [values[row] for row in rows.tolist()]
+
+	try:
+		if types == {"uri"}:
+			kind = "string" # An IRI has a scheme, so it is never a number or a Point(...) literal
+		elif (types == {"literal"} and datatypes <= INTEGER_DATATYPES) or all(map(INTEGER.fullmatch, present)):
+			numbers = np.fromiter(map(int, present), dtype=np.int64, count=len(present))
+			return [(variable, numbers if complete else _scatter(numbers, rows, num_rows), rows, 0)]
+		# Floats with an integer beyond int64 are a mixed column of Python ints and floats
+		elif all(map(FLOAT.fullmatch, present)) and not any(map(_beyond_int64, present)):
+			numbers = np.fromiter(map(float, present), dtype=np.float64, count=len(present))
+			return [(variable, numbers if complete else _scatter(numbers, rows, num_rows), rows, 0)]
+		elif all(matches := list(map(POINT.match, present))):
+			x = np.fromiter((float(match.group(1)) for match in matches), dtype=np.float64, count=len(matches))
+			y = np.fromiter((float(match.group(2)) for match in matches), dtype=np.float64, count=len(matches))
+			return [(f"{variable}_x", _scatter(x, rows, num_rows), rows, 0), (f"{variable}_y", _scatter(y, rows, num_rows), rows, 1)]
+		elif not any(map(FLOAT.fullmatch, present)) and not any(matches):
+			kind = "string"
+		else:
+			kind = "mixed"
+	except OverflowError: # Integers beyond int64 stay Python ints
+		kind = "mixed"
+
+	if kind == "string":
+		return [(variable, [np.nan if value is None else value for value in values], rows, 0)]
+
+	# Mixed column: coordinates go to their own columns, everything else keeps its Python type
+	column = [np.nan] * num_rows
+	x, y = np.full(num_rows, np.nan), np.full(num_rows, np.nan)
+	value_rows, point_rows = [], []
+	for row in rows.tolist():
+		value = _parse_value(values[row])
+		if isinstance(value, tuple):
+			x[row], y[row] = value
+			point_rows.append(row)
+		else:
+			column[row] = value
+			value_rows.append(row)
+	columns = []
+	if point_rows:
+		columns += [(f"{variable}_x", x, np.array(point_rows), 0), (f"{variable}_y", y, np.array(point_rows), 1)]
+	if value_rows:
+		columns.append((variable, column, np.array(value_rows), 0))
+	return columns
+
+def parse_bindings(result: dict) -> pd.DataFrame:
+	"""
+	Converts a SPARQL JSON result into a DataFrame, one row per binding and one column per variable.
+
+	Values that look like integers become int64 columns, other numbers float64 (int columns
+	with missing values become float64 too), and `Point(x y)` coordinates are split into
+	`<variable>_x` and `<variable>_y` float columns. Columns of other values are strings, with
+	"" for missing values in columns of mixed types. Columns are ordered by the first binding
+	(and position within it) that has them.
+
+	The variables of `head.vars` are read column by column from the bindings, and each column is
+	converted in bulk; the `type` and `datatype` of the values only serve to skip pattern matching
+	where they already determine the result. Returns an empty DataFrame if there are no bindings.
+	"""
+	bindings = result.get('results', {}).get('bindings', [])
+	if not bindings:
+		return pd.DataFrame()
+
+	variables = list(result.get('head', {}).get('vars', []))
+	known = set(variables)
+	for row in bindings:
+		if not row.keys() <= known:
+			for key in row:
+				if key not in known:
+					known.add(key)
+					variables.append(key)
+
+	columns = []
+	positions: Dict[int, Dict[str, int]] = {}
+	for variable in variables:
+		cells = list(map(methodcaller('get', variable), bindings))
+		present_cells = [cell for cell in cells if cell is not None]
+		if not present_cells:
+			continue
+		values = [None if cell is None else cell.get('value') for cell in cells]
+		types = set(map(methodcaller('get', 'type'), present_cells))
+		datatypes = set(map(methodcaller('get', 'datatype'), present_cells))
+		for name, data, rows, suffix in _parse_column(variable, values, types, datatypes):
+			# Order the columns as they first appear when reading the bindings row by row
+			row = int(rows[0])
+			if row not in positions:
+				positions[row] = {key: position for position, key in enumerate(bindings[row])}
+			columns.append(((row, positions[row][variable], suffix), name, data))
+	if not columns: # Only empty bindings
+		return pd.DataFrame([{}] * len(bindings))
+	columns.sort(key=lambda column: column[0])
+
+	df = pd.DataFrame({name: data for _, name, data in columns})
+
+	for col in df.select_dtypes(include='object').columns:
+		df[col] = df[col].fillna('')
+		df[col] = df[col].astype('string')
+
+	return df
@@ -0,0 +1,147 @@
+"""
+On-disk cache of SPARQL responses for WikidataClient.
+
+Entries are keyed by the endpoint URL and a hash of the normalized query text (comments and
+whitespace removed), and hold the raw SPARQL JSON response, gzipped, in
+`<directory>/<key[:2]>/<key>.json.gz`. Since the raw response is stored, cached queries are
+parsed exactly like fresh ones.
+
+Usage (from `src/`):
+	python -m wikidata.cache record ../data/wikidata_cache   # Fetch the graph's queries into the cache
+	python -m wikidata.cache info ../data/wikidata_cache
+	python -m kg.builder --offline out.graphml               # Build the graph from the recorded cache only
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Iterator, NamedTuple, Optional
+
+class CacheMissError(LookupError):
+	"""Raised by an offline WikidataClient for a query that is not in its cache."""
+
+class CacheEntry(NamedTuple):
+	path: str
+	endpoint: str
+	query: str
+	stored: float # Unix time the response was fetched
+	size: int # Bytes on disk
+
+def normalize_query(query: str) -> str:
+	"""Strips comments and collapses whitespace, so formatting changes do not miss the cache."""
+	# A comment starts with a # at the start of a line or after whitespace; IRIs such as <...#P31> are kept
+	query = re.sub(r"(^|\s)#[^\n]*", r"\1", query)
+	return " ".join(query.split())
+
+def cache_key(endpoint: str, query: str) -> str:
+	return hashlib.sha256(f"{endpoint}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+class ResponseCache:
+	"""
+	A directory of cached SPARQL responses with a TTL and a size bound.
+
+	Args:
+		directory: Where the entries are stored; created if missing.
+		ttl: Seconds after which an entry is stale and refetched; entries never expire if None.
+			Stale entries are still served in offline mode.
+		max_bytes: Size bound of the directory. After a write exceeds it, the least recently
+			used entries (by modification time, refreshed on every hit) are removed. Unbounded if None.
+	"""
+	SUFFIX = ".json.gz"
+
+	def __init__(self, directory: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+		self.directory = directory
+		self.ttl = ttl
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(directory, exist_ok=True)
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+	def get(self, endpoint: str, query: str, allow_stale: bool = False) -> Optional[dict]:
+		"""Returns the cached response, or None if there is none or it is stale (unless `allow_stale`)."""
+		path = self._path(cache_key(endpoint, query))
+		try:
+			with gzip.open(path, "rt", encoding="utf-8") as f:
+				entry = json.load(f)
+		except (FileNotFoundError, EOFError, OSError, ValueError):
+			self.misses += 1
+			return None
+
+		if not allow_stale and self.ttl is not None and time.time() - entry["stored"] > self.ttl:
+			self.misses += 1
+			return None
+		os.utime(path) # Mark as recently used for eviction
+		self.hits += 1
+		return entry["response"]
+
+	def put(self, endpoint: str, query: str, response: dict):
+		"""Stores a response, replacing any previous entry atomically, then evicts down to `max_bytes`."""
+		path = self._path(cache_key(endpoint, query))
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temporary_path = f"{path}.tmp{os.getpid()}"
+		# mtime=0 keeps the gzip bytes identical for identical responses, so recorded caches diff cleanly
+		with open(temporary_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+			f.write(json.dumps(
+				{"endpoint": endpoint, "query": query, "stored": time.time(), "response": response},
+				ensure_ascii=False
+			).encode("utf-8"))
+		os.replace(temporary_path, path)
+		if self.max_bytes is not None:
+			self.evict(self.max_bytes)
+
+	def entries(self) -> Iterator[CacheEntry]:
+		for root, _, files in os.walk(self.directory):
+			for name in files:
+				if not name.endswith(self.SUFFIX):
+					continue
+				path = os.path.join(root, name)
+				with gzip.open(path, "rt", encoding="utf-8") as f:
+					entry = json.load(f)
+				yield CacheEntry(path, entry["endpoint"], entry["query"], entry["stored"], os.path.getsize(path))
+
+	def evict(self, max_bytes: int) -> int:
+		"""Removes least recently used entries until the cache holds at most `max_bytes`; returns the number removed."""
+		files = []
+		for root, _, names in os.walk(self.directory):
+			for name in names:
+				if name.endswith(self.SUFFIX):
+					stat = os.stat(os.path.join(root, name))
+					files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+		total = sum(size for _, size, _ in files)
+		removed = 0
+		for _, size, path in sorted(files):
+			if total <= max_bytes:
+				break
+			os.remove(path)
+			total -= size
+			removed += 1
+		return removed
+
+def main():
+	from .client import WikidataClient
+	from .queries import SPARQL_MUNICIPALITIES, SPARQL_PEAKS, SPARQL_CASTLES
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("command", choices=["record", "info"])
+	parser.add_argument("directory", help="Cache directory.")
+	args = parser.parse_args()
+
+	cache = ResponseCache(args.directory)
+	if args.command == "record":
+		with WikidataClient(cache=cache, refresh=True) as wiki:
+			for name, df in wiki.execute_queries({"municipalities": SPARQL_MUNICIPALITIES, "peaks": SPARQL_PEAKS, "castles": SPARQL_CASTLES}).items():
+				print(f"Recorded {name}: {len(df)} rows")
+
+	for entry in cache.entries():
+		first_line = normalize_query(entry.query)[:60]
+		stored = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.stored))
+		print(f"{os.path.relpath(entry.path, args.directory)}  {entry.size / 1024:.0f} KiB  {stored}  {entry.endpoint}  {first_line}...")
+
+if __name__ == "__main__":
+	main()
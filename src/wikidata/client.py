@@ -1,16 +1,46 @@
-import re
+import random
 import requests
+import threading
 import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional, Union
+from .bindings import IncompleteResultError, parse_bindings, read_result
+from .cache import CacheMissError, ResponseCache
+from .pagination import PageCursor, PagedQuery
 
 class WikidataClient:
 	"""
 	A class to execute SPARQL queries against the Wikidata Query Service.
+
+	Requests go through one pooled `requests.Session`, so connections are kept alive between
+	queries. Rate-limited (429) and failed (5xx, connection errors, timeouts) requests are
+	retried with bounded exponential backoff, waiting as long as the service's `Retry-After`
+	header asks when it sends one. `execute_queries` runs several queries concurrently.
+
+	With a ResponseCache, responses are served from and stored to disk; in offline mode the
+	client never touches the network and raises CacheMissError for uncached queries.
 	"""
 	DEFAULT_ENDPOINT_URL = "https://query.wikidata.org/sparql"
 	DEFAULT_USER_AGENT = "NLP-course/2025 (University of Ljubljana, FRI - mc3432@student.uni-lj.si) requests/{}"
+	RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+	CHUNK_SIZE = 1 << 16 # Bytes read from the response at a time
 
-	def __init__(self, endpoint_url: str = DEFAULT_ENDPOINT_URL, user_agent: str = None):
+	def __init__(
+		self,
+		endpoint_url: str = DEFAULT_ENDPOINT_URL,
+		user_agent: str = None,
+		max_retries: int = 5,
+		backoff_factor: float = 1.0,
+		max_backoff: float = 60.0,
+		timeout: float = 60.0,
+		max_concurrency: int = 4,
+		cache: Optional[ResponseCache] = None,
+		offline: bool = False,
+		refresh: bool = False
+	):
 		"""
 		Initializes the WikidataClient class.
 
@@ -19,15 +49,114 @@ class WikidataClient:
 			user_agent (str): A custom User-Agent string. If None, a default is used.
 							   It's highly recommended to customize this with your project details
 							   and contact information as per Wikidata's User-Agent policy.
+			max_retries (int): How many times a failed request is retried before giving up.
+			backoff_factor (float): Base of the backoff; retry n waits up to backoff_factor * 2**n seconds.
+			max_backoff (float): Upper bound of any single wait, including a `Retry-After` wait.
+			timeout (float): Seconds to wait for the connection and for each read of the response.
+			max_concurrency (int): Default number of queries `execute_queries` runs at once, and
+								   the size of the connection pool.
+			cache (ResponseCache): Cache of raw responses; nothing is cached if None.
+			offline (bool): Serve only from the cache, including stale entries, and fail fast
+							with CacheMissError on a miss. Requires a cache.
+			refresh (bool): Refetch every query and overwrite its cache entry (e.g. to re-record).
 		"""
+		if offline and cache is None:
+			raise ValueError("Offline mode requires a cache.")
 		self.endpoint_url = endpoint_url
 		if user_agent is None:
 			# Format the default user agent with the requests library version
 			self.user_agent = self.DEFAULT_USER_AGENT.format(requests.__version__)
 		else:
 			self.user_agent = user_agent
+		self.max_retries = max_retries
+		self.backoff_factor = backoff_factor
+		self.max_backoff = max_backoff
+		self.timeout = timeout
+		self.max_concurrency = max_concurrency
+		self.cache = cache
+		self.offline = offline
+		self.refresh = refresh
+
+		self.session = requests.Session()
+		self.session.headers.update({
+			'Accept': 'application/sparql-results+json',
+			'User-Agent': self.user_agent
+		})
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+		self._random = random.Random()
+		self._random_lock = threading.Lock()
+
+	def close(self):
+		"""Closes the pooled connections."""
+		self.session.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _retry_after(self, response: requests.Response) -> Optional[float]:
+		"""Seconds to wait according to a `Retry-After` header (delay or HTTP date), or None."""
+		value = response.headers.get('Retry-After')
+		if value is None:
+			return None
+		value = value.strip()
+		if value.isdigit():
+			return float(value)
+		try:
+			return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+		except (TypeError, ValueError):
+			return None
+
+	def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+		"""Seconds to wait before retry `attempt` (0-based): `Retry-After` if given, else exponential with full jitter."""
+		delay = self._retry_after(response) if response is not None else None
+		if delay is None:
+			with self._random_lock:
+				delay = self._random.uniform(0, self.backoff_factor * 2 ** attempt)
+		return min(delay, self.max_backoff)
 
-	def execute_query(self, query: str) -> list:
+	def _get(self, query: str) -> dict:
+		"""Returns the JSON response to the query, from the cache or from the endpoint."""
+		if self.cache is not None and not self.refresh:
+			response = self.cache.get(self.endpoint_url, query, allow_stale=self.offline)
+			if response is not None:
+				return response
+		if self.offline:
+			raise CacheMissError(f"Query not in the cache at {self.cache.directory} (offline mode): {query.strip()[:80]}...")
+
+		response = self._fetch(query)
+		if self.cache is not None:
+			self.cache.put(self.endpoint_url, query, response)
+		return response
+
+	def _fetch(self, query: str) -> dict:
+		"""
+		Sends the query and stream-decodes the response, retrying rate-limited and failed requests
+		(including responses cut off mid-body); returns the parsed JSON response.
+		"""
+		params = {
+			'query': query,
+			'format': 'json'
+		}
+		for attempt in range(self.max_retries + 1):
+			try:
+				with self.session.get(self.endpoint_url, params=params, timeout=self.timeout, stream=True) as response:
+					if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+						delay = self._backoff(attempt, response)
+					else:
+						response.raise_for_status()
+						return read_result(response.iter_content(self.CHUNK_SIZE))
+			except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, IncompleteResultError):
+				if attempt == self.max_retries:
+					raise
+				delay = self._backoff(attempt)
+			time.sleep(delay)
+
+	def execute_query(self, query: str) -> pd.DataFrame:
 		"""
 		Executes a SPARQL query and returns the results.
 
@@ -35,51 +164,58 @@ class WikidataClient:
 			query (str): The SPARQL query string.
 
 		Returns:
-			list | None: A list of dictionaries representing the result bindings,
-						 or None if the query fails after retries.
+			pd.DataFrame: The result bindings, one row per result and one column per variable
+						  (coordinates are split into `_x` and `_y` columns). Empty if there
+						  are no results.
+
+		Raises:
+			CacheMissError: In offline mode, if the query is not cached.
+			requests.HTTPError: If the query still fails after `max_retries` retries, or fails
+								with a status that is not retried (e.g. 400 for a malformed query).
+		"""
+		return parse_bindings(self._get(query))
+
+	def execute_queries(
+		self,
+		queries: Union[List[str], Dict[str, str]],
+		max_concurrency: Optional[int] = None
+	) -> Union[List[pd.DataFrame], Dict[str, pd.DataFrame]]:
+		"""
+		Executes several SPARQL queries concurrently.
+
+		Args:
+			queries (list | dict): The query strings, or a mapping from names to query strings.
+			max_concurrency (int): Maximum number of queries in flight; `self.max_concurrency` if None.
+								   Keep it low for the public endpoint, which limits parallel queries per client.
+
+		Returns:
+			list | dict: The results of `execute_query` in the order of `queries`, or by name.
 		"""
-		headers = {
-			'Accept': 'application/sparql-results+json',
-			'User-Agent': self.user_agent
-		}
-		params = {
-			'query': query,
-			'format': 'json'
-		}
+		names = list(queries) if isinstance(queries, dict) else None
+		texts = [queries[name] for name in names] if names is not None else list(queries)
+		workers = max(1, min(max_concurrency or self.max_concurrency, len(texts)))
+		with ThreadPoolExecutor(workers) as executor:
+			results = list(executor.map(self.execute_query, texts))
+		return dict(zip(names, results)) if names is not None else results
+
+	def paginate(
+		self,
+		query: str,
+		page_size: int = 10000,
+		key: Optional[str] = None,
+		cursor: Optional[PageCursor] = None
+	) -> PagedQuery:
+		"""
+		Executes a SPARQL query in pages, for results too large for one request.
+
+		Args:
+			query (str): The SPARQL query string, without LIMIT or OFFSET.
+			page_size (int): Rows per request.
+			key (str): Variable (without `?`) to page by keyset, e.g. "settlement"; LIMIT/OFFSET if None.
+			cursor (PageCursor): Resume from this position, e.g. the `cursor` of a failed PagedQuery.
 
-		response = requests.get(self.endpoint_url, headers=headers, params=params, timeout=60)
-		response.raise_for_status()
-
-		data = response.json()
-		bindings = data.get('results', {}).get('bindings', [])
-
-		if not bindings:
-			return pd.DataFrame()
-
-		data = []
-		for row in bindings:
-			entry = {}
-			for key, meta in row.items():
-				value = meta.get('value')
-				if re.fullmatch(r"[-+]?\d+", value):
-					entry[key] = int(value)
-				elif re.fullmatch(r"[-+]?\d*\.?\d+", value):
-					entry[key] = float(value)
-				elif coordinateMatch := re.match(r"Point\(([-+]?\d*\.?\d+)\s+([-+]?\d*\.?\d+)\)", value):
-					x = float(coordinateMatch.group(1))
-					y = float(coordinateMatch.group(2))
-					entry[f"{key}_x"] = x
-					entry[f"{key}_y"] = y
-				elif key not in entry:
-					entry[key] = value
-				else:
-					print(f"Duplicate key {key} in row: {row}")
-			data.append(entry)
-
-		df = pd.DataFrame(data)
-
-		for col in df.select_dtypes(include='object').columns:
-			df[col] = df[col].fillna('')
-			df[col] = df[col].astype('string')
-
-		return df
\ No newline at end of file
+		Returns:
+			PagedQuery: Iterates over the results as DataFrames of at most `page_size` rows, or
+						as rows with `iter_rows()`.
+		"""
+		return PagedQuery(self, query, page_size=page_size, key=key, cursor=cursor)
@@ -0,0 +1,182 @@
+"""
+A local stand-in for the SPARQL endpoint, for exercising WikidataClient without Wikidata.
+
+It serves canned SPARQL JSON results by query text (or computed by a function of the query)
+and can inject rate-limit (429) and server error (5xx) responses or responses cut off
+mid-body, either as a fixed sequence or at random.
+
+Usage (from `src/`):
+	with LocalSparqlServer({SPARQL_PEAKS: peaks_json}, faults=[(429, "1"), 503]) as server:
+		client = WikidataClient(server.url, backoff_factor=0.01)
+		client.execute_query(SPARQL_PEAKS) # Retries past the 429 and the 503
+
+	python -m wikidata.local_server --port 8000 --fault-rate 0.3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+EMPTY_RESULT = {"head": {"vars": []}, "results": {"bindings": []}}
+
+TRUNCATE = "truncate" # Fault that sends half of the result and closes the connection
+
+Fault = Union[int, str, Tuple[int, Optional[str]]] # Status code (optionally with a Retry-After value), or TRUNCATE
+
+class LocalSparqlServer:
+	"""
+	A threaded HTTP server answering `GET /sparql?query=...` with canned results.
+
+	Args:
+		responses: SPARQL JSON result by query text, or a function from the query text to the
+			result; unknown queries get an empty result.
+		faults: Responses served to the first requests instead of the result, in order; each is a
+			status code, a (status code, Retry-After) pair, or TRUNCATE.
+		fault_rate: After `faults` run out, the probability of a request failing with a random
+			retryable status.
+		delay: Seconds every request takes, to make requests overlap.
+		port: Port to listen on; a free one if 0.
+		seed: Seed of the random faults.
+	"""
+	RANDOM_FAULTS = (429, 500, 502, 503, 504)
+
+	def __init__(
+		self,
+		responses: Union[Dict[str, dict], Callable[[str], dict], None] = None,
+		faults: Iterable[Fault] = (),
+		fault_rate: float = 0.0,
+		delay: float = 0.0,
+		port: int = 0,
+		seed: int = 0
+	):
+		self.responses = responses if callable(responses) else dict(responses or {})
+		self.faults = list(faults)
+		self.fault_rate = fault_rate
+		self.delay = delay
+		self.num_requests = 0 # Requests received
+		self.num_faults = 0 # Requests answered with an injected fault
+		self.max_in_flight = 0 # Most requests handled at the same time
+		self._in_flight = 0
+		self._random = random.Random(seed)
+		self._lock = threading.Lock()
+		self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+		self._server.daemon_threads = True
+		self._thread = None
+
+	@property
+	def url(self) -> str:
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}/sparql"
+
+	def _next_fault(self) -> Optional[Tuple[int, Optional[str]]]:
+		with self._lock:
+			self.num_requests += 1
+			if self.faults:
+				fault = self.faults.pop(0)
+				fault = fault if isinstance(fault, tuple) else (fault, None)
+			elif self.fault_rate > 0 and self._random.random() < self.fault_rate:
+				fault = (self._random.choice(self.RANDOM_FAULTS), None)
+			else:
+				return None
+			self.num_faults += 1
+			return fault
+
+	def _handler(self):
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1" # Keep-alive, like the real endpoint
+
+			def _send(self, status: int, body: bytes, headers: Dict[str, str]):
+				self.send_response(status)
+				for name, value in headers.items():
+					self.send_header(name, value)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def do_GET(self):
+				with server._lock:
+					server._in_flight += 1
+					server.max_in_flight = max(server.max_in_flight, server._in_flight)
+				try:
+					if server.delay:
+						time.sleep(server.delay)
+					url = urlparse(self.path)
+					if url.path != "/sparql":
+						self._send(404, b"Not found", {"Content-Type": "text/plain"})
+						return
+					fault = server._next_fault()
+					query = parse_qs(url.query).get("query", [""])[0]
+					if callable(server.responses):
+						result = server.responses(query)
+					else:
+						result = server.responses.get(query, EMPTY_RESULT)
+					body = json.dumps(result).encode("utf-8")
+					if fault is not None and fault[0] == TRUNCATE:
+						# Announce the whole body but send half of it
+						self.send_response(200)
+						self.send_header("Content-Type", "application/sparql-results+json")
+						self.send_header("Content-Length", str(len(body)))
+						self.end_headers()
+						self.wfile.write(body[:len(body) // 2])
+						self.close_connection = True
+						return
+					if fault is not None:
+						status, retry_after = fault
+						headers = {"Content-Type": "text/plain"}
+						if retry_after is not None:
+							headers["Retry-After"] = str(retry_after)
+						self._send(status, f"Injected {status}".encode(), headers)
+						return
+					self._send(200, body, {"Content-Type": "application/sparql-results+json"})
+				finally:
+					with server._lock:
+						server._in_flight -= 1
+
+			def log_message(self, format, *args):
+				pass
+
+		return Handler
+
+	def start(self) -> "LocalSparqlServer":
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+		self._thread.join()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--port", type=int, default=8000)
+	parser.add_argument("--responses", default=None, help="JSON file mapping query text to SPARQL JSON results.")
+	parser.add_argument("--fault-rate", type=float, default=0.0)
+	parser.add_argument("--delay", type=float, default=0.0)
+	args = parser.parse_args()
+
+	responses = None
+	if args.responses is not None:
+		with open(args.responses, encoding="utf-8") as f:
+			responses = json.load(f)
+	server = LocalSparqlServer(responses, fault_rate=args.fault_rate, delay=args.delay, port=args.port).start()
+	print(f"Serving on {server.url}")
+	try:
+		server._thread.join()
+	except KeyboardInterrupt:
+		server.stop()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,178 @@
+import re
+import pandas as pd
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Tuple
+from .bindings import parse_bindings
+from .cache import normalize_query
+
+if TYPE_CHECKING:
+	from .client import WikidataClient
+
+class PageCursor(NamedTuple):
+	"""Where a paginated query continues: a row offset, or the last key seen in keyset mode."""
+	offset: int = 0
+	after_key: Optional[str] = None
+
+_ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.*)$", re.IGNORECASE)
+_LIMIT_OFFSET = re.compile(r"\b(LIMIT|OFFSET)\b", re.IGNORECASE)
+_SELECT = re.compile(r"\bSELECT\s+(?:DISTINCT\s+|REDUCED\s+)?(.*?)\s*(?:WHERE\s*)?\{", re.IGNORECASE)
+_GROUP_BY = re.compile(r"\bGROUP\s+BY\s+(.*?)\s*(?:\bHAVING\b.*)?$", re.IGNORECASE)
+_VARIABLE = re.compile(r"\?\w+")
+_ALIAS = re.compile(r"\bAS\s+(\?\w+)\s*\)$", re.IGNORECASE)
+
+def _split_query(query: str) -> Tuple[str, str, Optional[str]]:
+	"""Splits a query into its WHERE body, the modifiers kept as they are (GROUP BY, HAVING) and its ORDER BY conditions."""
+	query = normalize_query(query)
+	end = query.rindex("}") + 1
+	body, modifiers = query[:end], query[end:]
+	if _LIMIT_OFFSET.search(modifiers):
+		raise ValueError("A query to paginate must not have its own LIMIT or OFFSET.")
+	order = _ORDER_BY.search(modifiers)
+	if order is None:
+		return body, modifiers.strip(), None
+	return body, modifiers[:order.start()].strip(), order.group(1).strip()
+
+def _terms(clause: str) -> List[str]:
+	"""Splits a SELECT or GROUP BY clause into its top-level terms: variables, `(expression AS ?alias)`, calls and other expressions."""
+	terms, depth, start = [], 0, 0
+	for position, character in enumerate(clause):
+		if character == "(":
+			depth += 1
+		elif character == ")":
+			depth -= 1
+			if depth == 0:
+				terms.append(clause[start:position + 1].strip())
+				start = position + 1
+		elif character.isspace() and depth == 0:
+			term = clause[start:position].strip()
+			if term.startswith("?"):
+				terms.append(term)
+			if not term or term.startswith("?"): # Otherwise a call's name, continued by its arguments
+				start = position + 1
+	if clause[start:].strip():
+		terms.append(clause[start:].strip())
+	return terms
+
+def _tie_breakers(select: str, modifiers: str) -> List[str]:
+	"""
+	Order conditions that make the row order total: the GROUP BY keys of a grouped query (each
+	group is one row), else the plainly projected variables and aliases. Variables that only occur
+	inside expressions are left out, as they may not be in scope (e.g. the argument of COUNT).
+	"""
+	group_by = _GROUP_BY.search(modifiers)
+	terms = _terms(group_by.group(1)) if group_by is not None else _terms(select)
+	conditions = []
+	for term in terms:
+		alias = _ALIAS.search(term)
+		if alias is not None:
+			conditions.append(alias.group(1))
+		elif _VARIABLE.fullmatch(term) or group_by is not None:
+			conditions.append(term)
+	return conditions
+
+def offset_page_query(query: str, page_size: int, offset: int) -> str:
+	"""
+	Rewrites a query to return rows offset:offset + page_size.
+
+	Pages are only consistent if the row order is total, so the projected variables (the GROUP BY
+	keys of a grouped query) are added to the query's ORDER BY as tie-breakers.
+	"""
+	body, modifiers, order = _split_query(query)
+	select = _SELECT.search(body)
+	tie_breakers = _tie_breakers(select.group(1) if select is not None else "", modifiers)
+	if not tie_breakers:
+		raise ValueError("Offset pagination needs projected variables or GROUP BY keys to order by; use keyset pagination for SELECT * queries.")
+	order = " ".join(([order] if order else []) + tie_breakers)
+	return f"{body} {modifiers} ORDER BY {order} LIMIT {page_size} OFFSET {offset}".replace("  ", " ")
+
+def keyset_page_query(query: str, key: str, page_size: int, after_key: Optional[str] = None) -> str:
+	"""
+	Rewrites a query to return the first page_size rows, ordered by the string form of the
+	always bound variable `key` (e.g. the entity URI), whose key is greater than `after_key`.
+	The query's own ORDER BY is replaced.
+	"""
+	body, modifiers, _ = _split_query(query)
+	if after_key is not None:
+		literal = after_key.replace("\\", "\\\\").replace('"', '\\"')
+		body = f'{body[:-1].rstrip()} FILTER(STR(?{key}) > "{literal}") }}'
+	return f"{body} {modifiers} ORDER BY STR(?{key}) LIMIT {page_size}".replace("  ", " ")
+
+class PagedQuery:
+	"""
+	Iterates over the results of a SPARQL query page by page, as DataFrames of at most `page_size` rows.
+
+	In offset mode pages are fetched with LIMIT/OFFSET; in keyset mode (with `key`) each page
+	continues after the greatest key of the previous one, which stays fast deep into the results.
+	A key must identify whole groups of rows: the rows of the last key of a full page are moved to
+	the next page, so no group is split across pages (and a group must fit in a page).
+
+	Every page goes through WikidataClient's cache and retries and is decoded as it streams in,
+	so memory is bounded by one page. Pages are delivered at least once: `cursor` (and `done`)
+	only move past a page when the consumer asks for the next one, so iterating the same
+	PagedQuery again (or a new one given that cursor) after a failed fetch, or after the consumer
+	stopped while holding a page, resumes with that page. `pages` and `rows` count the pages and
+	rows handed out, including a page that is still being processed. Each page is converted
+	separately, so e.g. an integer column with missing values in one page but not in another is
+	float64 in the first and int64 in the second.
+	"""
+	def __init__(
+		self,
+		client: "WikidataClient",
+		query: str,
+		page_size: int = 10000,
+		key: Optional[str] = None,
+		cursor: Optional[PageCursor] = None
+	):
+		if page_size <= 0:
+			raise ValueError("page_size must be positive.")
+		self.client = client
+		self.query = query
+		self.page_size = page_size
+		self.key = key
+		self.cursor = cursor or PageCursor()
+		self.done = False
+		self.pages = 0 # Pages handed out, including one the consumer may still be processing
+		self.rows = 0 # Rows of those pages
+
+	def page_query(self, cursor: PageCursor) -> str:
+		if self.key is None:
+			return offset_page_query(self.query, self.page_size, cursor.offset)
+		return keyset_page_query(self.query, self.key, self.page_size, cursor.after_key)
+
+	def _next_page(self) -> Tuple[List[dict], List[str], PageCursor, bool]:
+		"""Fetches the page at the cursor; returns its bindings, variables, the cursor after it and whether it was the last."""
+		result = self.client._get(self.page_query(self.cursor))
+		bindings = result.get('results', {}).get('bindings', [])
+		variables = result.get('head', {}).get('vars', [])
+		last = len(bindings) < self.page_size
+
+		if self.key is None:
+			return bindings, variables, PageCursor(self.cursor.offset + len(bindings)), last
+
+		if not last:
+			# Hold back the last key's rows: the page may have cut its group short
+			last_key = bindings[-1][self.key]['value']
+			end = len(bindings)
+			while end > 0 and bindings[end - 1][self.key]['value'] == last_key:
+				end -= 1
+			if end == 0:
+				raise ValueError(f"More than {self.page_size} rows share the key {last_key!r}; increase page_size.")
+			bindings = bindings[:end]
+		after_key = bindings[-1][self.key]['value'] if bindings else self.cursor.after_key
+		return bindings, variables, PageCursor(self.cursor.offset + len(bindings), after_key), last
+
+	def __iter__(self) -> Iterator[pd.DataFrame]:
+		while not self.done:
+			bindings, variables, cursor, last = self._next_page()
+			if bindings:
+				self.pages += 1
+				self.rows += len(bindings)
+				yield parse_bindings({'head': {'vars': variables}, 'results': {'bindings': bindings}})
+			# The cursor only moves past the page once the consumer asks for the next one, so a page
+			# whose processing was cut short is handed out again on resume
+			self.cursor = cursor
+			self.done = last
+
+	def iter_rows(self) -> Iterator[tuple]:
+		"""Iterates over the rows of all pages as named tuples, like `DataFrame.itertuples`."""
+		for page in self:
+			yield from page.itertuples(index=False)